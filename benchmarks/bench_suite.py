@@ -0,0 +1,240 @@
+# Copyright 2020-present, Mayo Clinic Department of Neurology - Bioelectronics Neurophysiology and Engineering Laboratory
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+Benchmark suite of the load, dump, scan and read paths.
+
+A synthetic dataset is generated (see synthetic.py) and the construction of the dataset, TSV load/add/dump, dataset
+open/scan/dump, dataset-wide tables, validation and data reads are timed. The results are written to a JSON file
+together with the commit and the versions of the dependencies, and can be compared with the results of another commit.
+
+Usage:
+    python benchmarks/bench_suite.py --output results.json [--subjects 20 --sessions 2 --events 10000 ...]
+    python benchmarks/bench_suite.py --compare base.json results.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import warnings
+import subprocess
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+# Run from a source checkout: the benchmarks and the repository root with bids_bnel
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from synthetic import generate_dataset, make_events
+
+import bids_bnel
+from bids_bnel.dataset import BIDSDataset, BIDS_TSV, BIDS_iEEG
+from bids_bnel.index import BIDSIndex, CACHE_DIRNAME
+
+# Free text columns changed before the dataset_dump benchmark, by suffix
+TEXT_COLUMNS = {'events': 'notes', 'channels': 'reference', 'electrodes': 'manufacturer'}
+
+
+def measure(func, repeats=3, setup=None):
+    """
+    Time a function.
+
+    Args:
+        func (callable): Function to time, called with the result of setup if given.
+        repeats (int, optional): Number of repetitions. Defaults to 3.
+        setup (callable, optional): Called before every repetition, not timed.
+
+    Returns:
+        dict: 'best', 'median' and 'mean' time in seconds and the number of 'repeats'.
+    """
+    times = []
+    for _ in range(repeats):
+        args = (setup(),) if setup is not None else ()
+        t0 = perf_counter()
+        func(*args)
+        times.append(perf_counter() - t0)
+    return {'best': min(times), 'median': float(np.median(times)), 'mean': float(np.mean(times)), 'repeats': repeats}
+
+
+def _files(root, suffix):
+    return sorted(os.path.join(dirpath, name) for dirpath, _, names in os.walk(root) for name in names
+                  if name.endswith(suffix))
+
+
+def run_suite(params, repeats=3, work_dir=None):
+    """
+    Run all benchmarks.
+
+    Args:
+        params (dict): Arguments of generate_dataset.
+        repeats (int, optional): Number of repetitions of each benchmark. Defaults to 3.
+        work_dir (str, optional): Directory for the generated dataset. Defaults to a temporary directory.
+
+    Returns:
+        dict: Timing of each benchmark by name, see measure.
+    """
+    temp_dir = tempfile.mkdtemp(dir=work_dir)
+    root = os.path.join(temp_dir, 'ds')
+    results = {}
+    try:
+        results['generate'] = measure(lambda: generate_dataset(root, **params), repeats=1)
+
+        events_path = _files(root, '_events.tsv')[0]
+        rows = make_events(params['n_events'], max(params['duration'], 1), np.random.default_rng(1))
+        results['tsv_load'] = measure(lambda: BIDS_TSV(events_path), repeats)
+
+        def add_rows(tsv):
+            with tsv.append_buffer():
+                for row in rows:
+                    tsv.add_row(row)
+        results['tsv_add_rows'] = measure(add_rows, repeats, setup=lambda: BIDS_TSV(os.path.join(temp_dir, 'x_events.tsv')))
+
+        def modified_events():
+            tsv = BIDS_TSV(events_path)
+            tsv.iloc[0, 0] = perf_counter()
+            return tsv
+        results['tsv_dump'] = measure(lambda tsv: tsv.dump(), repeats, setup=modified_events)
+        results['tsv_dump_clean'] = measure(lambda tsv: tsv.dump(), repeats, setup=lambda: BIDS_TSV(events_path))
+
+        def drop_index():
+            shutil.rmtree(os.path.join(root, CACHE_DIRNAME), ignore_errors=True)
+        results['index_scan_cold'] = measure(lambda _: BIDSIndex(root).update(), repeats, setup=drop_index)
+        BIDSIndex(root).update()
+        results['index_scan_warm'] = measure(lambda: BIDSIndex(root).update(), repeats)
+
+        results['dataset_open'] = measure(lambda: BIDSDataset(root).find_subjects(), repeats)
+        results['dataset_load'] = measure(lambda: BIDSDataset(root).load_subjects(), repeats)
+
+        def modified_dataset():
+            # Every TSV file gets a new free text value, so every file of the sessions is written
+            stamp = 'modified {}'.format(perf_counter())
+            dataset = BIDSDataset(root).load_subjects()
+            for subject in dataset.values():
+                for session in subject.sessions.values():
+                    for tsv in session.tsvs.values():
+                        if tsv.__len__():
+                            key = TEXT_COLUMNS.get(tsv._name, tsv.columns[-1])
+                            tsv.iloc[0, tsv.columns.get_loc(key)] = stamp
+            dataset._jsons['channels']['name'] = 'Name of the channel {}'.format(stamp)
+            return dataset
+
+        def dump_dataset(dataset):
+            with dataset.batch_write():
+                dataset.dump()
+                for subject in dataset.values():
+                    for session in subject.sessions.values():
+                        for tsv in session.tsvs.values():
+                            tsv.dump()
+        results['dataset_dump'] = measure(dump_dataset, repeats, setup=modified_dataset)
+
+        dataset = BIDSDataset(root)
+        results['load_table'] = measure(lambda: dataset.load_table('events', columns=['onset', 'trial_type']),
+                                        repeats)
+        results['resolve_metadata'] = measure(lambda: dataset.resolve_metadata_many(_files(root, '_channels.tsv')),
+                                              repeats)
+        results['validate'] = measure(lambda: dataset.validate(executor='thread'), repeats)
+
+        recordings = _files(root, '_ieeg.eeg')
+        if recordings:
+            recording = BIDS_iEEG(recordings[0])
+            rng = np.random.default_rng(2)
+            window = min(recording.n_samples, int(recording.fs))
+            starts = rng.integers(0, recording.n_samples - window + 1, 100)
+            results['ieeg_open'] = measure(lambda: BIDS_iEEG(recordings[0]), repeats)
+            results['ieeg_read_windows'] = measure(
+                lambda: [recording.read(start, start + window, scale=True) for start in starts], repeats)
+            results['ieeg_read_all'] = measure(lambda: recording.read(scale=True), repeats)
+            onsets = rng.uniform(0, recording.duration, 1000)
+            results['ieeg_epochs'] = measure(lambda: recording.epochs(onsets, -0.1, 0.5, scale=True), repeats)
+    finally:
+        shutil.rmtree(temp_dir)
+    return results
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(base, new, threshold=1.1):
+    """
+    Print the ratio of the best times of two result files.
+
+    Args:
+        base (dict): Content of the base result file.
+        new (dict): Content of the new result file.
+        threshold (float, optional): Ratio above which a benchmark is marked as slower. Defaults to 1.1.
+
+    Returns:
+        list: Names of the benchmarks slower than the threshold.
+    """
+    slower = []
+    print('{:>20} {:>12} {:>12} {:>8}'.format('benchmark', 'base [s]', 'new [s]', 'ratio'))
+    for name, result in new['results'].items():
+        if name not in base['results']:
+            continue
+        ratio = result['best'] / max(base['results'][name]['best'], 1e-12)
+        mark = ' slower' if ratio > threshold else ''
+        if mark:
+            slower.append(name)
+        print('{:>20} {:>12.4f} {:>12.4f} {:>8.2f}{}'.format(name, base['results'][name]['best'], result['best'],
+                                                            ratio, mark))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark suite of bids_bnel')
+    parser.add_argument('--output', help='Path to the JSON result file')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help='Compare two result files')
+    parser.add_argument('--subjects', type=int, default=10)
+    parser.add_argument('--sessions', type=int, default=2)
+    parser.add_argument('--channels', type=int, default=64)
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--duration', type=float, default=60, help='Length of the recordings in seconds')
+    parser.add_argument('--fs', type=float, default=1000)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--work-dir', help='Directory for the generated dataset')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            base = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        return 1 if compare(base, new) else 0
+
+    params = {'n_subjects': args.subjects, 'n_sessions': args.sessions, 'n_channels': args.channels,
+              'n_events': args.events, 'duration': args.duration, 'fs': args.fs}
+    warnings.simplefilter('ignore')
+    results = run_suite(params, repeats=args.repeats, work_dir=args.work_dir)
+
+    report = {
+        'commit': _commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'versions': {'bids_bnel': bids_bnel.__version__, 'python': platform.python_version(),
+                     'numpy': np.__version__, 'pandas': pd.__version__},
+        'platform': platform.platform(),
+        'params': params,
+        'repeats': args.repeats,
+        'results': results,
+    }
+    for name, result in results.items():
+        print('{:>20} {:>12.4f} s'.format(name, result['best']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
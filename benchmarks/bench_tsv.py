@@ -0,0 +1,132 @@
+# Copyright 2020-present, Mayo Clinic Department of Neurology - Bioelectronics Neurophysiology and Engineering Laboratory
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+Benchmark of BIDS_TSV loading.
+
+Writes events.tsv files with a growing number of rows and measures the time needed to load them with BIDS_TSV and the
+time needed to insert the same number of rows with BIDS_TSV.add_rows. The time per row should stay approximately
+constant, i.e. both times grow linearly with the number of rows.
+
+Usage:
+    python benchmarks/bench_tsv.py [n_rows ...]
+"""
+import os
+import sys
+import shutil
+import tempfile
+import warnings
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+# Run from a source checkout: the repository root with bids_bnel
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bids_bnel.dataset import BIDS_TSV
+from bids_bnel.cache import enable_tsv_cache, disable_tsv_cache
+from bids_bnel.templates import template_events
+
+
+def write_events(path, n_rows):
+    """
+    Write a synthetic events.tsv file and its JSON sidecar.
+
+    Args:
+        path (str): Path to the events.tsv file.
+        n_rows (int): Number of rows to write.
+    """
+    df = pd.DataFrame(columns=template_events.keys())
+    df['onset'] = np.arange(n_rows) * 0.5
+    df['duration'] = 0.25
+    df['trial_type'] = 'electrical_stimulation'
+    df['sub_type'] = 'SPES'
+    df['sample_start'] = np.arange(n_rows) * 500
+    df.to_csv(path, sep='\t', index=False)
+
+    tsv = BIDS_TSV(path)
+    tsv.metadata.dump()
+
+    # Recently modified files are not cached, move the modification time to the past
+    t = os.stat(path).st_mtime - 60
+    os.utime(path, (t, t))
+
+
+def bench_load(n_rows, repeats=3, cache=False):
+    """
+    Measure the time needed to load an events.tsv file with BIDS_TSV.
+
+    Args:
+        n_rows (int): Number of rows in the file.
+        repeats (int, optional): Number of repetitions, the best time is reported. Defaults to 3.
+        cache (bool, optional): Load the file with the binary TSV cache enabled. Defaults to False.
+
+    Returns:
+        float: The best load time in seconds.
+    """
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(temp_dir, 'sub-01_events.tsv')
+        write_events(path, n_rows)
+        if cache:
+            enable_tsv_cache(os.path.join(temp_dir, 'cache'))
+            BIDS_TSV(path)
+        times = []
+        for _ in range(repeats):
+            t0 = perf_counter()
+            BIDS_TSV(path)
+            times.append(perf_counter() - t0)
+        return min(times)
+    finally:
+        disable_tsv_cache()
+        shutil.rmtree(temp_dir)
+
+
+def bench_load_cached(n_rows, repeats=3):
+    """
+    Measure the time needed to load an events.tsv file with BIDS_TSV from the binary TSV cache.
+    """
+    return bench_load(n_rows, repeats=repeats, cache=True)
+
+
+def bench_add_rows(n_rows, repeats=3):
+    """
+    Measure the time needed to insert rows into an events.tsv file with BIDS_TSV.add_rows.
+
+    Args:
+        n_rows (int): Number of rows to insert.
+        repeats (int, optional): Number of repetitions, the best time is reported. Defaults to 3.
+
+    Returns:
+        float: The best insert time in seconds.
+    """
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(temp_dir, 'sub-01_events.tsv')
+        rows = [{'onset': 0.5 * idx, 'duration': 0.25, 'trial_type': 'electrical_stimulation'} for idx in range(n_rows)]
+        times = []
+        for _ in range(repeats):
+            tsv = BIDS_TSV(path)
+            t0 = perf_counter()
+            with tsv.append_buffer():
+                for row in rows:
+                    tsv.add_row(row)
+            times.append(perf_counter() - t0)
+        return min(times)
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def main(sizes):
+    warnings.simplefilter('ignore')
+    print('{:>10} {:>10} {:>12} {:>14}'.format('operation', 'rows', 'time [s]', 'per row [us]'))
+    for name, bench in (('load', bench_load), ('cached', bench_load_cached), ('add_rows', bench_add_rows)):
+        for n_rows in sizes:
+            t = bench(n_rows)
+            print('{:>10} {:>10} {:>12.4f} {:>14.3f}'.format(name, n_rows, t, 1e6 * t / n_rows))
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [1000, 10000, 100000, 200000])
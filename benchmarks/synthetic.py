@@ -0,0 +1,157 @@
+# Copyright 2020-present, Mayo Clinic Department of Neurology - Bioelectronics Neurophysiology and Engineering Laboratory
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+Generator of synthetic BIDS iEEG datasets.
+
+The datasets are built with the bids_bnel classes and follow templates.py: participants.tsv, sessions.tsv,
+electrodes.tsv, channels.tsv, events.tsv and BrainVision recordings with their *_ieeg.json sidecars. The content is
+random but reproducible for a given seed.
+
+Usage:
+    python benchmarks/synthetic.py path [n_subjects n_sessions n_channels n_events duration]
+"""
+import os
+import sys
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Run from a source checkout: the repository root with bids_bnel
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bids_bnel.dataset import BIDSDataset, BID_subject, BIDS_TSV, BIDS_iEEG_writer
+from bids_bnel.fileio import atomic_write, batch_write
+
+TRIAL_TYPES = ['electrical stimulation', 'motor task', 'sensing task', 'artefact', 'sleep', 'sleep wake transition',
+               'eyes open']
+SUB_TYPES = {'electrical stimulation': 'SPES', 'sleep': 'nrem', 'motor task': 'hand', 'sensing task': 'circle'}
+
+
+def channel_names(n_channels, per_electrode=8):
+    """
+    Get names of depth electrode contacts, e.g. LA1 ... LA8, LB1, ...
+
+    Args:
+        n_channels (int): Number of channels.
+        per_electrode (int, optional): Number of contacts per electrode. Defaults to 8.
+
+    Returns:
+        list: Channel names.
+    """
+    return ['{}{}{}'.format('LR'[(idx // per_electrode) % 2], chr(ord('A') + (idx // (2 * per_electrode)) % 26),
+                            idx % per_electrode + 1 + per_electrode * (idx // (52 * per_electrode)))
+            for idx in range(n_channels)]
+
+
+def make_events(n_events, duration, rng):
+    """
+    Create random events sorted by onset.
+
+    Args:
+        n_events (int): Number of events.
+        duration (float): Length of the recording in seconds.
+        rng (numpy.random.Generator): Random generator.
+
+    Returns:
+        list: Rows of events.tsv.
+    """
+    onset = np.sort(rng.uniform(0, duration, n_events)).round(3)
+    length = rng.exponential(1.0, n_events).round(3)
+    trial_type = rng.choice(TRIAL_TYPES, n_events)
+    rows = []
+    for idx in range(n_events):
+        row = {'onset': onset[idx], 'duration': length[idx], 'offset': round(onset[idx] + length[idx], 3),
+               'trial_type': trial_type[idx], 'sub_type': SUB_TYPES.get(trial_type[idx], 'n/a')}
+        if trial_type[idx] == 'electrical stimulation':
+            row.update({'electrical_stimulation_type': 'biphasic', 'electrical_stimulation_current': 0.004,
+                        'electrical_stimulation_frequency': 0.2, 'electrical_stimulation_pulsewidth': 0.0002})
+        rows.append(row)
+    return rows
+
+
+def generate_dataset(path, n_subjects=2, n_sessions=1, n_channels=16, n_events=100, duration=10, fs=1000,
+                     dtype='int16', seed=0):
+    """
+    Generate a synthetic dataset. An existing directory is overwritten.
+
+    Args:
+        path (str): Path to the dataset directory.
+        n_subjects (int, optional): Number of subjects. Defaults to 2.
+        n_sessions (int, optional): Number of sessions per subject. Defaults to 1.
+        n_channels (int, optional): Number of channels per recording. Defaults to 16.
+        n_events (int, optional): Number of events per session. Defaults to 100.
+        duration (float, optional): Length of each recording in seconds. 0 writes no recordings. Defaults to 10.
+        fs (float, optional): Sampling frequency in Hz. Defaults to 1000.
+        dtype (str, optional): Data type of the recordings, see brainvision.BINARY_FORMATS. Defaults to 'int16'.
+        seed (int, optional): Seed of the random generator. Defaults to 0.
+
+    Returns:
+        BIDSDataset: The generated dataset.
+    """
+    rng = np.random.default_rng(seed)
+    names = channel_names(n_channels)
+    n_samples = int(duration * fs)
+    chunk_size = max(1, int(fs) * 10)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        dataset = BIDSDataset(path, create_dataset=True)
+        participants = []
+        recordings = []
+        with batch_write():
+            for sub in range(n_subjects):
+                label = '{:04d}'.format(sub + 1)
+                participants.append({'participant_id': 'sub-' + label, 'species': 'homo sapiens',
+                                     'sex': rng.choice(['M', 'F'])})
+                subject = BID_subject(os.path.join(path, 'sub-' + label))
+                sessions = BIDS_TSV(os.path.join(subject.path, 'sub-{}_sessions.tsv'.format(label)))
+
+                for ses in range(n_sessions):
+                    session = subject.create_session('{:02d}'.format(ses + 1))
+                    directory = os.path.join(session.path, 'ieeg')
+                    os.makedirs(directory, exist_ok=True)
+                    prefix = os.path.join(directory, 'sub-{}_ses-{}_'.format(label, session.label))
+                    sessions.add_row({'session-id': 'ses-' + session.label})
+
+                    electrodes = BIDS_TSV(prefix + 'electrodes.tsv')
+                    xyz = rng.normal(0, 40, (n_channels, 3)).round(2)
+                    electrodes.add_rows({'name': name, 'x': xyz[idx, 0], 'y': xyz[idx, 1], 'z': xyz[idx, 2],
+                                         'size': 5, 'material': 'platinum', 'manufacturer': 'AdTech',
+                                         'group': 'depth', 'hemisphere': name[0]} for idx, name in enumerate(names))
+                    electrodes.dump()
+
+                    prefix += 'task-rest_run-1_'
+                    events = BIDS_TSV(prefix + 'events.tsv')
+                    events.add_rows(make_events(n_events, max(duration, 1), rng))
+                    events.dump()
+
+                    if n_samples:
+                        recordings.append(prefix + 'ieeg.eeg')
+                    else:
+                        channels = BIDS_TSV(prefix + 'channels.tsv')
+                        channels.add_rows({'name': name, 'type': 'SEEG', 'units': 'uV'} for name in names)
+                        channels.dump()
+                sessions.dump()
+
+            dataset.participants = pd.DataFrame(participants, columns=['participant_id', 'species', 'sex'])
+            atomic_write(os.path.join(path, 'participants.tsv'),
+                         dataset.participants.to_csv(sep='\t', index=False))
+
+            for path_data in recordings:
+                with BIDS_iEEG_writer(path_data, fs, names, dtype=dtype, channel_types='SEEG',
+                                      resolution=0.1) as writer:
+                    for start in range(0, n_samples, chunk_size):
+                        chunk = rng.normal(0, 1000, (n_channels, min(chunk_size, n_samples - start)))
+                        writer.write(chunk)
+    return dataset
+
+
+if __name__ == '__main__':
+    if sys.argv.__len__() < 2:
+        print(__doc__)
+        sys.exit(1)
+    args = [int(v) for v in sys.argv[2:7]]
+    generate_dataset(sys.argv[1], *args)
@@ -7,9 +7,26 @@ import os
 
 __version__ = '0.0.5'
 
+from .instrumentation import stats, profile, enable_stats, disable_stats, reset_stats
+
 
 
 import os
 # Check windows or linux and sets separator
 DELIMITER = os.path.join(' ', ' ')[1]
 PATH_PACKAGE = DELIMITER.join(__file__.split(DELIMITER)[::-1])
+
+# Classes loaded on first access, so that importing the package does not import pandas and numpy. BIDS_json does not
+# need them at all.
+_sidecar_attributes = ('BIDS_json', 'LazyDict')
+_dataset_attributes = ('BIDS_TSV', 'BIDS_iEEG', 'BIDS_iEEG_writer', 'BIDS_session', 'BID_subject', 'BIDSDataset')
+
+
+def __getattr__(name):
+    if name in _sidecar_attributes:
+        from . import sidecar as module
+    elif name in _dataset_attributes:
+        from . import dataset as module
+    else:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    return getattr(module, name)
@@ -0,0 +1,61 @@
+# Copyright 2020-present, Mayo Clinic Department of Neurology - Bioelectronics Neurophysiology and Engineering Laboratory
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+Helpers for the asyncio API.
+
+File reads and parsing are blocking, so the async loaders run them in an executor (by default the thread pool of the
+event loop) and await the result. The number of loads running at the same time is bounded by a semaphore, so a service
+opening hundreds of files does not occupy every worker of the executor.
+
+asyncio is imported on first use, so that importing the package stays fast for code which does not use the async API.
+"""
+import functools
+
+# Default number of concurrent loads
+DEFAULT_LIMIT = 32
+
+
+async def run_blocking(func, *args, executor=None, **kwargs):
+    """
+    Run a blocking function off the event loop.
+
+    Args:
+        func (callable): Function to run.
+        *args: Positional arguments of the function.
+        executor (Executor, optional): Executor running the function. Defaults to the default executor of the loop.
+        **kwargs: Keyword arguments of the function.
+
+    Returns:
+        The result of the function.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+async def gather_limited(func, items, limit=DEFAULT_LIMIT, executor=None):
+    """
+    Apply a blocking function to all items off the event loop with at most limit calls running at the same time.
+
+    Args:
+        func (callable): Function applied to each item. Must be picklable for process pools.
+        items (iterable): Items to process.
+        limit (int, optional): Maximum number of concurrent calls. Defaults to DEFAULT_LIMIT.
+        executor (Executor, optional): Executor running the calls. Defaults to the default executor of the loop.
+
+    Returns:
+        list: Results in the order of the items.
+    """
+    import asyncio
+
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(item):
+        async with semaphore:
+            return await run_blocking(func, item, executor=executor)
+
+    return list(await asyncio.gather(*(run(item) for item in items)))
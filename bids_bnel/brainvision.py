@@ -0,0 +1,158 @@
+# Copyright 2020-present, Mayo Clinic Department of Neurology - Bioelectronics Neurophysiology and Engineering Laboratory
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+Reading and writing of BrainVision header (.vhdr) and marker (.vmrk) files describing the binary .eeg data files used
+by BIDS iEEG.
+"""
+import os
+
+import numpy as np
+
+from .fileio import atomic_write
+from . import instrumentation
+
+
+BINARY_FORMATS = {
+    'INT_16': '<i2',
+    'UINT_16': '<u2',
+    'INT_32': '<i4',
+    'IEEE_FLOAT_32': '<f4',
+}
+
+
+def read_vhdr(path):
+    """
+    Read a BrainVision header file.
+
+    Only binary data files are supported.
+
+    Args:
+        path (str): Path to the .vhdr file.
+
+    Returns:
+        dict: Header with keys 'data_file' (absolute path), 'marker_file', 'orientation' ('multiplexed' or
+        'vectorized'), 'n_channels', 'sampling_frequency' (Hz), 'dtype' (numpy dtype string) and 'channels' (list of
+        dicts with 'name', 'reference', 'resolution' and 'unit').
+
+    Raises:
+        ValueError: If the data file is not binary.
+    """
+    t0 = instrumentation.start()
+    sections = {}
+    section = None
+    n_bytes = 0
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            n_bytes += line.__len__()
+            line = line.strip()
+            if line == '' or line.startswith(';'):
+                continue
+            if line.startswith('[') and line.endswith(']'):
+                section = line[1:-1]
+                sections[section] = {}
+            elif section is not None and '=' in line:
+                key, value = line.split('=', 1)
+                sections[section][key.strip()] = value.strip()
+
+    common = sections.get('Common Infos', {})
+    binary = sections.get('Binary Infos', {})
+    if common.get('DataFormat', 'BINARY').upper() != 'BINARY':
+        raise ValueError('Only binary BrainVision data is supported, got {}'.format(common.get('DataFormat')))
+
+    channels = []
+    for key, value in sections.get('Channel Infos', {}).items():
+        fields = value.split(',')
+        fields += [''] * (4 - fields.__len__())
+        channels.append({
+            'name': fields[0].replace(r'\1', ','),
+            'reference': fields[1],
+            'resolution': float(fields[2]) if fields[2] else 1.0,
+            'unit': fields[3] if fields[3] else 'uV',
+        })
+
+    instrumentation.record(t0, 'vhdr', 'read', files=1, bytes_read=n_bytes)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    interval = float(common['SamplingInterval']) if 'SamplingInterval' in common else None
+    return {
+        'data_file': os.path.join(directory, common['DataFile']) if 'DataFile' in common else None,
+        'marker_file': os.path.join(directory, common['MarkerFile']) if 'MarkerFile' in common else None,
+        'orientation': common.get('DataOrientation', 'MULTIPLEXED').lower(),
+        'n_channels': int(common['NumberOfChannels']) if 'NumberOfChannels' in common else channels.__len__(),
+        'sampling_frequency': 1e6 / interval if interval else None,
+        'dtype': BINARY_FORMATS[binary.get('BinaryFormat', 'INT_16').upper()],
+        'channels': channels,
+    }
+
+
+def write_vhdr(path, data_file, marker_file, n_channels, sampling_frequency, dtype, channels, orientation='multiplexed'):
+    """
+    Write a BrainVision header file.
+
+    Args:
+        path (str): Path to the .vhdr file.
+        data_file (str): Name of the binary data file in the same directory.
+        marker_file (str): Name of the marker file in the same directory.
+        n_channels (int): Number of channels.
+        sampling_frequency (float): Sampling frequency in Hz.
+        dtype (str or numpy.dtype): Data type of the binary data, one of BINARY_FORMATS.
+        channels (list): Dicts with 'name' and optionally 'reference', 'resolution' and 'unit'.
+        orientation (str, optional): 'multiplexed' or 'vectorized'. Defaults to 'multiplexed'.
+
+    Raises:
+        ValueError: If the data type is not supported by BrainVision.
+    """
+    formats = {np.dtype(v): k for k, v in BINARY_FORMATS.items()}
+    if np.dtype(dtype) not in formats:
+        raise ValueError('Data type {} is not supported by BrainVision'.format(dtype))
+
+    lines = [
+        'Brain Vision Data Exchange Header File Version 1.0',
+        '',
+        '[Common Infos]',
+        'Codepage=UTF-8',
+        'DataFile={}'.format(data_file),
+        'MarkerFile={}'.format(marker_file),
+        'DataFormat=BINARY',
+        'DataOrientation={}'.format(orientation.upper()),
+        'NumberOfChannels={}'.format(n_channels),
+        'SamplingInterval={}'.format(1e6 / sampling_frequency),
+        '',
+        '[Binary Infos]',
+        'BinaryFormat={}'.format(formats[np.dtype(dtype)]),
+        '',
+        '[Channel Infos]',
+    ]
+    for idx, channel in enumerate(channels):
+        lines.append('Ch{}={},{},{},{}'.format(
+            idx + 1,
+            str(channel['name']).replace(',', r'\1'),
+            channel.get('reference', ''),
+            channel.get('resolution', 1),
+            channel.get('unit', 'uV'),
+        ))
+    atomic_write(path, '\n'.join(lines) + '\n')
+
+
+def write_vmrk(path, data_file):
+    """
+    Write a BrainVision marker file containing only the start of the recording.
+
+    Args:
+        path (str): Path to the .vmrk file.
+        data_file (str): Name of the binary data file in the same directory.
+    """
+    lines = [
+        'Brain Vision Data Exchange Marker File Version 1.0',
+        '',
+        '[Common Infos]',
+        'Codepage=UTF-8',
+        'DataFile={}'.format(data_file),
+        '',
+        '[Marker Infos]',
+        'Mk1=New Segment,,1,1,0',
+    ]
+    atomic_write(path, '\n'.join(lines) + '\n')
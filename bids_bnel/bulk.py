@@ -0,0 +1,302 @@
+# Copyright 2020-present, Mayo Clinic Department of Neurology - Bioelectronics Neurophysiology and Engineering Laboratory
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+Bulk creation of subjects, sessions and recordings from a manifest.
+
+The whole tree is planned first: every directory and every file with its content. Directories are then created in
+batches and the files are written in batches by the workers of a thread pool, each file with an atomic write. Files
+which already exist are skipped, so an interrupted import is resumed by running it again with the same manifest, except
+for the sub-*_sessions.tsv files, to which sessions not listed yet are appended. participants.tsv is written last, with
+all new subjects appended in a single write, and new participant columns are added to participants.json.
+
+Manifest rows describe recordings (rows with a task), sessions (rows with a session but no task) or subjects:
+
+    sub  ses  task  run  sex  channels        electrodes      ieeg
+    01   01   rest  1    F    ['LA1', 'LA2']  [{'name': ...}] {'SamplingFrequency': 2048}
+"""
+import io
+import os
+import csv
+import json
+
+import pandas as pd
+
+from .templates import template_participants, template_sessions, template_electrodes, template_channels, template_ieeg
+from .fileio import atomic_write
+from .parallel import parallel_map
+
+# Files or directories of one task of the pool
+BATCH_SIZE = 64
+
+# Manifest columns which are entities or file contents, all other columns are participant columns
+MANIFEST_COLUMNS = ('sub', 'ses', 'task', 'run', 'participant_id', 'channels', 'electrodes', 'ieeg')
+
+# Data type directory of the recordings
+DATATYPE = 'ieeg'
+
+# Key columns of sessions.tsv, the first one is written. Existing tables may use the other one.
+SESSION_KEYS = ('session-id', 'session_id')
+
+
+def _label(value, prefix):
+    # Numeric labels of DataFrame columns with missing values are floats, e.g. run 1.0
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value)
+    return value[len(prefix):] if value.startswith(prefix) else value
+
+
+def _missing(value):
+    if value is None:
+        return True
+    try:
+        return bool(pd.isna(value))
+    except (TypeError, ValueError):
+        return False
+
+
+def _rows(manifest):
+    """
+    Get the manifest rows as dicts without missing values.
+    """
+    if isinstance(manifest, pd.DataFrame):
+        manifest = manifest.to_dict('records')
+    rows = []
+    for row in manifest:
+        row = {key: value for key, value in dict(row).items() if not _missing(value)}
+        if 'sub' not in row and 'participant_id' in row:
+            row['sub'] = row['participant_id']
+        if 'sub' not in row:
+            raise ValueError('Manifest row without subject: {}'.format(row))
+        row['sub'] = _label(row['sub'], 'sub-')
+        for key, prefix in (('ses', 'ses-'), ('task', 'task-'), ('run', 'run-')):
+            if key in row:
+                row[key] = _label(row[key], prefix)
+        rows.append(row)
+    return rows
+
+
+def _table(template, rows):
+    """
+    Get the TSV and JSON sidecar content of a table with the columns of a template followed by further columns of the
+    rows, like BIDS_TSV.dump writes it.
+    """
+    if isinstance(rows, pd.DataFrame):
+        rows = rows.to_dict('records')
+    rows = [{'name': row} if isinstance(row, str) else dict(row) for row in rows]
+    columns = list(template.keys())
+    sidecar = dict(template)
+    for row in rows:
+        for key in row:
+            if key not in sidecar:
+                columns.append(key)
+                sidecar[key] = {}
+    return ('tsv', columns, rows), json.dumps(sidecar, indent=4)
+
+
+def plan_tree(path, manifest, participant_columns=None):
+    """
+    Plan the directories and files of the subjects, sessions and recordings of a manifest.
+
+    Args:
+        path (str): Path to the dataset directory.
+        manifest (pandas.DataFrame or iterable): Rows with the 'sub' (or 'participant_id') column and optionally
+            'ses', 'task', 'run', participant columns, 'channels' (channel names, dicts or a DataFrame with the
+            content of channels.tsv), 'electrodes' (dicts or a DataFrame with the content of electrodes.tsv of the
+            session) and 'ieeg' (fields of the *_ieeg.json sidecar).
+        participant_columns (list, optional): Columns of participants.tsv taken from the manifest. Defaults to all
+            columns which are not in MANIFEST_COLUMNS.
+
+    Returns:
+        tuple: Sorted list of directories, dict of file contents by path (JSON text or a ('tsv', columns, rows)
+        tuple) and participants rows by subject label.
+    """
+    rows = _rows(manifest)
+    directories = set()
+    files = {}
+    participants = {}
+    sessions = {}
+
+    for row in rows:
+        sub = row['sub']
+        directory = os.path.join(path, 'sub-' + sub)
+        directories.add(directory)
+        participant = participants.setdefault(sub, {'participant_id': 'sub-' + sub})
+        for key, value in row.items():
+            if key not in MANIFEST_COLUMNS and (participant_columns is None or key in participant_columns):
+                participant.setdefault(key, value)
+
+        prefix = 'sub-' + sub
+        if 'ses' in row:
+            sessions.setdefault(sub, [])
+            if row['ses'] not in sessions[sub]:
+                sessions[sub].append(row['ses'])
+            directory = os.path.join(directory, 'ses-' + row['ses'])
+            prefix += '_ses-' + row['ses']
+        if not any(key in row for key in ('task', 'channels', 'electrodes', 'ieeg')):
+            directories.add(directory)
+            continue
+        directory = os.path.join(directory, DATATYPE)
+        directories.add(directory)
+
+        if 'electrodes' in row:
+            base = os.path.join(directory, prefix + '_electrodes')
+            if base + '.tsv' not in files:
+                files[base + '.tsv'], files[base + '.json'] = _table(template_electrodes, row['electrodes'])
+        if 'task' not in row:
+            continue
+        base = os.path.join(directory, prefix + '_task-' + row['task'])
+        if 'run' in row:
+            base += '_run-' + row['run']
+        if 'channels' in row:
+            files[base + '_channels.tsv'], files[base + '_channels.json'] = _table(template_channels, row['channels'])
+        sidecar = dict(template_ieeg)
+        sidecar['TaskName'] = row['task']
+        sidecar.update(row.get('ieeg', {}))
+        files[base + '_ieeg.json'] = json.dumps(sidecar, indent=4)
+
+    for sub, labels in sessions.items():
+        base = os.path.join(path, 'sub-' + sub, 'sub-{}_sessions'.format(sub))
+        files[base + '.tsv'] = ('tsv', list(template_sessions.keys()), [{'session-id': 'ses-' + label}
+                                                                        for label in labels])
+        files[base + '.json'] = json.dumps(template_sessions, indent=4)
+
+    # Only the deepest directories are created, os.makedirs creates their parents
+    parents = set()
+    for directory in directories:
+        parent = os.path.dirname(directory)
+        while parent not in parents and parent.__len__() > path.__len__():
+            parents.add(parent)
+            parent = os.path.dirname(parent)
+    return sorted(directories - parents), files, participants
+
+
+def _render(content):
+    """
+    Get the text of a planned file. Tables are written with the csv module, like DataFrame.to_csv but without
+    building a DataFrame for every file.
+    """
+    if not isinstance(content, tuple):
+        return content
+    _, columns, rows = content
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter='\t', lineterminator='\n')
+    writer.writerow(columns)
+    writer.writerows(['' if _missing(row.get(key)) else row[key] for key in columns] for row in rows)
+    return buffer.getvalue()
+
+
+def _make_directories(directories):
+    for directory in directories:
+        os.makedirs(directory, exist_ok=True)
+    return directories.__len__()
+
+
+def _write_files(args):
+    """
+    Write a batch of planned files in a worker.
+
+    Args:
+        args (tuple): List of (path, content) tuples and the overwrite flag.
+
+    Returns:
+        list: Paths of the written files.
+    """
+    files, overwrite = args
+    written = []
+    for path, content in files:
+        if not overwrite and os.path.exists(path):
+            # Sessions of existing subjects are listed in their sessions.tsv
+            if path.endswith('_sessions.tsv') and _merge_rows(path, content[2], SESSION_KEYS).__len__():
+                written.append(path)
+            continue
+        atomic_write(path, _render(content))
+        written.append(path)
+    return written
+
+
+def _merge_rows(path_tsv, rows, keys):
+    """
+    Append the rows with a key which is not listed yet to a TSV file in a single write. The text of the existing
+    rows is not changed.
+
+    Args:
+        path_tsv (str): Path to the TSV file.
+        rows (list): Rows as dicts with the key column keys[0].
+        keys (tuple): Names of the key column. The first one found in the file is used, keys[0] if there is none.
+
+    Returns:
+        list: Columns of the written table, empty if the file was not written.
+    """
+    if os.path.exists(path_tsv):
+        existing = pd.read_csv(path_tsv, sep='\t', dtype=str, keep_default_na=False)
+    else:
+        existing = pd.DataFrame([], columns=[keys[0]])
+    key = next((key for key in keys if key in existing.columns), keys[0])
+    listed = set(existing[key]) if key in existing.columns else set()
+    new = [row for row in rows if row[keys[0]] not in listed]
+    if new.__len__() == 0:
+        return []
+
+    added = pd.DataFrame(new).rename(columns={keys[0]: key})
+    columns = list(existing.columns) + [column for column in added.columns if column not in existing.columns]
+    table = pd.concat([existing, added], ignore_index=True).reindex(columns=columns)
+    atomic_write(path_tsv, table.to_csv(sep='\t', index=False, na_rep='n/a'))
+    return columns
+
+
+def _append_participants(path, participants):
+    """
+    Append the subjects which are not listed yet to participants.tsv in a single write and add their new columns to
+    participants.json.
+
+    Returns:
+        list: Paths of participants.tsv and participants.json if they were written, otherwise an empty list.
+    """
+    path_participants = os.path.join(path, 'participants.tsv')
+    columns = _merge_rows(path_participants, list(participants.values()), ('participant_id',))
+    if columns.__len__() == 0:
+        return []
+
+    written = [path_participants]
+    path_json = os.path.join(path, 'participants.json')
+    if os.path.exists(path_json):
+        with open(path_json) as f:
+            sidecar = json.load(f)
+    else:
+        sidecar = dict(template_participants)
+    added = [key for key in columns if key not in sidecar]
+    if added.__len__() or not os.path.exists(path_json):
+        sidecar.update({key: {} for key in added})
+        atomic_write(path_json, json.dumps(sidecar, indent=4))
+        written.append(path_json)
+    return written
+
+
+def bulk_create(path, manifest, n_jobs=1, overwrite=False, participant_columns=None):
+    """
+    Create the subjects, sessions and recordings of a manifest in a dataset, see plan_tree.
+
+    Args:
+        path (str): Path to the dataset directory.
+        manifest (pandas.DataFrame or iterable): Rows of subjects, sessions and recordings, see plan_tree.
+        n_jobs (int, optional): Number of threads, see parallel.resolve_n_jobs. Defaults to 1.
+        overwrite (bool, optional): Rewrite existing files. Defaults to False, which skips them, so a run interrupted
+            in between is resumed by running it again.
+        participant_columns (list, optional): Columns of participants.tsv taken from the manifest, see plan_tree.
+
+    Returns:
+        list: Paths of the written files.
+    """
+    directories, files, participants = plan_tree(path, manifest, participant_columns=participant_columns)
+
+    batches = [directories[i:i + BATCH_SIZE] for i in range(0, directories.__len__(), BATCH_SIZE)]
+    parallel_map(_make_directories, batches, n_jobs=n_jobs, executor='thread')
+
+    items = sorted(files.items())
+    batches = [(items[i:i + BATCH_SIZE], overwrite) for i in range(0, items.__len__(), BATCH_SIZE)]
+    written = [p for batch in parallel_map(_write_files, batches, n_jobs=n_jobs, executor='thread') for p in batch]
+    return written + _append_participants(path, participants)
@@ -0,0 +1,228 @@
+# Copyright 2020-present, Mayo Clinic Department of Neurology - Bioelectronics Neurophysiology and Engineering Laboratory
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+Binary cache of parsed TSV files.
+
+When enabled, BIDS_TSV stores the parsed content of every TSV file it reads in a binary (pickle) cache file and uses it
+instead of parsing the text when the TSV file is opened again. The TSV file stays the source of truth: a cache entry is
+used only if the path, size and modification time of the TSV file match the ones stored in the entry.
+
+The entry stores the frame as BIDS_TSV keeps it, i.e. aligned to the columns of the sidecar and converted to the column
+dtypes, so a cache hit needs no conversion. Entries are only used with the same columns and dtypes. Object columns are
+stored compactly: columns of floats, integers or strings are stored as codes of their unique values (or as numeric
+arrays if most values are unique), so unpickling does not rebuild every value and repeated values share one object.
+
+Cache files are stored either next to the TSV files as hidden files, or in a shared directory outside the BIDS tree.
+Cache files are unpickled, so the cache directory must not be writable by untrusted users.
+
+Example:
+    >>> enable_tsv_cache('/scratch/bids_cache')
+    >>> events = BIDS_TSV('sub-01_ses-01_task-rest_events.tsv')  # parsed and cached
+    >>> events = BIDS_TSV('sub-01_ses-01_task-rest_events.tsv')  # loaded from the cache
+"""
+import os
+import time
+import pickle
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from .fileio import atomic_write
+from . import instrumentation
+from .index import RACY_INTERVAL_NS
+
+
+CACHE_VERSION = 3
+
+# Object columns of homogeneous values which are stored as codes of their unique values
+CODED_KINDS = ('floating', 'integer', 'string')
+
+_config = {'enabled': False, 'directory': None}
+
+
+def enable_tsv_cache(directory=None):
+    """
+    Enable the binary TSV cache.
+
+    Args:
+        directory (str, optional): Shared cache directory, created if it does not exist. Defaults to None, which
+            stores the cache files next to the TSV files.
+    """
+    if isinstance(directory, str):
+        os.makedirs(directory, exist_ok=True)
+    _config['enabled'] = True
+    _config['directory'] = directory
+
+
+def disable_tsv_cache():
+    """
+    Disable the binary TSV cache. Existing cache files are kept.
+    """
+    _config['enabled'] = False
+    _config['directory'] = None
+
+
+def tsv_cache_enabled():
+    """
+    Check whether the binary TSV cache is enabled.
+
+    Returns:
+        bool: True if enabled.
+    """
+    return _config['enabled']
+
+
+def cache_path(path_tsv):
+    """
+    Get the path of the cache file of a TSV file.
+
+    Args:
+        path_tsv (str): Path to the TSV file.
+
+    Returns:
+        str: Path to the cache file.
+    """
+    path_tsv = os.path.abspath(path_tsv)
+    if _config['directory'] is None:
+        directory, name = os.path.split(path_tsv)
+        return os.path.join(directory, '.{}.cache.pkl'.format(name))
+    key = hashlib.sha1(path_tsv.encode('utf-8')).hexdigest()
+    return os.path.join(_config['directory'], key + '.pkl')
+
+
+def _key(path_tsv, st, variant):
+    return {'version': CACHE_VERSION, 'path': os.path.abspath(path_tsv), 'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns, 'variant': variant}
+
+
+def _pack_column(values):
+    """
+    Get a compact representation of an object column, see _unpack_column.
+    """
+    kind = pd.api.types.infer_dtype(values, skipna=False)
+    if kind not in CODED_KINDS:
+        return 'object', values
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    if uniques.__len__() <= values.__len__() // 2:
+        return 'codes', (codes.astype(np.int32), np.asarray(uniques, dtype=object))
+    if kind == 'floating':
+        return 'float', values.astype(np.float64)
+    if kind == 'integer':
+        try:
+            return 'int', values.astype(np.int64)
+        except OverflowError:
+            pass
+    return 'object', values
+
+
+def _unpack_column(packed, out):
+    kind, data = packed
+    if kind == 'codes':
+        codes, uniques = data
+        out[...] = uniques.take(codes)
+    else:
+        out[...] = data
+
+
+def _pack_frame(df):
+    """
+    Get a compact representation of a frame with a RangeIndex. Columns which are not object dtype are kept as they are.
+    """
+    columns = []
+    for key in df.columns:
+        values = df[key]
+        columns.append(_pack_column(values.to_numpy()) if values.dtype == object else ('series', values))
+    return {'columns': list(df.columns), 'start': df.index.start, 'n_rows': df.__len__(), 'data': columns}
+
+
+def _unpack_frame(packed):
+    """
+    Rebuild a frame packed with _pack_frame. Object columns are written into a single 2D block.
+    """
+    data = packed['data']
+    n_rows = packed['n_rows']
+    index = pd.RangeIndex(packed['start'], packed['start'] + n_rows)
+    if all(kind != 'series' for kind, _ in data):
+        block = np.empty((data.__len__(), n_rows), dtype=object)
+        for row, column in zip(block, data):
+            _unpack_column(column, row)
+        return pd.DataFrame(block.T, index=index, columns=packed['columns'], dtype=object, copy=False)
+
+    columns = {}
+    for position, (kind, column) in enumerate(data):
+        if kind == 'series':
+            values = column.to_numpy() if isinstance(column.dtype, np.dtype) else column.array
+        else:
+            values = np.empty(n_rows, dtype=object)
+            _unpack_column((kind, column), values)
+        columns[position] = values
+    df = pd.DataFrame(columns, index=index)
+    df.columns = packed['columns']
+    return df
+
+
+def load_cached(path_tsv, variant=None):
+    """
+    Load the cached content of a TSV file if the cache is enabled and the entry is fresh.
+
+    Args:
+        path_tsv (str): Path to the TSV file.
+        variant (optional): JSON-like description of how the content was converted (e.g. columns and dtypes). The
+            entry is used only if it was stored with an equal variant. Defaults to None.
+
+    Returns:
+        tuple: The parsed DataFrame and the hash of the TSV file, or None if there is no fresh entry.
+    """
+    if not _config['enabled']:
+        return None
+    path = cache_path(path_tsv)
+    t0 = instrumentation.start()
+    try:
+        st = os.stat(path_tsv)
+        with open(path, 'rb') as f:
+            header = pickle.load(f)
+            if header.get('key') != _key(path_tsv, st, variant):
+                return None
+            packed = pickle.load(f)
+            n_bytes = f.tell()
+        df = _unpack_frame(packed) if header.get('packed') else packed
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, KeyError, ValueError):
+        return None
+    instrumentation.record(t0, 'pkl', 'read', files=1, bytes_read=n_bytes, items=df.__len__())
+    return df, header['hash']
+
+
+def store_cached(path_tsv, st, df, text_hash, variant=None):
+    """
+    Store the parsed content of a TSV file in the cache if the cache is enabled.
+
+    Entries of files modified in the last moments are not stored, coarse modification times could hide changes.
+
+    Args:
+        path_tsv (str): Path to the TSV file.
+        st (os.stat_result): Result of os.stat of the TSV file taken before it was read.
+        df (pandas.DataFrame): Parsed content, as it is returned by load_cached.
+        text_hash (str): Hash of the TSV file.
+        variant (optional): JSON-like description of how the content was converted, see load_cached.
+    """
+    if not _config['enabled']:
+        return
+    if time.time_ns() - st.st_mtime_ns < RACY_INTERVAL_NS:
+        return
+    try:
+        if os.stat(path_tsv).st_mtime_ns != st.st_mtime_ns:
+            return
+    except OSError:
+        return
+    packed = isinstance(df.index, pd.RangeIndex) and df.index.step == 1 and df.columns.is_unique
+    data = pickle.dumps({'key': _key(path_tsv, st, variant), 'hash': text_hash, 'packed': packed},
+                        protocol=pickle.HIGHEST_PROTOCOL)
+    data += pickle.dumps(_pack_frame(df) if packed else df, protocol=pickle.HIGHEST_PROTOCOL)
+    try:
+        atomic_write(cache_path(path_tsv), data)
+    except OSError:
+        pass
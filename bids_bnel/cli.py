@@ -0,0 +1,256 @@
+# Copyright 2020-present, Mayo Clinic Department of Neurology - Bioelectronics Neurophysiology and Engineering Laboratory
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+Command-line interface of bids_bnel.
+
+Every subcommand opens the dataset with BIDSDataset, updates the cached file index (only changed directories are listed
+again) with --jobs threads, and prints either a short text summary or, with --json, a JSON document for scripts,
+cron jobs and dashboards. The bids-bnel command is installed with the package, python -m bids_bnel runs the same
+entry point without installation.
+
+Usage:
+    bids-bnel scan /data/bids --json
+    bids-bnel stats /data/bids --jobs 8
+    bids-bnel validate /data/bids --jobs -1 --json > report.json
+    bids-bnel export /data/bids events --columns onset duration trial_type --output events.tsv
+"""
+import os
+import sys
+import json
+import argparse
+from collections import Counter
+
+# Extensions of iEEG files which are not data files
+IEEG_AUXILIARY_EXTENSIONS = ('.json', '.vhdr', '.vmrk')
+
+
+def _open(args):
+    """
+    Open the dataset and get its up-to-date file index.
+
+    Returns:
+        tuple: BIDSDataset and BIDSIndex.
+    """
+    from .dataset import BIDSDataset
+    from .index import BIDSIndex
+
+    if not os.path.isdir(args.path):
+        raise ValueError('No such directory: {}'.format(args.path))
+    dataset = BIDSDataset(args.path, use_index=not args.no_cache, n_jobs=args.jobs)
+    if args.no_cache:
+        index = BIDSIndex(args.path)
+        index.update(save=False, n_jobs=args.jobs)
+        dataset._index = index
+    else:
+        dataset.update_index()
+        index = dataset.index
+    return dataset, index
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def scan(args):
+    """
+    Update the file index and count subjects, sessions and files.
+    """
+    _, index = _open(args)
+    records = index.records
+    subjects = index.subjects()
+    result = {
+        'path': os.path.abspath(args.path),
+        'n_subjects': subjects.__len__(),
+        'n_sessions': sum(index.sessions(label).__len__() for label in subjects),
+        'n_files': records.__len__(),
+        'n_scanned_dirs': index.scanned.__len__(),
+        'suffixes': dict(sorted(Counter('{}{}'.format(r['suffix'], r['extension']) for r in records).items())),
+    }
+    if args.sizes:
+        result['bytes'] = sum(os.path.getsize(r['path']) for r in records)
+    return result
+
+
+def stats(args):
+    """
+    Summarize subjects, sessions and recordings from the index and the inherited *_ieeg.json sidecars. Data files are
+    not opened.
+    """
+    dataset, index = _open(args)
+    recordings = sorted(r['path'] for r in index.query(suffix='ieeg')
+                        if r['extension'] not in IEEG_AUXILIARY_EXTENSIONS)
+    sidecars = dataset.resolve_metadata_many(recordings)
+
+    per_subject = {}
+    frequencies = Counter()
+    total_duration = 0.0
+    for path in recordings:
+        metadata = sidecars[path]
+        subject = per_subject.setdefault(os.path.relpath(path, args.path).split(os.sep)[0][4:],
+                                         {'n_recordings': 0, 'duration': 0.0})
+        duration = _number(metadata.get('RecordingDuration'))
+        subject['n_recordings'] += 1
+        if duration is not None:
+            subject['duration'] += duration
+            total_duration += duration
+        fs = _number(metadata.get('SamplingFrequency'))
+        if fs is not None:
+            frequencies[fs] += 1
+
+    subjects = index.subjects()
+    return {
+        'path': os.path.abspath(args.path),
+        'n_subjects': subjects.__len__(),
+        'n_sessions': sum(index.sessions(label).__len__() for label in subjects),
+        'n_recordings': recordings.__len__(),
+        'duration': total_duration,
+        'sampling_frequencies': {'{:g}'.format(fs): count for fs, count in sorted(frequencies.items())},
+        'subjects': {label: per_subject.get(label, {'n_recordings': 0, 'duration': 0.0}) for label in subjects},
+    }
+
+
+def validate(args):
+    """
+    Validate all TSV and JSON files against the templates.
+    """
+    from .validator import validate_dataset
+
+    dataset, index = _open(args)
+    report = validate_dataset(args.path, index=index, resolver=dataset._resolver, n_jobs=args.jobs,
+                              executor=args.executor)
+    result = report.to_dict()
+    result['path'] = os.path.abspath(args.path)
+    result['valid'] = report.is_valid
+    return result
+
+
+def export(args):
+    """
+    Concatenate the TSV files of one suffix into a single table.
+    """
+    dataset, _ = _open(args)
+    table = dataset.load_table(args.suffix, subjects=args.subjects, sessions=args.sessions, tasks=args.tasks,
+                               runs=args.runs, columns=args.columns, trial_type=args.trial_type)
+    output = args.output if args.output is not None else sys.stdout
+    fmt = args.format
+    if fmt is None:
+        fmt = os.path.splitext(args.output)[1][1:] if args.output is not None else 'tsv'
+    if fmt == 'tsv':
+        table.to_csv(output, sep='\t', index=False, na_rep='n/a')
+    elif fmt == 'csv':
+        table.to_csv(output, index=False)
+    elif fmt == 'json':
+        table.to_json(output, orient='records', lines=True)
+    elif fmt == 'parquet':
+        if args.output is None:
+            raise ValueError('Parquet export needs --output')
+        table.to_parquet(output, index=False)
+    else:
+        raise ValueError('Unknown export format {}'.format(fmt))
+    return {'path': os.path.abspath(args.path), 'suffix': args.suffix, 'n_rows': table.__len__(),
+            'columns': list(table.columns), 'output': args.output}
+
+
+def _print_text(command, result):
+    if command == 'validate':
+        print('{} files, {} errors, {} warnings'.format(result['n_files'], result['n_errors'], result['n_warnings']))
+        for issue in result['issues']:
+            print('{}: {}: {}'.format(issue['severity'], issue['path'], issue['message']))
+        return
+    for key, value in result.items():
+        if isinstance(value, dict):
+            print('{}:'.format(key))
+            for k, v in value.items():
+                print('    {}: {}'.format(k, v))
+        else:
+            print('{}: {}'.format(key, value))
+
+
+def build_parser():
+    """
+    Build the argument parser.
+
+    Returns:
+        argparse.ArgumentParser: Parser of the bids-bnel command.
+    """
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('path', help='Path to the BIDS dataset')
+    common.add_argument('--jobs', '-j', type=int, default=-1,
+                        help='Number of workers, negative values count from the number of CPUs (default: all CPUs)')
+    common.add_argument('--json', action='store_true', help='Print the result as JSON')
+    common.add_argument('--no-cache', action='store_true',
+                        help='Do not write the file index cache (read-only datasets). An existing cache is still used.')
+
+    parser = argparse.ArgumentParser(prog='bids-bnel', description='Scan, summarize, validate and export BIDS datasets')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('scan', parents=[common], help='Update the file index and count files')
+    p.add_argument('--sizes', action='store_true', help='Sum the file sizes (one stat per file)')
+    p.set_defaults(func=scan)
+
+    p = commands.add_parser('stats', parents=[common], help='Summarize subjects, sessions and recordings')
+    p.set_defaults(func=stats)
+
+    p = commands.add_parser('validate', parents=[common], help='Validate TSV and JSON files against the templates')
+    p.add_argument('--executor', choices=['thread', 'process'], default='process')
+    p.set_defaults(func=validate)
+
+    p = commands.add_parser('export', parents=[common], help='Concatenate TSV files of one suffix')
+    p.add_argument('suffix', help='Suffix of the TSV files, e.g. events')
+    p.add_argument('--output', '-o', help='Output file (default: standard output)')
+    p.add_argument('--format', choices=['tsv', 'csv', 'json', 'parquet'],
+                   help='Output format (default: from the output extension or tsv)')
+    p.add_argument('--subjects', nargs='+')
+    p.add_argument('--sessions', nargs='+')
+    p.add_argument('--tasks', nargs='+')
+    p.add_argument('--runs', nargs='+')
+    p.add_argument('--columns', nargs='+')
+    p.add_argument('--trial-type', nargs='+')
+    p.set_defaults(func=export)
+    return parser
+
+
+def main(argv=None):
+    """
+    Run the bids-bnel command.
+
+    Args:
+        argv (list, optional): Arguments without the program name. Defaults to sys.argv[1:].
+
+    Returns:
+        int: Exit status, 0 on success, 1 if validation found errors, 2 on failure and 141 if standard output was
+        closed early.
+    """
+    args = build_parser().parse_args(argv)
+    try:
+        result = args.func(args)
+        if args.command == 'export' and args.output is None:
+            # The table was written to standard output
+            pass
+        elif args.json:
+            json.dump(result, sys.stdout, indent=2)
+            sys.stdout.write('\n')
+        else:
+            _print_text(args.command, result)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # Standard output was closed early, e.g. by head. The output left in the buffer is flushed to devnull at exit.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 141
+    except (ValueError, OSError, ImportError) as e:
+        print('bids-bnel {}: error: {}'.format(args.command, e), file=sys.stderr)
+        return 2
+
+    if args.command == 'validate' and not result['valid']:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,5 @@
 import os
 import json
-import csv
 
 import os
 import shutil
@@ -9,62 +8,36 @@ import warnings
 import pandas as pd
 import json
 from .templates import *
+from .sidecar import BIDS_json, LazyDict, _hash_text
+from .index import BIDSIndex, parse_entities
+from .parallel import parallel_map, is_process_executor
+from .fileio import atomic_write, batch_write, replace_file
+from .brainvision import read_vhdr, write_vhdr, write_vmrk, BINARY_FORMATS
+from .events import EventIndex, fill_time_samples
+from .cache import load_cached, store_cached
+from .inheritance import SidecarResolver
+from .validator import validate_dataset
+from .bulk import bulk_create
+from .manifest import DatasetManifest
+from .derive import derive_dataset
+from . import instrumentation
+from .aio import run_blocking, gather_limited, DEFAULT_LIMIT
 
-import unittest
-import tempfile
 import os
 import json
 import warnings
 import time
+import io
+from contextlib import contextmanager
+from collections.abc import Mapping
 
+import numpy as np
 import pandas as pd
 
 
 BIDS_VERSION = '1.4.1'
 DELIMITER = os.path.sep
 
-class BIDS_json(dict):
-    """
-    Class for creating BIDS compatible json files
-
-    This class extends the built-in `dict` class to provide functionality
-    for creating and saving BIDS compatible json files.
-
-    Attributes:
-        _path (str): Path to the json file.
-        _data (dict): Dictionary to store the json data.
-
-    Args:
-        path (str): Path to the json file.
-    """
-
-    def __init__(self, path):
-        """
-        Initialize Bids_json object with a path to a json file.
-
-        Args:
-            path (str): Path to the json file.
-        """
-        super().__init__()
-        self._path = path
-
-        # Load existing json file if it exists
-        if os.path.exists(self._path):
-            with open(self._path, 'r') as f:
-                self._data = json.load(f)
-                for key, value in self._data.items():
-                    self[key] = value
-
-    def dump(self):
-        """
-        Save the Bids_json object to the json file.
-
-        This method saves the current Bids_json object to the json file
-        specified during object initialization, with an indentation of 4 spaces.
-        """
-        with open(self._path, 'w') as f:
-            json.dump(self, f, indent=4)
-
 class BIDS_TSV(pd.DataFrame):
     """
     This class represents a BIDS (Brain Imaging Data Structure) TSV (Tab-Separated Values) file, which is a type of
@@ -75,6 +48,8 @@ class BIDS_TSV(pd.DataFrame):
         - path_tsv (str): The path to the TSV file.
         - path_json (str, optional): The path to the associated JSON file containing metadata. If not provided, it is
           derived from the path_tsv by replacing the file extension with ".json".
+        - dtypes_schema (dict): Dtypes of the columns (see templates.column_dtypes), empty if all columns have object
+          dtype.
         - metadata (BIDS_json): A dictionary-like object representing the metadata loaded from the JSON file.
 
     Methods:
@@ -82,12 +57,26 @@ class BIDS_TSV(pd.DataFrame):
         - set_template(self, template): Sets a metadata template for filling missing values.
         - dump(self): Saves the DataFrame to the TSV file and the metadata to the JSON file.
         - add_row(self, row): Adds a row to the DataFrame.
+        - add_rows(self, rows): Adds multiple rows to the DataFrame at once.
+        - append_buffer(self): Context manager collecting added rows and merging them into the DataFrame at once.
+        - flush(self): Merges rows collected in the append buffer into the DataFrame.
+        - event_index(self): Interval index over the onset/duration/offset columns of an events table.
+        - fill_time_samples(self, fs=None): Computes missing onset/offset or sample_start/sample_end columns.
 
     Properties:
         - metadata: Property that provides access to the metadata as a dictionary-like object.
 
+    The hash of the TSV file is stored when it is loaded or saved, and dump writes the TSV file (and the JSON file) only
+    if the content changed since then.
+
     """
-    def __init__(self, path_tsv, path_json=None, *args, **kwargs):
+    # Attributes which are not columns. pandas warns when list-like values (e.g. the dtypes dict) are assigned to other
+    # new attribute names.
+    _internal_names = pd.DataFrame._internal_names + ['_path_tsv', '_path_json', '_row_buffer', '_saved_hash',
+                                                      '_loaded_file', '_event_index', '_name', '_dtypes']
+    _internal_names_set = set(_internal_names)
+
+    def __init__(self, path_tsv, path_json=None, *args, dtypes=None, **kwargs):
         """
         Constructor for BIDS_TSV class.
 
@@ -95,6 +84,10 @@ class BIDS_TSV(pd.DataFrame):
             path_tsv (str): Path to the TSV file.
             path_json (str, optional): Path to the JSON file. Defaults to None.
             *args: Variable length argument list.
+            dtypes (bool or dict, optional): Dtypes of the columns, applied at load and kept when rows are added.
+                True uses the dtypes of the suffix in templates.column_dtypes (categorical enumerated columns, float
+                times and nullable integer samples), a dict maps column names to dtypes. Defaults to None, which
+                stores all columns with object dtype.
             **kwargs: Arbitrary keyword arguments.
 
         Raises:
@@ -106,7 +99,14 @@ class BIDS_TSV(pd.DataFrame):
             raise TypeError('path_tsv must be a string')
 
         self._path_tsv = path_tsv
+        self._row_buffer = None
+        self._saved_hash = None
+        self._loaded_file = None
+        self._event_index = None
         self._name = path_tsv.split(DELIMITER)[-1][:-4].split('_')[-1]
+        if dtypes is True:
+            dtypes = column_dtypes.get(self._name, {})
+        self._dtypes = dict(dtypes) if dtypes else {}
 
         if not isinstance(path_json, str):
             self._path_json = path_tsv.replace('.tsv', '.json')
@@ -128,6 +128,19 @@ class BIDS_TSV(pd.DataFrame):
             else:
                 warnings.warn('No template found for {}'.format(self._name))
 
+        if self._dtypes:
+            self._set_frame(_apply_dtypes(pd.DataFrame(self), self._dtypes))
+
+    @property
+    def dtypes_schema(self):
+        """
+        Get the dtypes of the columns applied at load and when rows are added.
+
+        Returns:
+            dict: Dtype by column name, empty if all columns have object dtype.
+        """
+        return dict(self._dtypes)
+
     @property
     def metadata(self):
         """
@@ -148,6 +161,39 @@ class BIDS_TSV(pd.DataFrame):
         """
         self._metadata = value
 
+    @classmethod
+    async def aload(cls, path_tsv, path_json=None, executor=None):
+        """
+        Load a TSV file and its sidecar without blocking the event loop. Reading and parsing run in an executor.
+
+        Args:
+            path_tsv (str): Path to the TSV file.
+            path_json (str, optional): Path to the JSON sidecar. Derived from path_tsv by default.
+            executor (Executor, optional): Executor running the load. Defaults to the default executor of the loop.
+
+        Returns:
+            BIDS_TSV: The loaded file.
+
+        Example:
+            >>> events = await BIDS_TSV.aload(path)
+        """
+        return await run_blocking(cls, path_tsv, path_json, executor=executor)
+
+    @classmethod
+    async def aload_many(cls, paths, limit=DEFAULT_LIMIT, executor=None):
+        """
+        Load many TSV files concurrently without blocking the event loop.
+
+        Args:
+            paths (iterable): Paths to the TSV files.
+            limit (int, optional): Maximum number of concurrent loads. Defaults to aio.DEFAULT_LIMIT.
+            executor (Executor, optional): Executor running the loads. Defaults to the default executor of the loop.
+
+        Returns:
+            list: Loaded files in the order of the paths.
+        """
+        return await gather_limited(cls, paths, limit=limit, executor=executor)
+
     def set_template(self, template):
         """
         Set the metadata using a template.
@@ -164,178 +210,1839 @@ class BIDS_TSV(pd.DataFrame):
                 warnings.warn("Key '{}' not found in tsv and was filled empty".format(key))
                 self[key] = None
 
-    def dump(self):
+    def _serialize(self):
+        """
+        Serialize the DataFrame to the text stored in the TSV file.
+
+        Returns:
+            str: Tab separated text without the index.
+        """
+        return self.to_csv(sep='\t', index=False)
+
+    def is_dirty(self):
+        """
+        Check whether the DataFrame or the metadata differ from the files.
+
+        Returns:
+            bool: True if the DataFrame or the metadata changed since the last load or save, or if the TSV file does
+            not exist.
+        """
+        if self._row_buffer:
+            return True
+        if not os.path.exists(self._path_tsv) or not self._is_saved(_hash_text(self._serialize())):
+            return True
+        return self._metadata.is_dirty()
+
+    def _is_saved(self, text_hash):
+        """
+        Check whether serialized content is the content at the last load or save.
+
+        Serializing a loaded file costs several times more than parsing it, so _load_tsv stores only the hash of the
+        file bytes. The hash of the loaded content serialized again is computed here on first use, by parsing the file
+        again, and only if the content is not written back byte for byte (e.g. 'n/a' or '1.50'). A file modified
+        since the load is dirty.
+
+        Args:
+            text_hash (str): Hash of the serialized content.
+
+        Returns:
+            bool: True if the content did not change since the last load or save.
+        """
+        if self._loaded_file is not None:
+            st_key, file_hash, columns = self._loaded_file
+            self._loaded_file = None
+            if text_hash == file_hash:
+                self._saved_hash = file_hash
+            else:
+                try:
+                    st = os.stat(self._path_tsv)
+                    with open(self._path_tsv, 'rb') as f:
+                        data = f.read() if (st.st_size, st.st_mtime_ns) == st_key else None
+                except OSError:
+                    data = None
+                if data is not None and _hash_text(data) == file_hash:
+                    loaded = self._read_frame(data, columns)
+                    # An unchanged frame is not serialized a second time
+                    self._saved_hash = text_hash if loaded.equals(self) else \
+                        _hash_text(loaded.to_csv(sep='\t', index=False))
+        return self._saved_hash is not None and text_hash == self._saved_hash
+
+    def _mark_saved(self, text_hash):
+        """
+        Store the hash of the content written to the TSV file.
+        """
+        self._saved_hash = text_hash
+        self._loaded_file = None
+
+    def dump(self, force=False):
         """
         Dump the TSV and metadata to their respective files.
 
+        Each file is written only if its content changed since the last load or save.
+
+        Args:
+            force (bool, optional): Write the files even if the content did not change. Defaults to False.
+
+        Returns:
+            list: Paths of the written files, empty if nothing was written.
+
         Warnings:
             Warns if a key in the metadata is not found in the TSV and fills it with an empty value.
         """
-        self.to_csv(self._path_tsv, sep='\t', index=False)
+        self.flush()
+        written = []
+
+        t0 = instrumentation.start()
+        text = self._serialize()
+        instrumentation.record(t0, 'tsv', 'serialize', items=self.__len__())
+        text_hash = _hash_text(text)
+        if force or not os.path.exists(self._path_tsv) or not self._is_saved(text_hash):
+            atomic_write(self._path_tsv, text, on_commit=lambda: self._mark_saved(text_hash))
+            written.append(self._path_tsv)
 
         for key in self.keys():
             if key not in self._metadata.keys():
                 warnings.warn("Key '{}' not found in metadata and was filled empty".format(key))
                 self._metadata[key] = {}
 
-        self._metadata.dump()
+        written += self._metadata.dump(force=force)
+        return written
 
     def _load_tsv(self):
         """
         Load data from the TSV file and add rows to the BIDS_TSV object.
+
+        The file is loaded in a single columnar step. Columns are aligned to the columns defined by the JSON
+        sidecar (columns missing in the TSV are filled with NaN, columns not described by the sidecar are dropped)
+        and stored with object dtype, matching the result of adding the rows one by one, or with the dtypes given to
+        the constructor.
+
+        Only the hash of the file bytes is stored for the dirty check, the content is serialized by dump or
+        is_dirty, see _is_saved. A file which pandas does not write back byte for byte (e.g. 'n/a' or '1.50') is
+        therefore not dirty until it is edited.
+
+        If the binary TSV cache is enabled (see cache.enable_tsv_cache), a fresh cache entry is used instead of
+        parsing the file and new entries are stored after parsing. The entry holds the aligned frame with its dtypes,
+        so a cache hit skips the conversion as well.
+        """
+        columns = list(self.columns)
+        variant = {'columns': columns, 'dtypes': {key: str(dtype) for key, dtype in self._dtypes.items()}}
+        cached = load_cached(self._path_tsv, variant)
+        if cached is not None:
+            df, file_hash = cached
+            st = os.stat(self._path_tsv)
+            t0 = instrumentation.start()
+        else:
+            t0 = instrumentation.start()
+            st = os.stat(self._path_tsv)
+            with open(self._path_tsv, 'rb') as f:
+                data = f.read()
+            instrumentation.record(t0, 'tsv', 'read', files=1, bytes_read=data.__len__())
+            t0 = instrumentation.start()
+            file_hash = _hash_text(data)
+            df = self._read_frame(data, columns)
+
+        # Rows given to the constructor come first, the content is cached only without them
+        from_file = self.index.__len__() == 0
+        if df.__len__():
+            if not from_file:
+                df = _concat_frames([pd.DataFrame(self), df], self._dtypes, ignore_index=True)
+            self._set_frame(df)
+        if df.__len__() and from_file:
+            self._saved_hash = None
+            self._loaded_file = ((st.st_size, st.st_mtime_ns), file_hash, columns)
+        else:
+            self._saved_hash = _hash_text(self._serialize())
+        if cached is None and from_file:
+            store_cached(self._path_tsv, st, df, file_hash, variant)
+        instrumentation.record(t0, 'tsv', 'parse', items=df.__len__())
+
+    def _read_frame(self, data, columns):
+        """
+        Parse the bytes of the TSV file and align them to the columns with the dtypes of the object.
+
+        Args:
+            data (bytes): Content of the TSV file.
+            columns (list): Columns defined by the JSON sidecar.
+
+        Returns:
+            pd.DataFrame: The parsed content, with the columns of the file if it has no rows.
         """
-        df = pd.read_csv(self._path_tsv, sep='\t')
+        df = pd.read_csv(io.BytesIO(data), sep='\t')
         if df.__len__():
-            for idx, row in df.iterrows():
-                self.add_row(row)
+            df = _apply_dtypes(df.reindex(columns=columns), self._dtypes)
+        return df
+
+    def _set_frame(self, df):
+        """
+        Replace the content of the BIDS_TSV object in place while keeping paths and metadata.
+
+        Args:
+            df (pd.DataFrame): The new content.
+        """
+        pd.DataFrame.__init__(self, df)
+
+    def __reduce__(self):
+        """
+        Pickle the content, paths and metadata, e.g. for passing the object between processes.
+        """
+        state = (self._path_tsv, self._path_json, pd.DataFrame(self), self._metadata, self._row_buffer, self._saved_hash,
+                 self._dtypes, self._loaded_file)
+        return _restore_tsv, state
 
     def add_row(self, row):
         """
         Add a row to the DataFrame.
 
+        If the append buffer is active, the row is stored and merged into the DataFrame on flush.
+
         Args:
             row (pd.Series): The row to be added as a pandas Series.
 
         """
-        self.loc[self.index.__len__()] = row
+        if self._row_buffer is not None:
+            self._row_buffer.append(row)
+            return
+        if self._dtypes:
+            # Setting a row with loc would turn typed columns to object for new categories or missing values
+            self._merge_rows([row])
+            return
+        t0 = instrumentation.start()
+        n_rows = self.index.__len__()
+        self.loc[n_rows] = row
+        self._update_event_index(n_rows)
+        instrumentation.record(t0, 'tsv', 'insert', items=1)
         #return BIDS_TSV(self._path_tsv, self._path_json, (self._append(row, ignore_index=True)))
 
-class BIDS_iEEG:
-    def __init__(self, path):
-        pass
+    def add_rows(self, rows):
+        """
+        Add multiple rows to the DataFrame at once.
 
-class BIDS_session:
-    def __init__(self, path):
-        pass
+        The result is the same as calling add_row for every row, but the DataFrame is extended only once.
+        If the append buffer is active, the rows are stored and merged into the DataFrame on flush.
 
-class BID_subject:
-    def __init__(self, path):
-        self.path = path
-        self._sessions = {}
+        Args:
+            rows (pd.DataFrame, list or iterable): Rows to be added. Either a DataFrame or an iterable (list,
+                generator) of dicts or pandas Series.
 
-    def create_session(self, session):
-        pass
+        Raises:
+            TypeError: If rows is a single row (dict, pandas Series or string), use add_row instead.
+        """
+        if isinstance(rows, (Mapping, pd.Series, str)):
+            raise TypeError('add_rows expects an iterable of rows, got a single {}. Use add_row to add one row.'
+                            .format(type(rows).__name__))
+        if isinstance(rows, pd.DataFrame):
+            chunk = [rows]
+        else:
+            chunk = list(rows)
 
-    def find_sessions(self):
-        pass
+        if self._row_buffer is not None:
+            self._row_buffer.extend(chunk)
+        else:
+            self._merge_rows(chunk)
 
-class BIDSDataset(dict):
-    """
-    Class representing a BIDS dataset.
+    @contextmanager
+    def append_buffer(self):
+        """
+        Context manager collecting rows added by add_row and add_rows and merging them into the DataFrame at once
+        when the context is left.
 
-    This class provides methods to create and manipulate a BIDS dataset, including creating and updating metadata JSON
-    files, and loading metadata from existing JSON files.
+        Pending rows are also merged by flush and dump.
 
-    Args:
-        path (str): Path to the BIDS dataset directory.
-        create_dataset (bool, optional): Flag indicating whether to create a new dataset. Defaults to False.
+        Example:
+            >>> with tsv.append_buffer():
+            ...     for event in events:
+            ...         tsv.add_row(event)
+        """
+        if self._row_buffer is not None:
+            yield self
+            return
+
+        self._row_buffer = []
+        try:
+            yield self
+        finally:
+            self.flush()
+            self._row_buffer = None
+
+    def flush(self):
+        """
+        Merge rows collected in the append buffer into the DataFrame.
+        """
+        if not self._row_buffer:
+            return
+        rows = self._row_buffer
+        self._row_buffer = []
+        self._merge_rows(rows)
 
-    Attributes:
-        path (str): Path to the BIDS dataset directory.
-        _participants_path (str): Path to the participants.tsv file.
-        _jsons (dict): Dictionary to store instances of Bids_json class for each metadata JSON file.
-        _participants_meta (pandas.DataFrame): DataFrame to store participant metadata.
+    def _merge_rows(self, rows):
+        """
+        Merge rows into the DataFrame in a single step.
 
-    Raises:
-        ValueError: If the specified directory does not exist.
+        Args:
+            rows (list): DataFrames, dicts or pandas Series. Consecutive dicts and Series are converted to a single
+                DataFrame.
+        """
+        t0 = instrumentation.start()
+        frames = []
+        records = []
+        for row in rows:
+            if isinstance(row, pd.DataFrame):
+                if records.__len__():
+                    frames.append(pd.DataFrame(records))
+                    records = []
+                frames.append(row)
+            else:
+                records.append(row)
+        if records.__len__():
+            frames.append(pd.DataFrame(records))
 
-    """
+        if self.columns.__len__():
+            frames = [df.reindex(columns=self.columns) for df in frames if df.__len__()]
+        else:
+            frames = [df for df in frames if df.__len__()]
+        if frames.__len__() == 0:
+            return
+
+        df = pd.concat(frames, ignore_index=True) if frames.__len__() > 1 else frames[0]
+        if self._dtypes:
+            df = _apply_dtypes(df, self._dtypes)
+        n_rows = self.index.__len__()
+        df.index = pd.RangeIndex(n_rows, n_rows + df.__len__())
+        if n_rows:
+            df = _concat_frames([pd.DataFrame(self), df], self._dtypes)
+        self._set_frame(df)
+        self._update_event_index(n_rows)
+        instrumentation.record(t0, 'tsv', 'insert', items=df.__len__() - n_rows)
+
+    def event_index(self, rebuild=False):
+        """
+        Get the interval index over the onset, duration and offset columns (see template_events) for fast time range
+        queries. The index is built on first call and updated when rows are added with add_row or add_rows.
+
+        Args:
+            rebuild (bool, optional): Rebuild the index, needed after rows were modified or removed in place.
+                Defaults to False.
 
-    def __init__(self, path: str, create_dataset=False):
+        Returns:
+            EventIndex: Interval index. Query results are row positions usable with iloc.
         """
-        Initialize a BIDSDataset instance.
+        self.flush()
+        if rebuild or self._event_index is None or self._event_index.n_rows != self.index.__len__():
+            self._event_index = EventIndex(self)
+        return self._event_index
+
+    def fill_time_samples(self, fs=None, overwrite=False, resolver=None):
+        """
+        Compute missing onset/offset columns from sample_start/sample_end or vice versa for all rows at once, see
+        events.fill_time_samples.
 
         Args:
-            path (str): Path to the BIDS dataset directory.
-            create_dataset (bool, optional): Flag indicating whether to create a new dataset. Defaults to False. If true, overwrites existing dataset.
+            fs (float, optional): Sampling frequency in Hz. Defaults to the SamplingFrequency of the recording, i.e. of
+                the *_ieeg.json sidecars applying to it following the BIDS inheritance principle.
+            overwrite (bool, optional): Recompute the samples of all rows with a time. Defaults to False.
+            resolver (SidecarResolver or BIDSDataset, optional): Resolver of the inherited sidecars. Defaults to a
+                resolver of the dataset containing the file (the closest parent directory with a
+                dataset_description.json), or only the *_ieeg.json file of the same recording outside a dataset.
+
+        Returns:
+            BIDS_TSV: self
 
+        Raises:
+            ValueError: If fs is not given and no sidecar of the recording has a SamplingFrequency.
         """
-        super().__init__()
+        if fs is None:
+            fs = _sampling_frequency(self._recording_metadata(resolver))
+            if fs is None:
+                raise ValueError('No SamplingFrequency found in the *_ieeg.json sidecars of {}'.format(self._path_tsv))
+        self.flush()
+        fill_time_samples(self, fs, overwrite=overwrite)
+        self._event_index = None
+        return self
+
+    def _recording_metadata(self, resolver=None):
+        """
+        Get the inherited *_ieeg.json metadata of the recording of the file.
+        """
+        base = self._path_tsv[:self._path_tsv.rfind('_') + 1]
+        if isinstance(resolver, BIDSDataset):
+            resolver = resolver._resolver
+        if resolver is None:
+            root = _dataset_root(self._path_tsv)
+            if root is None:
+                path_ieeg = base + 'ieeg.json'
+                return BIDS_json(path_ieeg) if os.path.exists(path_ieeg) else {}
+            resolver = SidecarResolver(root, loader=BIDS_json)
+        # The extension of the recording does not matter for the sidecars applying to it
+        return resolver.resolve(base + 'ieeg.eeg')
+
+    def _update_event_index(self, n_rows):
+        """
+        Add rows starting at position n_rows to the interval index if it was built.
+        """
+        if self._event_index is not None and self._event_index.n_rows == n_rows:
+            self._event_index.extend(self.iloc[n_rows:], first_position=n_rows)
 
-        self.path = path
-        self._participants_path = os.path.join(self.path, 'participants.tsv')
-        self._jsons = {}
 
-        if create_dataset:
-            self._create_dataset()
+def _dataset_root(path):
+    """
+    Get the closest parent directory of a file containing a dataset_description.json, None if there is none.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    while True:
+        if os.path.exists(os.path.join(directory, 'dataset_description.json')):
+            return directory
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+def _sampling_frequency(metadata):
+    """
+    Get the SamplingFrequency of iEEG sidecar metadata as float, None if missing or empty.
+    """
+    try:
+        return float(metadata.get('SamplingFrequency'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _dataset_dtypes(dtypes):
+    """
+    Check the dtypes option of BIDSDataset, BID_subject and BIDS_session.
+
+    Returns:
+        bool or dict: True for the dtypes of templates.column_dtypes, a dict of column dtypes by suffix, or None.
+
+    Raises:
+        TypeError: If dtypes is neither a bool, None nor a dict of {column: dtype} dicts by suffix.
+    """
+    if dtypes is None or dtypes is False:
+        return None
+    if dtypes is True:
+        return True
+    if isinstance(dtypes, Mapping) and all(isinstance(value, Mapping) for value in dtypes.values()):
+        return {suffix: dict(value) for suffix, value in dtypes.items()}
+    raise TypeError('dtypes must be a bool or a dict of {{column: dtype}} dicts by suffix (see '
+                    'templates.column_dtypes), got {!r}'.format(dtypes))
+
+
+def _suffix_dtypes(dtypes, path):
+    """
+    Get the column dtypes of a TSV file from the dtypes option of BIDSDataset, BID_subject and BIDS_session.
+    """
+    if not dtypes:
+        return None
+    suffix = parse_entities(os.path.basename(path))['suffix']
+    if dtypes is True:
+        return column_dtypes.get(suffix, {})
+    return dtypes.get(suffix, {})
+
+
+def _convert_column(values, dtype):
+    """
+    Convert a column to a dtype of templates.column_dtypes. Values which are not numbers are dropped from numeric
+    columns with a warning.
+    """
+    if str(values.dtype) == str(dtype):
+        return values
+    if dtype == 'category' or dtype == object:
+        return values.astype(dtype)
+    numeric = pd.to_numeric(values, errors='coerce')
+    if (numeric.isna() & values.notna()).any():
+        warnings.warn("Column '{}' has values which are not numbers, they were set empty".format(values.name))
+    try:
+        return numeric.astype(dtype)
+    except (TypeError, ValueError):
+        warnings.warn("Column '{}' cannot be converted to {} and was kept as {}".format(values.name, dtype,
+                                                                                      numeric.dtype))
+        return numeric
+
+
+def _apply_dtypes(df, dtypes):
+    """
+    Convert the columns with a dtype in dtypes and all other columns to object dtype.
+    """
+    if not dtypes:
+        return df.astype(object)
+    columns = {key: _convert_column(df[key], dtypes.get(key, object)) for key in df.columns}
+    return pd.DataFrame(columns, index=df.index, columns=df.columns)
+
+
+def _concat_frames(frames, dtypes, ignore_index=False):
+    """
+    Concatenate frames with the same columns. Categorical columns get the union of the categories of all frames
+    instead of falling back to object dtype.
+    """
+    if dtypes:
+        frames = [df.copy(deep=False) for df in frames]
+        for key, dtype in dtypes.items():
+            if dtype != 'category' or not all(key in df.columns and df[key].dtype == 'category' for df in frames):
+                continue
+            categories = pd.Index([c for df in frames for c in df[key].cat.categories]).unique()
+            for df in frames:
+                df[key] = df[key].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=ignore_index)
+
+
+def _restore_tsv(path_tsv, path_json, df, metadata, row_buffer, saved_hash, dtypes=None, loaded_file=None):
+    """
+    Restore a pickled BIDS_TSV object without reading the files.
+    """
+    tsv = BIDS_TSV.__new__(BIDS_TSV)
+    pd.DataFrame.__init__(tsv, df)
+    tsv._path_tsv = path_tsv
+    tsv._path_json = path_json
+    tsv._name = path_tsv.split(DELIMITER)[-1][:-4].split('_')[-1]
+    tsv._row_buffer = row_buffer
+    tsv._metadata = metadata
+    tsv._saved_hash = saved_hash
+    tsv._loaded_file = loaded_file
+    tsv._event_index = None
+    tsv._dtypes = dtypes if dtypes is not None else {}
+    return tsv
+
+# Number of events per batch of BIDS_iEEG.epochs and iter_epochs
+EPOCH_BATCH_SIZE = 256
+
+
+class BIDS_iEEG:
+    """
+    Class representing an iEEG recording stored as a binary data file (BrainVision .eeg or raw binary).
+
+    The data are memory-mapped and never loaded fully into memory. Sampling frequency and channel count are taken from
+    the *_ieeg.json sidecar (see template_ieeg), channel names from the *_channels.tsv file. For BrainVision files,
+    data type, orientation and missing values are taken from the .vhdr header. Raw binary files need the dtype.
+
+    Args:
+        path (str): Path to the data file (or to the .vhdr header of a BrainVision recording).
+        dtype (str or numpy.dtype, optional): Data type of raw binary files. Overrides the .vhdr header.
+        path_json (str, optional): Path to the *_ieeg.json sidecar. Derived from the data file by default.
+        path_channels (str, optional): Path to the *_channels.tsv file. Derived from the data file by default.
+        orientation (str, optional): 'multiplexed' (samples of all channels interleaved) or 'vectorized' (channels
+            stored one after another) for raw binary files. Defaults to 'multiplexed'.
+        offset (int, optional): Number of header bytes before the data in raw binary files. Defaults to 0.
+
+    Attributes:
+        path (str): Path to the data file.
+        metadata (BIDS_json): The *_ieeg.json sidecar.
+        channels (pandas.DataFrame): Content of the *_channels.tsv file or None if it does not exist.
+        channel_names (list): Names of the channels.
+        resolution (numpy.ndarray): Physical value of one unit of the stored data per channel.
+
+    Example:
+        >>> ieeg = BIDS_iEEG('sub-01_ses-01_task-rest_ieeg.eeg')
+        >>> x = ieeg.read_time(10, 20, channels=['e1', 'e2'])
+        >>> for start, block in ieeg.iter_chunks(ieeg.fs * 60):
+        ...     process(block)
+    """
+    def __init__(self, path, dtype=None, path_json=None, path_channels=None, orientation='multiplexed', offset=0):
+        header = None
+        if path.endswith('.vhdr'):
+            header = read_vhdr(path)
+            path = header['data_file']
+        elif path.endswith('.eeg') and os.path.exists(path[:-4] + '.vhdr'):
+            header = read_vhdr(path[:-4] + '.vhdr')
+
+        self.path = path
+        base = path.rsplit('.', 1)[0]
+        if base.endswith('_ieeg'):
+            base = base[:-5]
+        self._path_json = path_json if isinstance(path_json, str) else base + '_ieeg.json'
+        self._path_channels = path_channels if isinstance(path_channels, str) else base + '_channels.tsv'
+
+        self.metadata = BIDS_json(self._path_json)
+        self.channels = None
+        if os.path.exists(self._path_channels):
+            self.channels = pd.read_csv(self._path_channels, sep='\t')
+
+        self._fs = self._sidecar_number('SamplingFrequency')
+        if self._fs is None and header is not None:
+            self._fs = header['sampling_frequency']
+        if self._fs is None:
+            raise ValueError('SamplingFrequency not found for {}'.format(path))
+
+        if self.channels is not None and self.channels.__len__():
+            self.channel_names = [str(name) for name in self.channels['name']]
+        elif header is not None and header['channels'].__len__():
+            self.channel_names = [ch['name'] for ch in header['channels']]
         else:
-            self._load_dataset()
+            counts = [self._sidecar_number(key) for key in self.metadata.keys() if key.endswith('ChannelCount')]
+            n_channels = sum(count for count in counts if count is not None)
+            self.channel_names = [str(idx) for idx in range(int(n_channels))]
+        if self.channel_names.__len__() == 0:
+            raise ValueError('Number of channels not found for {}'.format(path))
+
+        if dtype is None:
+            if header is None:
+                raise ValueError('dtype must be given for raw binary recordings')
+            dtype = header['dtype']
+        if header is not None:
+            orientation = header['orientation']
+            offset = 0
+        self.dtype = np.dtype(dtype)
+        self.orientation = orientation.lower()
+        self.offset = offset
+
+        self.resolution = np.ones(self.n_channels)
+        if header is not None and header['channels'].__len__() == self.n_channels:
+            self.resolution = np.array([ch['resolution'] for ch in header['channels']])
+
+        self._data = None
+
+    def _sidecar_number(self, key):
+        """
+        Get a numeric value from the sidecar. Empty template values are treated as missing.
 
-        if not os.path.exists(self.path):
-            raise ValueError(f'No such directory: {self.path}')
+        Returns:
+            float: The value or None.
+        """
+        value = self.metadata.get(key, '')
+        if value == '' or value is None:
+            return None
+        return float(value)
 
-    def _create_dataset(self):
+    @property
+    def fs(self):
         """
-        Create a new BIDS dataset.
+        Get the sampling frequency in Hz.
+        """
+        return self._fs
 
-        This method creates a new BIDS dataset by creating metadata JSON files using the provided templates, and
-        optionally creating a participants.tsv file.
+    @property
+    def n_channels(self):
+        """
+        Get the number of channels.
+        """
+        return self.channel_names.__len__()
 
+    @property
+    def n_samples(self):
+        """
+        Get the number of samples per channel.
         """
+        return self.data.shape[1]
 
-        if os.path.exists(self.path):
-            shutil.rmtree(self.path)
-            time.sleep(0.1)
-        else:
-            os.mkdir(self.path)
+    @property
+    def duration(self):
+        """
+        Get the duration of the recording in seconds.
+        """
+        return self.n_samples / self.fs
 
-            self['dataset_description'] = Bids_json(os.path.join(self.path, 'dataset_description.json'))
-            self['events'] = Bids_json(os.path.join(self.path, 'events.json'))
-            self['coordsystem'] = Bids_json(os.path.join(self.path, 'coordsystem.json'))
-            self['electrodes'] = Bids_json(os.path.join(self.path, 'electrodes.json'))
-            self['channels'] = Bids_json(os.path.join(self.path, 'channels.json'))
-            self['participants'] = Bids_json(os.path.join(self.path, 'participants.json'))
+    @property
+    def data(self):
+        """
+        Get the memory-mapped data with shape (n_channels, n_samples). The file is mapped on first access.
 
-            self._jsons['events'] = Bids_json(os.path.join(self.path, 'events.json'))
-            self._jsons['events'].update(template_events)
-            self._jsons['coordsystem'] = Bids_json(os.path.join(self.path, 'coordsystem.json'))
-            self._jsons['coordsystem'].update(template_coordsystem)
-            self._jsons['electrodes'] = Bids_json(os.path.join(self.path, 'electrodes.json'))
-            self._jsons['electrodes'].update(template_electrodes)
-            self._jsons['channels'] = Bids_json(os.path.join(self.path, 'channels.json'))
-            self._jsons['channels'].update(template_channels)
-            self._jsons['participants'] = Bids_json(os.path.join(self.path, 'participants.json'))
-            self._jsons['participants'].update(template_participants)
+        Slicing with integers and slices returns views, no data are read until the values are used.
 
-            self.dump()
+        Returns:
+            numpy.ndarray: Read-only view of the data file.
+        """
+        if self._data is None:
+            size = os.path.getsize(self.path) - self.offset
+            n_samples = size // (self.dtype.itemsize * self.n_channels)
+            if n_samples * self.dtype.itemsize * self.n_channels != size:
+                warnings.warn('Size of {} is not a multiple of the number of channels'.format(self.path))
+
+            if self.orientation == 'multiplexed':
+                shape = (n_samples, self.n_channels)
+            else:
+                shape = (self.n_channels, n_samples)
+            if n_samples == 0:
+                data = np.zeros(shape, dtype=self.dtype)
+            else:
+                data = np.memmap(self.path, dtype=self.dtype, mode='r', offset=self.offset, shape=shape)
+            self._data = data.T if self.orientation == 'multiplexed' else data
+        return self._data
 
-            if not os.path.exists(self._participants_path):
-                self._participants_meta = pd.DataFrame([], columns=self._jsons['participants'].keys())
-                self._participants_meta.to_csv(self._participants_path, sep='\t', index=False)
+    def channel_index(self, channels):
+        """
+        Convert a channel selection to an index of the data array.
 
+        Args:
+            channels (None, str, int, slice or list): None for all channels, channel names or indices.
 
-    def _load_dataset(self):
+        Returns:
+            slice, int or numpy.ndarray: Index of the first data axis.
         """
-        Load an existing BIDS dataset.
+        if channels is None:
+            return slice(None)
+        if isinstance(channels, (slice, int, np.integer)):
+            return channels
+        if isinstance(channels, str):
+            return self.channel_names.index(channels)
 
-        This method loads an existing BIDS dataset by loading metadata from existing JSON files and participants.tsv file.
+        names = {name: idx for idx, name in enumerate(self.channel_names)}
+        return np.array([names[ch] if isinstance(ch, str) else ch for ch in channels], dtype=int)
 
+    def read(self, start=None, stop=None, channels=None, scale=False):
         """
+        Read a range of samples.
 
-        if os.path.exists(self.path):
-            for file in os.listdir(self.path):
-                if file.endswith('.json'):
-                    self._jsons[file.split('.')[0]] = Bids_json(os.path.join(self.path, file))
+        Selecting all channels, a single channel or a slice of channels returns a view of the memory-mapped file.
+        Selecting a list of channels copies only the selected channels of the requested range.
 
-            if os.path.exists(self._participants_path):
-                self._participants_meta = pd.read_csv(self._participants_path, sep='\t')
+        Args:
+            start (int, optional): First sample. Defaults to the beginning of the recording.
+            stop (int, optional): Sample after the last one. Defaults to the end of the recording.
+            channels (optional): Channel selection, see channel_index. Defaults to all channels.
+            scale (bool, optional): Multiply the stored values by the channel resolution (creates a float copy).
+                Defaults to False.
 
-    def dump(self):
+        Returns:
+            numpy.ndarray: Data with shape (n_selected_channels, n_samples) or (n_samples,) for a single channel.
+        """
+        t0 = instrumentation.start()
+        index = self.channel_index(channels)
+        x = self.data[index, start:stop]
+        if scale:
+            resolution = self.resolution[index]
+            x = x * (resolution[:, None] if np.ndim(resolution) else resolution)
+        instrumentation.record(t0, instrumentation.file_type(self.path), 'read', bytes_read=x.nbytes,
+                               items=x.shape[-1])
+        return x
+
+    def read_time(self, t_start=None, t_stop=None, channels=None, scale=False):
         """
-        Update JSON metadata files.
+        Read a time range.
+
+        Args:
+            t_start (float, optional): Start time in seconds. Defaults to the beginning of the recording.
+            t_stop (float, optional): Stop time in seconds (exclusive). Defaults to the end of the recording.
+            channels (optional): Channel selection, see channel_index. Defaults to all channels.
+            scale (bool, optional): Multiply the stored values by the channel resolution. Defaults to False.
+
+        Returns:
+            numpy.ndarray: Data with shape (n_selected_channels, n_samples) or (n_samples,) for a single channel.
         """
-        for key in self._jsons.keys():
-            self._jsons[key].save()
+        start = None if t_start is None else int(round(t_start * self.fs))
+        stop = None if t_stop is None else int(round(t_stop * self.fs))
+        return self.read(start, stop, channels=channels, scale=scale)
 
+    @classmethod
+    def write(cls, path, chunks, fs, channels, **kwargs):
+        """
+        Write a recording from an iterable of chunks, see BIDS_iEEG_writer.
 
+        Args:
+            path (str): Path to the data file.
+            chunks (iterable): Chunks with shape (n_channels, n_samples), e.g. a generator.
+            fs (float): Sampling frequency in Hz.
+            channels (list or pandas.DataFrame): Channel names or the content of channels.tsv.
+            **kwargs: Further arguments of BIDS_iEEG_writer.
 
+        Returns:
+            BIDS_iEEG: Reader of the written recording.
+        """
+        writer = BIDS_iEEG_writer(path, fs, channels, **kwargs)
+        try:
+            writer.write_chunks(chunks)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.close()
+
+    def iter_chunks(self, chunk_size, channels=None, scale=False):
+        """
+        Iterate over the recording in chunks of a fixed number of samples. Memory use is bounded by one chunk.
 
+        Args:
+            chunk_size (int): Number of samples per chunk. The last chunk can be shorter.
+            channels (optional): Channel selection, see channel_index. Defaults to all channels.
+            scale (bool, optional): Multiply the stored values by the channel resolution. Defaults to False.
 
+        Yields:
+            tuple: Index of the first sample of the chunk and the chunk data (see read).
+        """
+        chunk_size = int(chunk_size)
+        if chunk_size <= 0:
+            raise ValueError('chunk_size must be positive')
+        for start in range(0, self.n_samples, chunk_size):
+            yield start, self.read(start, start + chunk_size, channels=channels, scale=scale)
 
+    def epochs(self, events, tmin, tmax, channels=None, scale=False, fill_value=None):
+        """
+        Cut windows around events into one array, e.g. the responses to all electrical stimulations of a session.
 
+        The windows are computed with array operations, read from the memory-mapped file in the order of the recording
+        (see iter_epochs) and copied into one preallocated array, one strided copy per window.
 
+        Args:
+            events (pandas.DataFrame or array_like): Events with an onset column (e.g. rows of events.tsv) or onset
+                times in seconds.
+            tmin (float): Start of the window relative to the onset in seconds, e.g. -0.1.
+            tmax (float): End of the window relative to the onset in seconds (exclusive).
+            channels (optional): Channel selection, see channel_index. Defaults to all channels.
+            scale (bool, optional): Multiply the stored values by the channel resolution. Defaults to False.
+            fill_value (optional): Value of samples outside the recording. Defaults to NaN for float data and 0 for
+                integer data.
 
+        Returns:
+            numpy.ndarray: Data with shape (n_events, n_selected_channels, n_samples) in the order of events.
 
+        Example:
+            >>> stims = events[events['trial_type'] == 'electrical stimulation']
+            >>> x = ieeg.epochs(stims, -0.1, 0.5, channels=['LA1', 'LA2'], scale=True)
+        """
+        starts, n_samples, index = self._epoch_plan(events, tmin, tmax, channels)
+        dtype, fill_value = self._epoch_dtype(scale, fill_value)
+        out = np.empty((starts.__len__(), index.__len__(), n_samples), dtype=dtype)
+        for positions, batch in self._iter_epochs(starts, n_samples, index, scale, fill_value, EPOCH_BATCH_SIZE):
+            out[positions] = batch
+        return out
+
+    def iter_epochs(self, events, tmin, tmax, channels=None, scale=False, fill_value=None, batch_size=EPOCH_BATCH_SIZE):
+        """
+        Iterate over windows around events in batches, see epochs. Memory use is bounded by one batch.
 
+        The batches follow the order of the onsets in the recording, so the file is read from start to end once.
 
+        Args:
+            events (pandas.DataFrame or array_like): Events with an onset column or onset times in seconds.
+            tmin (float): Start of the window relative to the onset in seconds.
+            tmax (float): End of the window relative to the onset in seconds (exclusive).
+            channels (optional): Channel selection, see channel_index. Defaults to all channels.
+            scale (bool, optional): Multiply the stored values by the channel resolution. Defaults to False.
+            fill_value (optional): Value of samples outside the recording, see epochs.
+            batch_size (int, optional): Number of events per batch. Defaults to EPOCH_BATCH_SIZE.
+
+        Yields:
+            tuple: Positions of the events of the batch in events and the data of the batch with shape
+            (n_batch_events, n_selected_channels, n_samples).
+        """
+        if int(batch_size) <= 0:
+            raise ValueError('batch_size must be positive')
+        starts, n_samples, index = self._epoch_plan(events, tmin, tmax, channels)
+        _, fill_value = self._epoch_dtype(scale, fill_value)
+        return self._iter_epochs(starts, n_samples, index, scale, fill_value, int(batch_size))
 
+    def _epoch_plan(self, events, tmin, tmax, channels):
+        """
+        Get the first sample of every window, the window length and the channel indices.
+        """
+        if isinstance(events, pd.DataFrame):
+            if 'onset' not in events.keys():
+                raise ValueError('events have no onset column')
+            onset = pd.to_numeric(events['onset'], errors='coerce').to_numpy(dtype=float)
+        else:
+            onset = np.atleast_1d(np.asarray(events, dtype=float))
+        if np.isnan(onset).any():
+            raise ValueError('{} events have no onset'.format(np.isnan(onset).sum()))
+
+        first = int(round(tmin * self.fs))
+        n_samples = int(round(tmax * self.fs)) - first
+        if n_samples <= 0:
+            raise ValueError('tmax must be larger than tmin')
+        starts = np.round(onset * self.fs).astype(np.int64) + first
+        index = np.atleast_1d(np.arange(self.n_channels)[self.channel_index(channels)])
+        return starts, n_samples, index
+
+    def _epoch_dtype(self, scale, fill_value):
+        """
+        Get the data type of the windows, large enough for the fill value, and the fill value.
+        """
+        dtype = np.dtype(np.float64) if scale else self.dtype
+        if fill_value is None:
+            fill_value = np.nan if dtype.kind == 'f' else 0
+        return np.result_type(dtype, np.min_scalar_type(fill_value)), fill_value
+
+    def _iter_epochs(self, starts, n_samples, index, scale, fill_value, batch_size):
+        dtype, _ = self._epoch_dtype(scale, fill_value)
+        order = np.argsort(starts, kind='stable')
+        resolution = self.resolution[index][:, None]
+        n_total = self.data.shape[1]
+        # Contiguous channel selections are sliced, so every window is a single strided copy from the mapped file
+        if index.__len__() and np.array_equal(index, np.arange(index[0], index[0] + index.__len__())):
+            index = slice(int(index[0]), int(index[0]) + index.__len__())
+        # Multiplexed files store the samples of all channels together, copy (sample, channel) blocks transposed
+        raw = self.data.T if self.orientation == 'multiplexed' else self.data
+
+        for i in range(0, order.__len__(), batch_size):
+            t0 = instrumentation.start()
+            positions = order[i:i + batch_size]
+            first = starts[positions]
+            lo = np.clip(first, 0, n_total)
+            hi = np.clip(first + n_samples, 0, n_total)
+            batch = np.empty((positions.__len__(), resolution.shape[0], n_samples), dtype=dtype)
+            if ((lo != first) | (hi != first + n_samples)).any():
+                batch.fill(fill_value)
+            for j in range(positions.__len__()):
+                if hi[j] <= lo[j]:
+                    continue
+                window = batch[j, :, lo[j] - first[j]:hi[j] - first[j]]
+                if self.orientation == 'multiplexed':
+                    window[...] = raw[lo[j]:hi[j], index].T
+                else:
+                    window[...] = raw[index, lo[j]:hi[j]]
+                if scale:
+                    window *= resolution
+            instrumentation.record(t0, instrumentation.file_type(self.path), 'epochs', bytes_read=batch.nbytes,
+                                   items=positions.__len__())
+            yield positions, batch
+
+def _written_ieeg(path, metadata, path_channels, channels, fs, dtype, resolution):
+    """
+    Create the reader of a recording from the values written by BIDS_iEEG_writer, the same as BIDS_iEEG reads them
+    from the files. The data file is mapped on first access.
+    """
+    ieeg = BIDS_iEEG.__new__(BIDS_iEEG)
+    ieeg.path = path
+    ieeg._path_json = metadata._path
+    ieeg._path_channels = path_channels
+    ieeg.metadata = metadata
+    ieeg.channels = channels
+    ieeg._fs = float(fs)
+    ieeg.channel_names = [str(name) for name in channels['name']]
+    ieeg.dtype = np.dtype(dtype)
+    ieeg.orientation = 'multiplexed'
+    ieeg.offset = 0
+    ieeg.resolution = resolution
+    ieeg._data = None
+    return ieeg
+
+
+class BIDS_iEEG_writer:
+    """
+    Streaming writer of iEEG recordings.
+
+    Chunks of data are appended to the binary data file through a buffered file, so memory use is bounded by one chunk
+    regardless of the recording length. Files with the .eeg extension are written as multiplexed BrainVision
+    recordings (.eeg, .vhdr and .vmrk), other extensions as raw multiplexed binary. The data file is written under a
+    temporary name and renamed on close. Inside batch_write, all files of the recording are replaced when the batch is
+    committed, and none of them if it is aborted.
+
+    On close, the *_ieeg.json sidecar is filled from template_ieeg with SamplingFrequency, RecordingDuration and the
+    *ChannelCount fields, and the *_channels.tsv file is written.
+
+    Args:
+        path (str): Path to the data file, e.g. sub-01_ses-01_task-rest_run-1_ieeg.eeg.
+        fs (float): Sampling frequency in Hz.
+        channels (list or pandas.DataFrame): Channel names or a DataFrame with the content of channels.tsv (at least
+            the 'name' column).
+        dtype (str or numpy.dtype, optional): Data type of the stored data. Defaults to 'float32'.
+        channel_types (str or list, optional): BIDS channel types (ECOG, SEEG, EEG, ...) used if channels does not
+            contain the 'type' column. Defaults to 'MISC'.
+        units (str, optional): Units used if channels does not contain the 'units' column. Defaults to 'uV'.
+        resolution (float, optional): Physical value of one stored unit, stored in the .vhdr header. Defaults to 1.
+        metadata (dict, optional): Additional fields of the *_ieeg.json sidecar.
+        buffer_size (int, optional): Size of the write buffer in bytes. Defaults to 4 MB.
+
+    Raises:
+        ValueError: If the data type is not supported by BrainVision (see brainvision.BINARY_FORMATS) for .eeg files.
+
+    Example:
+        >>> with BIDS_iEEG_writer(path, fs=1000, channels=['e1', 'e2'], channel_types='SEEG') as writer:
+        ...     for chunk in acquisition:
+        ...         writer.write(chunk)
+    """
+    channel_count_fields = {
+        'ECOG': 'ECOGChannelCount',
+        'SEEG': 'SEEGChannelCount',
+        'EEG': 'EEGChannelCount',
+        'EOG': 'EOGChannelCount',
+        'ECG': 'ECGChannelCount',
+        'EMG': 'EMGChannelCount',
+    }
+
+    def __init__(self, path, fs, channels, dtype='float32', channel_types='MISC', units='uV', resolution=1,
+                 metadata=None, buffer_size=2 ** 22):
+        # Checked before any data is written, the header is written only on close
+        if path.endswith('.eeg') and np.dtype(dtype) not in [np.dtype(v) for v in BINARY_FORMATS.values()]:
+            raise ValueError('Data type {} is not supported by BrainVision, use one of {}'.format(
+                dtype, sorted(set(np.dtype(v).name for v in BINARY_FORMATS.values()))))
+        if isinstance(channels, pd.DataFrame):
+            channels = channels.copy()
+        else:
+            channels = pd.DataFrame({'name': [str(name) for name in channels]})
+        if 'type' not in channels.keys():
+            channels['type'] = channel_types
+        if 'units' not in channels.keys():
+            channels['units'] = units
+
+        self.path = path
+        self.fs = fs
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.resolution = resolution
+        self.metadata = metadata if isinstance(metadata, dict) else {}
+        self.n_samples = 0
+
+        base = path.rsplit('.', 1)[0]
+        if base.endswith('_ieeg'):
+            base = base[:-5]
+        self._base = base
+        self._path_tmp = os.path.join(os.path.dirname(path), '.{}.tmp'.format(os.path.basename(path)))
+        self._file = open(self._path_tmp, 'wb', buffering=buffer_size)
+
+    @property
+    def n_channels(self):
+        """
+        Get the number of channels.
+        """
+        return self.channels.__len__()
+
+    def write(self, chunk):
+        """
+        Append a chunk of data.
+
+        Args:
+            chunk (numpy.ndarray): Data with shape (n_channels, n_samples).
+        """
+        chunk = np.asarray(chunk)
+        if chunk.ndim != 2 or chunk.shape[0] != self.n_channels:
+            raise ValueError('Chunk must have shape ({}, n_samples), got {}'.format(self.n_channels, chunk.shape))
+        self._file.write(np.ascontiguousarray(chunk.T, dtype=self.dtype).data)
+        self.n_samples += chunk.shape[1]
+
+    def write_chunks(self, chunks):
+        """
+        Append all chunks from an iterable, e.g. a generator.
+
+        Args:
+            chunks (iterable): Chunks with shape (n_channels, n_samples).
+        """
+        for chunk in chunks:
+            self.write(chunk)
+
+    def close(self):
+        """
+        Finish the data file and write the header, sidecar and channels.tsv files.
+
+        Returns:
+            BIDS_iEEG: Reader of the written recording, created without reading the files, which are not in place
+            before the commit inside batch_write.
+        """
+        self._file.close()
+        replace_file(self._path_tmp, self.path)
+
+        if self.path.endswith('.eeg'):
+            data_file = os.path.basename(self.path)
+            marker_file = data_file[:-4] + '.vmrk'
+            header_channels = [{'name': name, 'resolution': self.resolution, 'unit': unit}
+                               for name, unit in zip(self.channels['name'], self.channels['units'])]
+            write_vmrk(self.path[:-4] + '.vmrk', data_file)
+            write_vhdr(self.path[:-4] + '.vhdr', data_file, marker_file, self.n_channels, self.fs, self.dtype,
+                       header_channels)
+
+        sidecar = BIDS_json(self._base + '_ieeg.json')
+        for key, value in template_ieeg.items():
+            sidecar.setdefault(key, value)
+        sidecar.update(self.metadata)
+        sidecar['SamplingFrequency'] = self.fs
+        sidecar['RecordingDuration'] = self.n_samples / self.fs
+        types = [str(t).upper() for t in self.channels['type']]
+        for channel_type, key in self.channel_count_fields.items():
+            sidecar[key] = types.count(channel_type)
+        sidecar['MiscChannelCount'] = sum(1 for t in types if t not in self.channel_count_fields)
+        sidecar.dump()
+
+        channels_tsv = BIDS_TSV(self._base + '_channels.tsv')
+        channels_tsv.drop(channels_tsv.index, inplace=True)
+        for key in self.channels.keys():
+            if key not in channels_tsv.keys():
+                channels_tsv[key] = None
+        channels_tsv.add_rows(self.channels)
+        channels_tsv.dump()
+
+        resolution = self.resolution if self.path.endswith('.eeg') else 1
+        channels = pd.read_csv(io.StringIO(channels_tsv._serialize()), sep='\t')
+        return _written_ieeg(self.path, sidecar, channels_tsv._path_tsv, channels, self.fs, self.dtype,
+                             np.full(self.n_channels, resolution, dtype=float))
+
+    def abort(self):
+        """
+        Stop writing and remove the partially written data file.
+        """
+        self._file.close()
+        if os.path.exists(self._path_tmp):
+            os.remove(self._path_tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+class BIDS_session:
+    """
+    Class representing a session directory (ses-<label>) of a BIDS subject.
+
+    Args:
+        path (str): Path to the session directory.
+        index (BIDSIndex, optional): Dataset index used to find files without listing directories. Defaults to None.
+        dtypes (bool or dict, optional): Load the TSV files with the column dtypes of templates.column_dtypes (True) or
+            with dicts of column dtypes by suffix, see BIDS_TSV. Defaults to None.
+
+    Attributes:
+        path (str): Path to the session directory.
+        label (str): Session label without the 'ses-' prefix.
+        subject (str): Subject label without the 'sub-' prefix.
+        tsvs (dict): BIDS_TSV instances of the session by file name, filled by load.
+    """
+    tsv_suffixes = ('channels', 'electrodes', 'events')
+
+    def __init__(self, path, index=None, dtypes=None):
+        self.path = path
+        self.label = os.path.basename(os.path.normpath(path))[4:]
+        self.subject = os.path.basename(os.path.dirname(os.path.normpath(path)))[4:]
+        self._index = index
+        self._dtypes = _dataset_dtypes(dtypes)
+        self.tsvs = {}
+
+    def load(self):
+        """
+        Load the channels, electrodes and events TSV files of the session.
+
+        Returns:
+            BIDS_session: The session itself.
+        """
+        for path in self.find_files(suffix=list(self.tsv_suffixes), extension='.tsv'):
+            self.tsvs[os.path.basename(path)] = BIDS_TSV(path, dtypes=_suffix_dtypes(self._dtypes, path))
+        return self
+
+    def find_files(self, **entities):
+        """
+        Find files of the session matching the given entities.
+
+        Args:
+            **entities: Entity values, see BIDSIndex.query.
+
+        Returns:
+            list: Sorted paths of the matching files.
+        """
+        if self._index is not None:
+            records = self._index.query(sub=self.subject, ses=self.label, **entities)
+            return sorted(r['path'] for r in records)
+
+        paths = []
+        stack = [self.path]
+        while stack.__len__():
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir():
+                        stack.append(entry.path)
+                        continue
+                    record = parse_entities(entry.name)
+                    if all(record.get(k) in (v if isinstance(v, (list, tuple, set)) else {v}) for k, v in entities.items()):
+                        paths.append(entry.path)
+        return sorted(paths)
+
+class BID_subject:
+    """
+    Class representing a subject directory (sub-<label>) of a BIDS dataset.
+
+    Args:
+        path (str): Path to the subject directory.
+        index (BIDSIndex, optional): Dataset index used to find sessions without listing directories. Defaults to None.
+        dtypes (bool or dict, optional): Load the TSV files with the column dtypes of templates.column_dtypes (True) or
+            with dicts of column dtypes by suffix, see BIDS_TSV. Defaults to None.
+
+    Attributes:
+        path (str): Path to the subject directory.
+        label (str): Subject label without the 'sub-' prefix.
+        sessions_tsv (BIDS_TSV): The sub-<label>_sessions.tsv file, filled by load if it exists.
+    """
+    def __init__(self, path, index=None, dtypes=None):
+        self.path = path
+        self.label = os.path.basename(os.path.normpath(path))[4:]
+        self._index = index
+        self._dtypes = _dataset_dtypes(dtypes)
+        self._sessions = {}
+        self.sessions_tsv = None
+
+    def load(self):
+        """
+        Find sessions and load the sessions.tsv file of the subject and the TSV files of all sessions.
+
+        Returns:
+            BID_subject: The subject itself.
+        """
+        path = os.path.join(self.path, 'sub-{}_sessions.tsv'.format(self.label))
+        if os.path.exists(path):
+            self.sessions_tsv = BIDS_TSV(path, dtypes=_suffix_dtypes(self._dtypes, path))
+        for session in self.find_sessions().values():
+            session.load()
+        return self
+
+    def _set_index(self, index):
+        """
+        Set the dataset index of the subject and its sessions.
+
+        Args:
+            index (BIDSIndex): Dataset index or None.
+        """
+        self._index = index
+        for session in self._sessions.values():
+            session._index = index
+
+    @property
+    def sessions(self):
+        """
+        Get sessions found by find_sessions or created by create_session.
+
+        Returns:
+            dict: BIDS_session instances by session label.
+        """
+        return self._sessions
+
+    def create_session(self, session):
+        """
+        Create a session directory.
+
+        Args:
+            session (str): Session label with or without the 'ses-' prefix.
+
+        Returns:
+            BIDS_session: The created session.
+        """
+        if session.startswith('ses-'):
+            session = session[4:]
+        path = os.path.join(self.path, 'ses-' + session)
+        os.makedirs(path, exist_ok=True)
+        self._sessions[session] = BIDS_session(path, self._index, self._dtypes)
+        return self._sessions[session]
+
+    def find_sessions(self):
+        """
+        Find sessions of the subject.
+
+        Returns:
+            dict: BIDS_session instances by session label.
+        """
+        if self._index is not None:
+            labels = self._index.sessions(self.label)
+        else:
+            with os.scandir(self.path) as it:
+                labels = sorted(e.name[4:] for e in it if e.name.startswith('ses-') and e.is_dir())
+
+        for label in labels:
+            if label not in self._sessions:
+                self._sessions[label] = BIDS_session(os.path.join(self.path, 'ses-' + label), self._index,
+                                                     self._dtypes)
+        return self._sessions
+
+def _load_subject(args):
+    """
+    Load a subject in a worker.
+
+    Args:
+        args (tuple): Path to the subject directory, the dataset index or None and the dtypes flag.
+
+    Returns:
+        BID_subject: Loaded subject.
+    """
+    path, index, dtypes = args
+    return BID_subject(path, index, dtypes).load()
+
+def _read_table(args):
+    """
+    Read a TSV file for BIDSDataset.load_table in a worker.
+
+    Args:
+        args (tuple): Path to the TSV file, list of columns or None, trial types or None and dtypes of the columns.
+
+    Returns:
+        pandas.DataFrame: Selected columns and rows of the file.
+    """
+    path, columns, trial_type, dtypes = args
+    usecols = None
+    if columns is not None:
+        columns = set(columns)
+        if trial_type is not None:
+            columns.add('trial_type')
+        usecols = lambda key: key in columns
+    t0 = instrumentation.start()
+    df = pd.read_csv(path, sep='\t', usecols=usecols)
+    instrumentation.record(t0, 'tsv', 'parse', files=1, bytes_read=os.path.getsize(path) if t0 else 0,
+                           items=df.__len__())
+
+    if trial_type is not None:
+        trial_types = [trial_type] if isinstance(trial_type, str) else list(trial_type)
+        if 'trial_type' in df.keys():
+            df = df[df['trial_type'].isin(trial_types)]
+        else:
+            df = df.iloc[:0]
+        if columns is not None and 'trial_type' not in columns:
+            df = df.drop(columns='trial_type', errors='ignore')
+    df = df.reset_index(drop=True)
+    for key, dtype in dtypes.items():
+        if key in df.columns:
+            df[key] = _convert_column(df[key], dtype)
+    return df
+
+class BIDSDataset(dict):
+    """
+    Class representing a BIDS dataset.
+
+    This class provides methods to create and manipulate a BIDS dataset, including creating and updating metadata JSON
+    files, and loading metadata from existing JSON files.
+
+    Metadata files are found when the dataset is opened, but they are parsed only on first access. Use preload to
+    parse all of them at once.
+
+    Subjects are stored in the dictionary by their label after calling find_subjects. Subjects, sessions and files are
+    found using a file index (see BIDSIndex) which is cached in the dataset root and updated incrementally.
+
+    Args:
+        path (str): Path to the BIDS dataset directory.
+        create_dataset (bool, optional): Flag indicating whether to create a new dataset. Defaults to False.
+        use_index (bool, optional): Flag indicating whether to use the cached file index. Defaults to True.
+        n_jobs (int, optional): Number of workers for scanning and loading subjects. Defaults to 1.
+        executor (str or Executor, optional): 'thread' for I/O bound loading (e.g. network storage), 'process' for
+            heavy TSV parsing or an Executor instance. Defaults to 'thread'.
+        dtypes (bool or dict, optional): Store the columns of loaded TSV files and tables with the dtypes of
+            templates.column_dtypes (categorical, float and nullable integer) instead of object dtype, which takes
+            several times less memory. A dict gives the column dtypes by suffix in the format of
+            templates.column_dtypes, TSV files of other suffixes keep object dtype. Defaults to None.
+
+    Attributes:
+        path (str): Path to the BIDS dataset directory.
+        _participants_path (str): Path to the participants.tsv file.
+        _jsons (LazyDict): Dictionary of Bids_json instances for each metadata JSON file, loaded on first access.
+        _participants_meta (pandas.DataFrame): DataFrame to store participant metadata, loaded on first access.
+
+    Raises:
+        ValueError: If the specified directory does not exist.
+
+    """
+
+    def __init__(self, path: str, create_dataset=False, use_index=True, n_jobs=1, executor='thread', dtypes=None):
+        """
+        Initialize a BIDSDataset instance.
+
+        Args:
+            path (str): Path to the BIDS dataset directory.
+            create_dataset (bool, optional): Flag indicating whether to create a new dataset. Defaults to False. If true, overwrites existing dataset.
+            use_index (bool, optional): Flag indicating whether to use the cached file index. Defaults to True.
+            n_jobs (int, optional): Number of workers for scanning and loading subjects. Defaults to 1.
+            executor (str or Executor, optional): 'thread', 'process' or an Executor instance. Defaults to 'thread'.
+            dtypes (bool or dict, optional): Use the column dtypes of templates.column_dtypes or the given column
+                dtypes by suffix. Defaults to None.
+
+        Raises:
+            TypeError: If dtypes is neither a bool nor a dict of column dtypes by suffix.
+
+        """
+        super().__init__()
+
+        self.path = path
+        self._participants_path = os.path.join(self.path, 'participants.tsv')
+        self._jsons = LazyDict(BIDS_json)
+        self._participants = None
+        self._use_index = use_index
+        self._index = None
+        self.n_jobs = n_jobs
+        self.executor = executor
+        self._dtypes = _dataset_dtypes(dtypes)
+        self._resolver = SidecarResolver(self.path, loader=BIDS_json)
+        self._manifest = None
+
+        if create_dataset:
+            self._create_dataset()
+        else:
+            self._load_dataset()
+
+        if not os.path.exists(self.path):
+            raise ValueError(f'No such directory: {self.path}')
+
+    @property
+    def participants(self):
+        """
+        Get the participants metadata. The participants.tsv file is read on first access.
+
+        Returns:
+            pandas.DataFrame: Participants metadata or None if participants.tsv does not exist.
+        """
+        if self._participants is None and os.path.exists(self._participants_path):
+            self._participants = pd.read_csv(self._participants_path, sep='\t')
+        return self._participants
+
+    @participants.setter
+    def participants(self, value):
+        """
+        Set the participants metadata.
+
+        Args:
+            value (pandas.DataFrame): Participants metadata.
+        """
+        self._participants = value
+
+    _participants_meta = participants
+
+    @property
+    def index(self):
+        """
+        Get the file index of the dataset. The index is loaded from the cache and updated on first access.
+
+        Returns:
+            BIDSIndex: File index or None if the index is disabled.
+        """
+        if self._use_index and self._index is None:
+            self.update_index()
+        return self._index
+
+    def update_index(self):
+        """
+        Update the file index. Only directories modified since the last update are listed again.
+
+        Returns:
+            bool: True if the index changed.
+        """
+        if not self._use_index:
+            return False
+        if self._index is None:
+            self._index = BIDSIndex(self.path)
+        return self._index.update(n_jobs=self.n_jobs)
+
+    def find_subjects(self):
+        """
+        Find subjects of the dataset and store them in the dictionary by their label.
+
+        Returns:
+            BIDSDataset: The dataset itself.
+        """
+        index = self.index
+        if index is not None:
+            labels = index.subjects()
+        else:
+            with os.scandir(self.path) as it:
+                labels = sorted(e.name[4:] for e in it if e.name.startswith('sub-') and e.is_dir())
+
+        for label in labels:
+            if label not in self:
+                self[label] = BID_subject(os.path.join(self.path, 'sub-' + label), index, self._dtypes)
+        return self
+
+    def resolve_metadata(self, path):
+        """
+        Get the sidecar metadata of a data file following the BIDS inheritance principle, i.e. the merge of the sidecars
+        with the same suffix from the dataset root (e.g. channels.json created with the dataset) down to the directory
+        of the file. Parsed sidecars and merged results are memoized and refreshed when the files change on disk.
+
+        Args:
+            path (str): Absolute path to the data file or path relative to the dataset directory, e.g. a *_ieeg.eeg
+                or *_channels.tsv file.
+
+        Returns:
+            dict: Merged metadata as stored on disk.
+
+        Example:
+            >>> dataset.resolve_metadata('sub-01/ses-01/ieeg/sub-01_ses-01_task-rest_channels.tsv')['name']
+        """
+        return self._resolver.resolve(self._dataset_path(path))
+
+    def resolve_metadata_many(self, paths):
+        """
+        Get the sidecar metadata of many data files, see resolve_metadata. Shared directories and sidecars are checked
+        on disk only once.
+
+        Args:
+            paths (iterable): Paths to the data files.
+
+        Returns:
+            dict: Merged metadata of each path.
+        """
+        paths = list(paths)
+        resolved = self._resolver.resolve_many(self._dataset_path(path) for path in paths)
+        return {path: resolved[self._dataset_path(path)] for path in paths}
+
+    def _dataset_path(self, path):
+        """
+        Get the path of a file given as an absolute path or relative to the dataset directory.
+        """
+        return path if os.path.isabs(path) else os.path.join(self.path, path)
+
+    def validate(self, n_jobs=None, executor='process'):
+        """
+        Validate all TSV and JSON files of the dataset against the templates, see validator.validate_dataset.
+
+        Only the files on disk are validated, changes which are not dumped yet are not seen.
+
+        Args:
+            n_jobs (int, optional): Number of workers. Defaults to the n_jobs of the dataset.
+            executor (str or Executor, optional): 'thread', 'process' or an Executor instance. Defaults to 'process'.
+
+        Returns:
+            ValidationReport: Issues found in the dataset.
+
+        Example:
+            >>> report = dataset.validate(n_jobs=-1)
+            >>> report.is_valid
+        """
+        if n_jobs is None:
+            n_jobs = self.n_jobs
+        self.update_index()
+        return validate_dataset(self.path, index=self._index, resolver=self._resolver, n_jobs=n_jobs, executor=executor)
+
+    table_entities = ('sub', 'ses', 'task', 'run')
+
+    def load_table(self, suffix, subjects=None, sessions=None, tasks=None, runs=None, columns=None, trial_type=None):
+        """
+        Load TSV files with the same suffix (e.g. channels, electrodes, events) of the whole dataset into one
+        long-format DataFrame with the sub, ses, task and run entities as categorical columns.
+
+        Files are selected using the file index, so files of other subjects, sessions, tasks or runs are never read.
+        Only the requested columns are parsed and rows of other trial types are dropped right after parsing each file.
+        Files are read with the workers given by n_jobs and executor and concatenated in path order. If the dataset
+        was opened with dtypes, the columns of templates.column_dtypes are converted in the workers and categorical
+        columns stay categorical across files.
+
+        Args:
+            suffix (str): Suffix of the files, e.g. 'events'.
+            subjects (str or list, optional): Subject labels without the 'sub-' prefix. Defaults to all subjects.
+            sessions (str or list, optional): Session labels without the 'ses-' prefix. Defaults to all sessions.
+            tasks (str or list, optional): Task labels. Defaults to all tasks.
+            runs (str or list, optional): Run labels. Defaults to all runs.
+            columns (list, optional): Columns to load. Defaults to all columns.
+            trial_type (str or list, optional): Keep only rows of these trial types (events files).
+
+        Returns:
+            pandas.DataFrame: Rows of all selected files with the entity columns first.
+
+        Example:
+            >>> stims = dataset.load_table('events', subjects=['01', '02'], columns=['onset', 'duration'],
+            ...                            trial_type='electrical stimulation')
+        """
+        filters = {'sub': subjects, 'ses': sessions, 'task': tasks, 'run': runs}
+        filters = {key: [str(v) for v in value] if isinstance(value, (list, tuple, set)) else str(value)
+                   for key, value in filters.items() if value is not None}
+        index = self.index
+        if index is None:
+            # Scan without writing the index cache
+            index = BIDSIndex(self.path)
+            index.update(save=False, n_jobs=self.n_jobs)
+        records = index.query(suffix=suffix, extension='.tsv', **filters)
+        records = sorted((r for r in records if r.get('sub') is not None), key=lambda r: r['path'])
+
+        dtypes = _suffix_dtypes(self._dtypes, 'x_{}.tsv'.format(suffix)) or {}
+        args = [(r['path'], columns, trial_type, dtypes) for r in records]
+        frames = parallel_map(_read_table, args, n_jobs=self.n_jobs, executor=self.executor)
+
+        lengths = np.array([df.__len__() for df in frames], dtype=int)
+        if frames.__len__():
+            df = _concat_frames(frames, dtypes, ignore_index=True)
+        else:
+            df = pd.DataFrame([], columns=columns if columns is not None else [])
+        if columns is not None:
+            df = df.reindex(columns=[key for key in columns if key not in self.table_entities])
+
+        for position, key in enumerate(self.table_entities):
+            values = [r.get(key) for r in records]
+            categories = sorted(set(v for v in values if v is not None))
+            codes = np.array([categories.index(v) if v is not None else -1 for v in values], dtype=int)
+            df.insert(position, key, pd.Categorical.from_codes(np.repeat(codes, lengths), categories=categories))
+        return df
+
+    def fill_time_samples(self, table, overwrite=False):
+        """
+        Compute missing onset/offset or sample_start/sample_end columns of an events table of many recordings, e.g. a
+        result of load_table('events'), see events.fill_time_samples.
+
+        The sampling frequency of every recording is resolved once from its inherited *_ieeg.json sidecars and joined
+        to the rows by the sub, ses, task and run columns. Rows of recordings without SamplingFrequency are not changed.
+
+        Args:
+            table (pandas.DataFrame): Events with the sub, ses, task and run columns of load_table.
+            overwrite (bool, optional): Recompute the samples of all rows with a time. Defaults to False.
+
+        Returns:
+            pandas.DataFrame: The table, changed in place.
+
+        Example:
+            >>> events = dataset.fill_time_samples(dataset.load_table('events'))
+        """
+        index = self.index
+        if index is None:
+            index = BIDSIndex(self.path)
+            index.update(save=False, n_jobs=self.n_jobs)
+        recordings = {}
+        for r in sorted(index.query(suffix='ieeg'), key=lambda r: r['path']):
+            if r.get('sub') is not None and r['extension'] not in ('.json', '.vhdr', '.vmrk'):
+                recordings.setdefault(tuple(r.get(key) for key in self.table_entities), r['path'])
+        sidecars = self.resolve_metadata_many(recordings.values())
+
+        keys = pd.MultiIndex.from_tuples([tuple('' if v is None else v for v in key) for key in recordings],
+                                         names=self.table_entities)
+        frequencies = np.array([_sampling_frequency(sidecars[path]) for path in recordings.values()], dtype=float)
+        rows = pd.MultiIndex.from_arrays([table[key].astype(object).where(table[key].notna(), '').to_numpy()
+                                          for key in self.table_entities])
+        positions = keys.get_indexer(rows) if keys.__len__() else np.full(table.__len__(), -1)
+        fs = np.where(positions >= 0, frequencies[positions], np.nan)
+        return fill_time_samples(table, fs, overwrite=overwrite)
+
+    def load_subjects(self, subjects=None):
+        """
+        Find and load subjects (sessions.tsv and the channels, electrodes and events TSV files of all sessions) using
+        the workers given by n_jobs and executor. Results are stored in the dictionary in the order of subject labels,
+        independently of the order in which the workers finish.
+
+        Args:
+            subjects (list, optional): Labels of subjects to load. Defaults to all subjects.
+
+        Returns:
+            BIDSDataset: The dataset itself.
+        """
+        self.find_subjects()
+        labels = sorted(self.keys()) if subjects is None else list(subjects)
+
+        # Process pools pickle the arguments, the index is attached back in the parent process instead
+        index = self.index
+        worker_index = None if is_process_executor(self.executor) else index
+        paths = [(self[label].path, worker_index, self._dtypes) for label in labels]
+        loaded = parallel_map(_load_subject, paths, n_jobs=self.n_jobs, executor=self.executor)
+
+        for label, subject in zip(labels, loaded):
+            subject._set_index(index)
+            self[label] = subject
+        return self
+
+    async def aload_subjects(self, subjects=None, limit=DEFAULT_LIMIT, executor=None):
+        """
+        Find and load subjects like load_subjects without blocking the event loop. Subjects are loaded concurrently
+        in an executor, at most limit at the same time.
+
+        Args:
+            subjects (list, optional): Labels of subjects to load. Defaults to all subjects.
+            limit (int, optional): Maximum number of subjects loaded at the same time. Defaults to aio.DEFAULT_LIMIT.
+            executor (Executor, optional): Executor running the loads. Defaults to the default executor of the loop.
+
+        Returns:
+            BIDSDataset: The dataset itself.
+
+        Example:
+            >>> dataset = await BIDSDataset(path).aload_subjects(limit=16)
+        """
+        await run_blocking(self.find_subjects, executor=executor)
+        labels = sorted(self.keys()) if subjects is None else list(subjects)
+
+        index = self.index
+        worker_index = None if is_process_executor(executor) else index
+        paths = [(self[label].path, worker_index, self._dtypes) for label in labels]
+        loaded = await gather_limited(_load_subject, paths, limit=limit, executor=executor)
+
+        for label, subject in zip(labels, loaded):
+            subject._set_index(index)
+            self[label] = subject
+        return self
+
+    def bulk_create(self, manifest, n_jobs=None, overwrite=False, participant_columns=None):
+        """
+        Create many subjects, sessions and recordings at once from a manifest, see bulk.plan_tree.
+
+        The whole tree is planned first, then the directories are created in batches and the sessions.tsv,
+        electrodes, channels and *_ieeg.json files are written by n_jobs threads. New subjects are appended to
+        participants.tsv in a single write and new participant columns are added to participants.json. Existing files
+        are skipped, except for sessions.tsv files to which new sessions are appended, so an interrupted import is
+        resumed by calling bulk_create again with the same manifest.
+
+        Args:
+            manifest (pandas.DataFrame or iterable): One row per recording (sub, ses, task, run, channels, ieeg),
+                session (sub, ses, electrodes) or subject (sub), plus participant columns such as sex.
+            n_jobs (int, optional): Number of threads. Defaults to the n_jobs of the dataset.
+            overwrite (bool, optional): Rewrite existing files. Defaults to False.
+            participant_columns (list, optional): Columns of participants.tsv taken from the manifest. Defaults to all
+                columns which are neither entities nor file contents.
+
+        Returns:
+            list: Paths of the written files.
+
+        Example:
+            >>> manifest = pd.DataFrame({'sub': ['01', '01', '02'], 'ses': ['01', '02', '01'], 'task': 'rest',
+            ...                          'sex': ['F', 'F', 'M'], 'channels': [names_01, names_01, names_02]})
+            >>> BIDSDataset(path, create_dataset=True).bulk_create(manifest, n_jobs=16)
+        """
+        if n_jobs is None:
+            n_jobs = self.n_jobs
+        written = bulk_create(self.path, manifest, n_jobs=n_jobs, overwrite=overwrite,
+                              participant_columns=participant_columns)
+        self._participants = None
+        path_json = os.path.join(self.path, 'participants.json')
+        if path_json in written:
+            self._jsons.register('participants', path_json)
+        if self._index is not None:
+            self.update_index()
+        return written
+
+    def manifest(self, n_jobs=None):
+        """
+        Get the content-hash manifest of the dataset, see manifest.DatasetManifest. The manifest is updated and saved
+        in the dataset root, only new and modified files are hashed.
+
+        Args:
+            n_jobs (int, optional): Number of threads. Defaults to the n_jobs of the dataset.
+
+        Returns:
+            DatasetManifest: Updated manifest.
+        """
+        if self._manifest is None:
+            self._manifest = DatasetManifest(self.path)
+        self._manifest.update(n_jobs=self.n_jobs if n_jobs is None else n_jobs)
+        return self._manifest
+
+    def diff(self, other, n_jobs=None):
+        """
+        Compare the files of the dataset with another copy of it by their content hashes.
+
+        Args:
+            other (BIDSDataset or str): Other copy of the dataset or its path.
+            n_jobs (int, optional): Number of threads. Defaults to the n_jobs of the dataset.
+
+        Returns:
+            dict: Relative paths of the files which are only in this dataset ('added'), only in the other one
+            ('removed') and in both with different content ('changed').
+
+        Example:
+            >>> BIDSDataset('/acquisition/bids').diff('/cluster/bids')['changed']
+        """
+        if not isinstance(other, BIDSDataset):
+            other = BIDSDataset(other, use_index=False)
+        return self.manifest(n_jobs).diff(other.manifest(self.n_jobs if n_jobs is None else n_jobs))
+
+    def sync(self, target, delete=False, n_jobs=None):
+        """
+        Copy the added and changed files of the dataset to another copy, see manifest.DatasetManifest.sync. Unchanged
+        files are only checked with a stat call on both sides.
+
+        Args:
+            target (BIDSDataset or str): Target copy of the dataset or its path. The directory is created if needed.
+            delete (bool, optional): Delete files of the target which are not in this dataset. Defaults to False.
+            n_jobs (int, optional): Number of threads. Defaults to the n_jobs of the dataset.
+
+        Returns:
+            dict: Relative paths of the files 'copied' to and 'deleted' from the target.
+
+        Example:
+            >>> BIDSDataset('/acquisition/bids').sync('/cluster/bids', delete=True, n_jobs=16)
+        """
+        if isinstance(target, BIDSDataset):
+            target = target.path
+        os.makedirs(target, exist_ok=True)
+        if self._manifest is None:
+            self._manifest = DatasetManifest(self.path)
+        return self._manifest.sync(DatasetManifest(target), delete=delete,
+                                   n_jobs=self.n_jobs if n_jobs is None else n_jobs)
+
+    def derive(self, path, subjects=None, sessions=None, mode='auto', n_jobs=None):
+        """
+        Create a dataset with a subset of the subjects and sessions of this dataset, see derive.derive_dataset.
+
+        participants.tsv and the sessions.tsv files are filtered to the subset, all other files are linked instead of
+        copied (reflink, hardlink or copy as a fallback), so the cost does not depend on the size of the recordings.
+        Hardlinked files share their data with this dataset: files of the new dataset are replaced with atomic writes
+        by this package, but data files must not be modified in place.
+
+        Args:
+            path (str): Path to the new dataset directory. It must not exist or be empty.
+            subjects (list, optional): Subject labels. Defaults to all subjects.
+            sessions (list, optional): Session labels. Defaults to all sessions.
+            mode (str, optional): 'auto', 'reflink', 'hardlink' or 'copy', see fileio.link_file. Defaults to 'auto'.
+            n_jobs (int, optional): Number of threads. Defaults to the n_jobs of the dataset.
+
+        Returns:
+            BIDSDataset: The new dataset.
+
+        Example:
+            >>> subset = BIDSDataset('/data/bids').derive('/data/bids-pilot', subjects=['01', '02'], sessions=['01'])
+        """
+        if isinstance(path, BIDSDataset):
+            path = path.path
+        derive_dataset(self.path, path, subjects=subjects, sessions=sessions, mode=mode,
+                       n_jobs=self.n_jobs if n_jobs is None else n_jobs)
+        return BIDSDataset(path, use_index=self._use_index, n_jobs=self.n_jobs, executor=self.executor,
+                           dtypes=self._dtypes)
+
+    def _create_dataset(self):
+        """
+        Create a new BIDS dataset.
+
+        This method creates a new BIDS dataset by creating metadata JSON files using the provided templates, and
+        optionally creating a participants.tsv file.
+
+        """
+
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+            time.sleep(0.1)
+        os.mkdir(self.path)
+
+        self._jsons['dataset_description'] = BIDS_json(os.path.join(self.path, 'dataset_description.json'))
+        self._jsons['dataset_description'].update({'Name': os.path.basename(os.path.normpath(self.path)), 'BIDSVersion': BIDS_VERSION})
+        self._jsons['events'] = BIDS_json(os.path.join(self.path, 'events.json'))
+        self._jsons['events'].update(template_events)
+        self._jsons['coordsystem'] = BIDS_json(os.path.join(self.path, 'coordsystem.json'))
+        self._jsons['coordsystem'].update(template_coordsystem)
+        self._jsons['electrodes'] = BIDS_json(os.path.join(self.path, 'electrodes.json'))
+        self._jsons['electrodes'].update(template_electrodes)
+        self._jsons['channels'] = BIDS_json(os.path.join(self.path, 'channels.json'))
+        self._jsons['channels'].update(template_channels)
+        self._jsons['participants'] = BIDS_json(os.path.join(self.path, 'participants.json'))
+        self._jsons['participants'].update(template_participants)
+
+        self.dump()
+
+        if not os.path.exists(self._participants_path):
+            self._participants_meta = pd.DataFrame([], columns=self._jsons['participants'].keys())
+            atomic_write(self._participants_path, self._participants_meta.to_csv(sep='\t', index=False))
+
+
+    def _load_dataset(self):
+        """
+        Load an existing BIDS dataset.
+
+        This method finds the metadata JSON files and the participants.tsv file of an existing BIDS dataset. The files
+        are parsed on first access.
+
+        """
+
+        if os.path.exists(self.path):
+            with os.scandir(self.path) as it:
+                for entry in it:
+                    if entry.name.endswith('.json') and entry.is_file():
+                        self._jsons.register(entry.name.split('.')[0], entry.path)
+
+    def batch_write(self):
+        """
+        Context manager grouping file writes into a transaction, see fileio.batch_write.
+
+        Files dumped inside the context by the calling thread are replaced together when the context is left, after
+        the files of the batch were flushed to disk, with one sync per directory. If the context is left with an
+        exception, no file is changed.
+
+        Example:
+            >>> with dataset.batch_write():
+            ...     dataset.dump()
+            ...     for subject in dataset.values():
+            ...         subject.sessions_tsv.dump()
+        """
+        return batch_write()
+
+    def preload(self):
+        """
+        Parse all metadata JSON files and the participants.tsv file.
+        """
+        self._jsons.preload()
+        self.participants
+
+    def dump(self, force=False):
+        """
+        Update JSON metadata files. Only files which changed since they were loaded or saved are written, files which
+        were never accessed are not written.
+
+        Args:
+            force (bool, optional): Write all loaded files even if their content did not change. Defaults to False.
+
+        Returns:
+            list: Paths of the written files.
+        """
+        written = []
+        for value in self._jsons.loaded().values():
+            written += value.dump(force=force)
+        return written
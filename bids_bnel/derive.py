@@ -0,0 +1,146 @@
+# Copyright 2020-present, Mayo Clinic Department of Neurology - Bioelectronics Neurophysiology and Engineering Laboratory
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+Derived datasets with a subset of the subjects and sessions of a dataset, without copying the data.
+
+The new tree contains the files of the dataset root and the selected subject and session directories. Only the tables
+listing the subjects and sessions (participants.tsv and the sessions.tsv of every subject) are rewritten. All other
+files are linked with fileio.link_file: a reflink where the filesystem supports it, otherwise a hardlink, otherwise a
+copy. The cost is therefore one directory entry per file, independent of the size of the recordings, unless the target
+is on another filesystem. Other top-level directories (derivatives, sourcedata, code, ...) and hidden files are not
+included.
+"""
+import os
+from collections import Counter
+
+import pandas as pd
+
+from .fileio import atomic_write, link_file
+from .parallel import parallel_map
+
+# Files of one task of the pool
+BATCH_SIZE = 64
+
+
+def _labels(values, prefix):
+    if values is None:
+        return None
+    if isinstance(values, str):
+        values = [values]
+    return {str(v)[len(prefix):] if str(v).startswith(prefix) else str(v) for v in values}
+
+
+def _list_subject(args):
+    """
+    List the files of a subject directory in a worker.
+
+    Args:
+        args (tuple): Path to the dataset root, name of the subject directory and selected session labels (None for
+            all sessions).
+
+    Returns:
+        list: Paths of the files relative to the root.
+    """
+    root, name, sessions = args
+    files = []
+    stack = [name]
+    while stack.__len__():
+        rel = stack.pop()
+        with os.scandir(os.path.join(root, rel)) as it:
+            for entry in it:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir():
+                    if rel == name and sessions is not None and entry.name.startswith('ses-') and \
+                            entry.name[4:] not in sessions:
+                        continue
+                    stack.append(os.path.join(rel, entry.name))
+                else:
+                    files.append(os.path.join(rel, entry.name))
+    return files
+
+
+def _link_files(args):
+    """
+    Link a batch of files in a worker.
+
+    Args:
+        args (tuple): List of (source, destination) tuples and the link mode.
+
+    Returns:
+        list: Mode used for every file.
+    """
+    files, mode = args
+    return [link_file(src, dst, mode=mode) for src, dst in files]
+
+
+def _filter_table(src, dst, column, keep):
+    """
+    Write the rows of a TSV file with a value of column in keep. The text of the kept values is not changed.
+    """
+    table = pd.read_csv(src, sep='\t', dtype=str, keep_default_na=False)
+    if column in table.columns:
+        table = table[table[column].isin(keep)]
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    atomic_write(dst, table.to_csv(sep='\t', index=False))
+
+
+def derive_dataset(path, target, subjects=None, sessions=None, mode='auto', n_jobs=1):
+    """
+    Create a dataset with a subset of the subjects and sessions of another dataset. Data files are linked, see
+    fileio.link_file.
+
+    Args:
+        path (str): Path to the source dataset directory.
+        target (str): Path to the new dataset directory. It must not exist or be empty.
+        subjects (list, optional): Subject labels, with or without the 'sub-' prefix. Defaults to all subjects.
+        sessions (list, optional): Session labels, with or without the 'ses-' prefix. Defaults to all sessions.
+        mode (str, optional): 'auto', 'reflink', 'hardlink' or 'copy', see fileio.link_file. Defaults to 'auto'.
+        n_jobs (int, optional): Number of threads, see parallel.resolve_n_jobs. Defaults to 1.
+
+    Returns:
+        dict: Relative paths of the 'rewritten' files and number of linked files by mode ('linked').
+
+    Raises:
+        ValueError: If the target is not empty.
+    """
+    if os.path.isdir(target) and os.listdir(target).__len__():
+        raise ValueError('Target directory is not empty: {}'.format(target))
+    subjects = _labels(subjects, 'sub-')
+    sessions = _labels(sessions, 'ses-')
+
+    with os.scandir(path) as it:
+        entries = sorted((e.name, e.is_dir()) for e in it if not e.name.startswith('.'))
+    files = [name for name, is_dir in entries if not is_dir]
+    names = [name for name, is_dir in entries if is_dir and name.startswith('sub-')
+             and (subjects is None or name[4:] in subjects)]
+    for listed in parallel_map(_list_subject, [(path, name, sessions) for name in names], n_jobs=n_jobs,
+                               executor='thread'):
+        files.extend(listed)
+
+    # Tables of subjects and sessions are filtered, everything else is linked
+    listed = set(files)
+    rewritten = []
+    if subjects is not None and 'participants.tsv' in listed:
+        rewritten.append(('participants.tsv', 'participant_id', {'sub-' + label for label in subjects}))
+    if sessions is not None:
+        for name in names:
+            rel = os.path.join(name, name + '_sessions.tsv')
+            if rel in listed:
+                labels = {'ses-' + label for label in sessions}
+                column = 'session-id' if 'session-id' in pd.read_csv(os.path.join(path, rel), sep='\t',
+                                                                     nrows=0).columns else 'session_id'
+                rewritten.append((rel, column, labels))
+    for rel, column, keep in rewritten:
+        _filter_table(os.path.join(path, rel), os.path.join(target, rel), column, keep)
+
+    skipped = {rel for rel, _, _ in rewritten}
+    items = [(os.path.join(path, rel), os.path.join(target, rel)) for rel in files if rel not in skipped]
+    batches = [(items[i:i + BATCH_SIZE], mode) for i in range(0, items.__len__(), BATCH_SIZE)]
+    os.makedirs(target, exist_ok=True)
+    modes = Counter(m for batch in parallel_map(_link_files, batches, n_jobs=n_jobs, executor='thread')
+                    for m in batch)
+    return {'rewritten': sorted(rel.replace(os.sep, '/') for rel in skipped), 'linked': dict(modes)}
@@ -0,0 +1,320 @@
+# Copyright 2020-present, Mayo Clinic Department of Neurology - Bioelectronics Neurophysiology and Engineering Laboratory
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+Interval index for time range queries on events.tsv files.
+
+Events are stored as intervals [onset, stop] with stop = offset if present and onset + duration otherwise (template
+events). The intervals are sorted by onset and the running maximum of the stops is kept, so the candidates of every
+query are found with np.searchsorted and whole batches of queries are answered without Python loops.
+"""
+import numpy as np
+import pandas as pd
+
+
+def _numeric(events, key):
+    if key not in events.keys():
+        return np.full(events.__len__(), np.nan)
+    return pd.to_numeric(events[key], errors='coerce').to_numpy(dtype=float)
+
+
+def _labels(events, key):
+    if key not in events.keys():
+        return np.full(events.__len__(), None, dtype=object)
+    return events[key].to_numpy(dtype=object)
+
+
+def fill_time_samples(events, fs, overwrite=False):
+    """
+    Compute missing time or sample columns of an events table in place (see template_events).
+
+    Samples are computed from times as sample_start = round(onset * fs) and sample_end = round(stop * fs) with stop =
+    offset if present and onset + duration otherwise. Times are computed from samples as onset = sample_start / fs and
+    offset = sample_end / fs. Every column is computed for all rows at once.
+
+    Args:
+        events (pandas.DataFrame): Events table, e.g. a BIDS_TSV or a table of BIDSDataset.load_table. Missing
+            columns are added.
+        fs (float or array_like): Sampling frequency in Hz, either one value or one value per row (e.g. for tables
+            of many recordings). Rows with NaN sampling frequency are not changed.
+        overwrite (bool, optional): Recompute the samples of all rows with a time, instead of only the missing ones.
+            Defaults to False.
+
+    Returns:
+        pandas.DataFrame: The events table.
+
+    Example:
+        >>> fill_time_samples(events, 2000)
+    """
+    fs = np.broadcast_to(np.asarray(fs, dtype=float), (events.__len__(),))
+    onset = _numeric(events, 'onset')
+    duration = _numeric(events, 'duration')
+    offset = _numeric(events, 'offset')
+    sample_start = _numeric(events, 'sample_start')
+    sample_end = _numeric(events, 'sample_end')
+    stop = np.where(np.isnan(offset), onset + duration, offset)
+
+    with np.errstate(invalid='ignore'):
+        computed = {
+            'sample_start': (np.round(onset * fs), sample_start),
+            'sample_end': (np.round(stop * fs), sample_end),
+            'onset': (sample_start / fs, onset),
+            'offset': (sample_end / fs, offset),
+        }
+    object_columns = (events.dtypes == object).any()
+    for key, (values, current) in computed.items():
+        mask = ~np.isnan(values)
+        if not overwrite or key in ('onset', 'offset'):
+            mask &= np.isnan(current)
+        rows = np.flatnonzero(mask)
+        values = values[rows].astype(np.int64) if key.startswith('sample') else values[rows]
+        if key not in events.keys():
+            if rows.__len__() == events.__len__() and not object_columns:
+                events[key] = values
+                continue
+            events[key] = pd.Series(None if object_columns else np.nan, index=events.index,
+                                    dtype=object if object_columns else float)
+        if rows.__len__():
+            events.iloc[rows, events.columns.get_loc(key)] = values
+    return events
+
+
+# Selections matching any of several values, all other selections are single values
+SELECTION_TYPES = (list, tuple, set, frozenset, np.ndarray, pd.Index, pd.Series)
+
+
+def _match(values, selection):
+    if isinstance(selection, SELECTION_TYPES):
+        return np.isin(values, list(selection))
+    return values == selection
+
+
+def _selection_key(selection):
+    """
+    Get a hashable key of a selection of trial_type or sub_type values. Selections of the same values in any order and
+    of any container type share the key.
+    """
+    if isinstance(selection, SELECTION_TYPES):
+        return tuple(sorted(set(np.asarray(selection, dtype=object).ravel().tolist()), key=repr))
+    return selection
+
+
+class EventIndex:
+    """
+    Interval index of events.
+
+    Query results are positions of rows in the events table (usable with DataFrame.iloc). Events without onset are not
+    indexed. Filtering by trial_type and sub_type uses sub-indexes which are built on first use and cached.
+
+    Args:
+        events (pandas.DataFrame, optional): Events table with the onset, duration and offset columns of
+            template_events. Defaults to an empty index.
+
+    Example:
+        >>> index = EventIndex(events)
+        >>> rows = index.overlapping(100, 200, trial_type='electrical stimulation')
+        >>> query, rows = index.around(seizure_onsets, 5, 5, trial_type='electrical stimulation')
+    """
+
+    def __init__(self, events=None):
+        self._start = np.zeros(0)
+        self._stop = np.zeros(0)
+        self._position = np.zeros(0, dtype=int)
+        self._trial_type = np.zeros(0, dtype=object)
+        self._sub_type = np.zeros(0, dtype=object)
+        self._stop_max = np.zeros(0)
+        self._stop_sorted = None
+        self._subindexes = {}
+        self.n_rows = 0
+        if events is not None:
+            self.extend(events)
+
+    def __len__(self):
+        return self._start.__len__()
+
+    def extend(self, events, first_position=None):
+        """
+        Add events to the index.
+
+        Args:
+            events (pandas.DataFrame): New rows of the events table.
+            first_position (int, optional): Position of the first new row in the events table. Defaults to the number
+                of rows added so far.
+        """
+        if first_position is None:
+            first_position = self.n_rows
+        onset = _numeric(events, 'onset')
+        duration = _numeric(events, 'duration')
+        offset = _numeric(events, 'offset')
+        stop = np.where(np.isnan(offset), onset + np.nan_to_num(duration), offset)
+        position = first_position + np.arange(events.__len__())
+        trial_type = _labels(events, 'trial_type')
+        sub_type = _labels(events, 'sub_type')
+        self.n_rows = max(self.n_rows, first_position + events.__len__())
+
+        valid = ~np.isnan(onset)
+        stop = np.fmax(stop[valid], onset[valid])
+        self._add(onset[valid], stop, position[valid], trial_type[valid], sub_type[valid])
+
+    def _add(self, start, stop, position, trial_type, sub_type):
+        if start.__len__() == 0:
+            return
+        order = np.argsort(start, kind='stable')
+        start, stop, position = start[order], stop[order], position[order]
+        trial_type, sub_type = trial_type[order], sub_type[order]
+
+        if self._start.__len__() and start[0] >= self._start[-1]:
+            # Appending events in time order, the common case when rows are added
+            self._start = np.concatenate([self._start, start])
+            self._stop = np.concatenate([self._stop, stop])
+            self._position = np.concatenate([self._position, position])
+            self._trial_type = np.concatenate([self._trial_type, trial_type])
+            self._sub_type = np.concatenate([self._sub_type, sub_type])
+        else:
+            insert = np.searchsorted(self._start, start, side='right')
+            self._start = np.insert(self._start, insert, start)
+            self._stop = np.insert(self._stop, insert, stop)
+            self._position = np.insert(self._position, insert, position)
+            self._trial_type = np.insert(self._trial_type, insert, trial_type)
+            self._sub_type = np.insert(self._sub_type, insert, sub_type)
+        self._stop_max = np.maximum.accumulate(self._stop)
+        self._stop_sorted = None
+        self._subindexes = {}
+
+    def _select(self, trial_type, sub_type):
+        """
+        Get the index restricted to the given trial_type and sub_type values.
+        """
+        if trial_type is None and sub_type is None:
+            return self
+
+        key = (_selection_key(trial_type), _selection_key(sub_type))
+        if key not in self._subindexes:
+            mask = np.ones(self.__len__(), dtype=bool)
+            if trial_type is not None:
+                mask &= _match(self._trial_type, trial_type)
+            if sub_type is not None:
+                mask &= _match(self._sub_type, sub_type)
+            subindex = EventIndex()
+            subindex._add(self._start[mask], self._stop[mask], self._position[mask], self._trial_type[mask],
+                          self._sub_type[mask])
+            subindex.n_rows = self.n_rows
+            self._subindexes[key] = subindex
+        return self._subindexes[key]
+
+    @staticmethod
+    def _expand(lo, hi):
+        """
+        Expand ranges [lo, hi) of candidates to flat arrays of query numbers and sorted positions.
+        """
+        lengths = np.maximum(hi - lo, 0)
+        query = np.repeat(np.arange(lengths.__len__()), lengths)
+        first = np.cumsum(lengths) - lengths
+        candidate = np.arange(lengths.sum()) - np.repeat(first, lengths) + np.repeat(lo, lengths)
+        return query, candidate
+
+    def overlapping_batch(self, t_start, t_stop, trial_type=None, sub_type=None):
+        """
+        Find events overlapping each of the time ranges [t_start, t_stop].
+
+        Args:
+            t_start (array_like): Start times of the ranges in seconds.
+            t_stop (array_like): Stop times of the ranges in seconds.
+            trial_type (str or list, optional): Only events of these trial types.
+            sub_type (str or list, optional): Only events of these sub types.
+
+        Returns:
+            tuple: Arrays of equal length with the number of the range and the position of the overlapping event.
+        """
+        index = self._select(trial_type, sub_type)
+        t_start = np.atleast_1d(np.asarray(t_start, dtype=float))
+        t_stop = np.atleast_1d(np.asarray(t_stop, dtype=float))
+
+        lo = np.searchsorted(index._stop_max, t_start, side='left')
+        hi = np.searchsorted(index._start, t_stop, side='right')
+        query, candidate = self._expand(lo, hi)
+        keep = index._stop[candidate] >= t_start[query]
+        return query[keep], index._position[candidate[keep]]
+
+    def contained_batch(self, t_start, t_stop, trial_type=None, sub_type=None):
+        """
+        Find events lying completely within each of the time ranges [t_start, t_stop].
+
+        Args:
+            t_start (array_like): Start times of the ranges in seconds.
+            t_stop (array_like): Stop times of the ranges in seconds.
+            trial_type (str or list, optional): Only events of these trial types.
+            sub_type (str or list, optional): Only events of these sub types.
+
+        Returns:
+            tuple: Arrays of equal length with the number of the range and the position of the contained event.
+        """
+        index = self._select(trial_type, sub_type)
+        t_start = np.atleast_1d(np.asarray(t_start, dtype=float))
+        t_stop = np.atleast_1d(np.asarray(t_stop, dtype=float))
+
+        lo = np.searchsorted(index._start, t_start, side='left')
+        hi = np.searchsorted(index._start, t_stop, side='right')
+        query, candidate = self._expand(lo, hi)
+        keep = index._stop[candidate] <= t_stop[query]
+        return query[keep], index._position[candidate[keep]]
+
+    def count_overlapping(self, t_start, t_stop, trial_type=None, sub_type=None):
+        """
+        Count events overlapping each of the time ranges without listing them.
+
+        Args:
+            t_start (array_like): Start times of the ranges in seconds.
+            t_stop (array_like): Stop times of the ranges in seconds.
+            trial_type (str or list, optional): Only events of these trial types.
+            sub_type (str or list, optional): Only events of these sub types.
+
+        Returns:
+            numpy.ndarray: Number of overlapping events per range.
+        """
+        index = self._select(trial_type, sub_type)
+        if index._stop_sorted is None:
+            index._stop_sorted = np.sort(index._stop)
+        # Events starting before the range end minus events ending before the range start
+        n_started = np.searchsorted(index._start, np.asarray(t_stop, dtype=float), side='right')
+        n_finished = np.searchsorted(index._stop_sorted, np.asarray(t_start, dtype=float), side='left')
+        return n_started - n_finished
+
+    def overlapping(self, t_start, t_stop, trial_type=None, sub_type=None):
+        """
+        Find events overlapping the time range [t_start, t_stop].
+
+        Returns:
+            numpy.ndarray: Sorted positions of the events in the events table.
+        """
+        _, position = self.overlapping_batch(t_start, t_stop, trial_type=trial_type, sub_type=sub_type)
+        return np.sort(position)
+
+    def contained(self, t_start, t_stop, trial_type=None, sub_type=None):
+        """
+        Find events lying completely within the time range [t_start, t_stop].
+
+        Returns:
+            numpy.ndarray: Sorted positions of the events in the events table.
+        """
+        _, position = self.contained_batch(t_start, t_stop, trial_type=trial_type, sub_type=sub_type)
+        return np.sort(position)
+
+    def around(self, times, before, after, trial_type=None, sub_type=None):
+        """
+        Find events overlapping windows around reference times, e.g. stimulations within 5 s of seizure onsets.
+
+        Args:
+            times (array_like): Reference times in seconds.
+            before (float): Length of the window before each reference time in seconds.
+            after (float): Length of the window after each reference time in seconds.
+            trial_type (str or list, optional): Only events of these trial types.
+            sub_type (str or list, optional): Only events of these sub types.
+
+        Returns:
+            tuple: Arrays of equal length with the number of the reference time and the position of the event.
+        """
+        times = np.atleast_1d(np.asarray(times, dtype=float))
+        return self.overlapping_batch(times - before, times + after, trial_type=trial_type, sub_type=sub_type)
@@ -0,0 +1,346 @@
+# Copyright 2020-present, Mayo Clinic Department of Neurology - Bioelectronics Neurophysiology and Engineering Laboratory
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+Crash-safe file writes.
+
+Files are written to a hidden temporary file in the target directory and renamed over the target, so a killed process
+never leaves a truncated file behind. Inside batch_write, the renames (also of files finished with replace_file) are
+deferred until the batch is committed. At
+commit only the files of the batch are flushed to disk, by a few threads at once, then they are renamed and every
+directory is synced only once. link_file creates files sharing the data of another file (reflink or hardlink) where the
+filesystem allows it.
+"""
+import os
+import stat
+import shutil
+import secrets
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from . import instrumentation
+
+
+# Batch of the current thread, see batch_write
+_local = threading.local()
+
+# Threads syncing the files of a batch at commit
+FSYNC_THREADS = 8
+
+
+class _Batch:
+    """
+    Files written inside batch_write and waiting for commit.
+
+    The batch belongs to the thread which opened it. Other threads join it only explicitly with write. The lock is held
+    while files are added, committed or aborted, so a write never slips in while the batch is being committed.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.pending = {}
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def write(self, path, data, on_commit=None):
+        """
+        Write a file as part of the batch, e.g. from a worker thread of the thread which opened the batch.
+
+        Args:
+            path (str): Path to the file.
+            data (bytes or str): Content of the file. Strings are encoded as utf-8.
+            on_commit (callable, optional): Called without arguments once the file is replaced.
+        """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        t0 = instrumentation.start()
+        self.add(path, _write_temp(path, data, fsync=False), on_commit)
+        instrumentation.record(t0, instrumentation.file_type(path), 'write', files=1, bytes_written=data.__len__())
+
+    def add(self, path, path_tmp, on_commit):
+        with self._lock:
+            if self.closed:
+                _remove(path_tmp)
+                raise RuntimeError('Write to a batch which was already committed or aborted: {}'.format(path))
+            previous = self.pending.pop(path, None)
+            self.pending[path] = (path_tmp, on_commit)
+        if previous is not None:
+            _remove(previous[0])
+
+    def commit(self):
+        with self._lock:
+            self.closed = True
+            pending = list(self.pending.items())
+            if pending.__len__() == 0:
+                return
+
+            # Only the files of the batch are flushed, by several threads as the syncs wait for the disk
+            with ThreadPoolExecutor(max_workers=min(FSYNC_THREADS, pending.__len__())) as pool:
+                list(pool.map(_fsync_file, [path_tmp for _, (path_tmp, _) in pending]))
+
+            for path, (path_tmp, _) in pending:
+                os.replace(path_tmp, path)
+                del self.pending[path]
+
+            for directory in sorted(set(os.path.dirname(os.path.abspath(path)) for path, _ in pending)):
+                _fsync_dir(directory)
+
+        for path, (_, on_commit) in pending:
+            if on_commit is not None:
+                on_commit()
+
+    def abort(self):
+        with self._lock:
+            self.closed = True
+            pending = list(self.pending.values())
+            self.pending = {}
+        for path_tmp, _ in pending:
+            _remove(path_tmp)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _fsync_file(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        # Only the data and the size are needed for the rename to be durable
+        getattr(os, 'fdatasync', os.fsync)(fd)
+    finally:
+        os.close(fd)
+
+
+def _fsync_dir(path):
+    # Directories cannot be opened on some platforms (Windows), renames are durable there without the sync
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _write_temp(path, data, fsync):
+    """
+    Write data to a new hidden temporary file next to the target.
+
+    The file is created with the default permissions (respecting umask) or with the permissions of the existing target.
+
+    Returns:
+        str: Path to the temporary file.
+    """
+    directory, name = os.path.split(path)
+    path_tmp = os.path.join(directory, '.{}.{}.tmp'.format(name, secrets.token_hex(4)))
+    fd = os.open(path_tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        try:
+            os.chmod(path_tmp, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            pass
+    except BaseException:
+        _remove(path_tmp)
+        raise
+    return path_tmp
+
+
+def atomic_write(path, data, fsync=False, on_commit=None):
+    """
+    Write a file atomically, i.e. readers and crashes see either the old or the new content.
+
+    Inside batch_write (in the same thread), the file is replaced only when the batch is committed.
+
+    Args:
+        path (str): Path to the file.
+        data (bytes or str): Content of the file. Strings are encoded as utf-8.
+        fsync (bool, optional): Sync the file and its directory to disk before returning. Ignored inside batch_write,
+            which syncs all files at commit. Defaults to False.
+        on_commit (callable, optional): Called without arguments once the file is replaced. Not called if the batch
+            is aborted.
+    """
+    batch = getattr(_local, 'batch', None)
+    if batch is not None:
+        batch.write(path, data, on_commit)
+        return
+
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    t0 = instrumentation.start()
+    path_tmp = _write_temp(path, data, fsync=fsync)
+    try:
+        os.replace(path_tmp, path)
+    except BaseException:
+        _remove(path_tmp)
+        raise
+    if fsync:
+        _fsync_dir(os.path.dirname(os.path.abspath(path)))
+    instrumentation.record(t0, instrumentation.file_type(path), 'write', files=1, bytes_written=data.__len__())
+    if on_commit is not None:
+        on_commit()
+
+
+def replace_file(path_tmp, path, on_commit=None):
+    """
+    Rename a finished temporary file over a file, e.g. a data file written in chunks.
+
+    Inside batch_write (in the same thread), the file is replaced only when the batch is committed, and the temporary
+    file is removed if the batch is aborted.
+
+    Args:
+        path_tmp (str): Path to the temporary file, in the directory of the target.
+        path (str): Path to the file.
+        on_commit (callable, optional): Called without arguments once the file is replaced. Not called if the batch
+            is aborted.
+    """
+    batch = getattr(_local, 'batch', None)
+    if batch is not None:
+        batch.add(path, path_tmp, on_commit)
+        return
+
+    try:
+        os.replace(path_tmp, path)
+    except BaseException:
+        _remove(path_tmp)
+        raise
+    if on_commit is not None:
+        on_commit()
+
+
+def atomic_copy(src, dst):
+    """
+    Copy a file atomically with its permissions and modification time. Missing directories of the target are created.
+
+    Args:
+        src (str): Path to the source file.
+        dst (str): Path to the target file.
+
+    Returns:
+        str: Path to the target file.
+    """
+    t0 = instrumentation.start()
+    directory, name = os.path.split(dst)
+    os.makedirs(directory, exist_ok=True)
+    path_tmp = os.path.join(directory, '.{}.{}.tmp'.format(name, secrets.token_hex(4)))
+    try:
+        shutil.copyfile(src, path_tmp)
+        shutil.copystat(src, path_tmp)
+        os.replace(path_tmp, dst)
+    except BaseException:
+        _remove(path_tmp)
+        raise
+    instrumentation.record(t0, instrumentation.file_type(dst), 'copy', files=1, bytes_written=os.path.getsize(dst))
+    return dst
+
+
+# Request of the Linux FICLONE ioctl, which shares the blocks of a file with a new file (copy on write)
+FICLONE = 0x40049409
+
+LINK_MODES = ('reflink', 'hardlink', 'copy')
+
+
+def _reflink(src, dst):
+    import fcntl
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def link_file(src, dst, mode='auto'):
+    """
+    Create a file with the content of another one without copying the data if the filesystem allows it.
+
+    With mode 'auto', a reflink (copy on write clone, e.g. on Btrfs and XFS) is tried first, then a hardlink (same
+    filesystem), then a copy. Files replaced later with atomic_write get a new inode, so rewriting the metadata of a
+    linked file never changes the source. Data files must not be modified in place if they are hardlinked.
+
+    Args:
+        src (str): Path to the source file.
+        dst (str): Path to the new file. Missing directories are created, an existing file is replaced.
+        mode (str, optional): 'auto', 'reflink', 'hardlink' or 'copy'. Defaults to 'auto'.
+
+    Returns:
+        str: The mode which was used.
+
+    Raises:
+        OSError: If the requested mode is not supported for these files.
+    """
+    if mode != 'auto' and mode not in LINK_MODES:
+        raise ValueError("mode must be 'auto' or one of {}, got {}".format(LINK_MODES, mode))
+    t0 = instrumentation.start()
+    directory, name = os.path.split(dst)
+    os.makedirs(directory, exist_ok=True)
+    path_tmp = os.path.join(directory, '.{}.{}.tmp'.format(name, secrets.token_hex(4)))
+    for candidate in (LINK_MODES if mode == 'auto' else (mode,)):
+        try:
+            if candidate == 'reflink':
+                _reflink(src, path_tmp)
+            elif candidate == 'hardlink':
+                os.link(src, path_tmp)
+            else:
+                shutil.copy2(src, path_tmp)
+            os.replace(path_tmp, dst)
+        except (OSError, ImportError):
+            _remove(path_tmp)
+            if mode != 'auto' or candidate == 'copy':
+                raise
+            continue
+        break
+    instrumentation.record(t0, instrumentation.file_type(dst), candidate, files=1)
+    return candidate
+
+
+@contextmanager
+def batch_write():
+    """
+    Group atomic writes into a transaction.
+
+    Files written with atomic_write inside the context by the same thread are replaced when the context is left. Other
+    threads join the batch only explicitly, by calling write on the object returned by the context. If the context is
+    left with an exception, the files are left unchanged. Until the commit, reads return the old content. Nested
+    contexts of the same thread join the outermost one.
+
+    At commit the temporary files of the batch (and only those) are flushed to disk by a few threads, then they are
+    renamed and every directory is synced once.
+
+    Example:
+        >>> with batch_write() as batch:
+        ...     for tsv in tsvs:
+        ...         tsv.dump()
+        ...     parallel_map(lambda item: batch.write(*item), files.items(), n_jobs=8)
+    """
+    batch = getattr(_local, 'batch', None)
+    if batch is None:
+        batch = _local.batch = _Batch()
+    batch.depth += 1
+
+    try:
+        yield batch
+    except BaseException:
+        batch.depth -= 1
+        if batch.depth == 0:
+            _local.batch = None
+            batch.abort()
+        raise
+    else:
+        batch.depth -= 1
+        if batch.depth == 0:
+            _local.batch = None
+            try:
+                batch.commit()
+            except BaseException:
+                batch.abort()
+                raise
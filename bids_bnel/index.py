@@ -0,0 +1,287 @@
+# Copyright 2020-present, Mayo Clinic Department of Neurology - Bioelectronics Neurophysiology and Engineering Laboratory
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+Persistent file index of a BIDS dataset.
+
+The index maps BIDS entities (sub, ses, task, run, acq, ..., suffix, extension) of every file in the subject
+directories to its path. The directory listing is stored in a compact JSON cache in a hidden directory of the dataset
+root together with the modification time of each directory. When the index is updated, only directories whose
+modification time changed are listed again, the other ones are only checked with a single stat call.
+"""
+import os
+import json
+import time
+
+from .parallel import parallel_map
+from .fileio import atomic_write
+from . import instrumentation
+
+CACHE_DIRNAME = '.bids_bnel'
+INDEX_FILENAME = 'index.json'
+INDEX_VERSION = 1
+
+# Directories modified less than this many nanoseconds before the scan are listed again on the next update. Coarse
+# modification times (e.g. on NFS) would otherwise hide changes made right after the scan.
+RACY_INTERVAL_NS = 2 * 10 ** 9
+
+
+def parse_entities(filename):
+    """
+    Parse BIDS entities from a filename.
+
+    Example:
+        >>> parse_entities('sub-01_ses-02_task-rest_run-1_ieeg.eeg')
+        {'sub': '01', 'ses': '02', 'task': 'rest', 'run': '1', 'suffix': 'ieeg', 'extension': '.eeg'}
+
+    Args:
+        filename (str): Name of the file without the directory.
+
+    Returns:
+        dict: Entities of the file. The last underscore separated part of the name is stored as suffix and everything
+        from the first dot as extension.
+    """
+    if '.' in filename:
+        stem, extension = filename.split('.', 1)
+        extension = '.' + extension
+    else:
+        stem, extension = filename, ''
+
+    entities = {}
+    parts = stem.split('_')
+    for part in parts[:-1]:
+        if '-' in part:
+            key, value = part.split('-', 1)
+            entities[key] = value
+
+    if '-' in parts[-1]:
+        key, value = parts[-1].split('-', 1)
+        entities[key] = value
+        entities['suffix'] = None
+    else:
+        entities['suffix'] = parts[-1]
+    entities['extension'] = extension
+    return entities
+
+
+class BIDSIndex:
+    """
+    File index of a BIDS dataset persisted in the dataset root.
+
+    Files in the dataset root and in all sub-* directories are indexed. Hidden files and directories are skipped.
+
+    Args:
+        root (str): Path to the BIDS dataset directory.
+        cache_path (str, optional): Path to the cache file. Defaults to INDEX_FILENAME in the CACHE_DIRNAME directory
+            of the dataset root. The cache is kept in a subdirectory so that writing it does not change the
+            modification time of the dataset root.
+
+    Attributes:
+        root (str): Path to the BIDS dataset directory.
+        cache_path (str): Path to the cache file.
+        scanned (list): Directories (relative to the root) listed during the last update.
+    """
+
+    def __init__(self, root, cache_path=None):
+        self.root = root
+        self.cache_path = cache_path if isinstance(cache_path, str) else os.path.join(root, CACHE_DIRNAME, INDEX_FILENAME)
+        self.scanned = []
+        self._dirs = {}
+        self._records = None
+        self._load()
+
+    def _load(self):
+        """
+        Load the directory listing from the cache file. A missing or unreadable cache is ignored.
+        """
+        if not os.path.exists(self.cache_path):
+            return
+        t0 = instrumentation.start()
+        try:
+            with open(self.cache_path, 'r') as f:
+                text = f.read()
+            cache = json.loads(text)
+        except (OSError, ValueError):
+            return
+        instrumentation.record(t0, 'json', 'read', files=1, bytes_read=text.__len__())
+        if cache.get('version') == INDEX_VERSION:
+            self._dirs = cache['dirs']
+
+    def save(self):
+        """
+        Save the directory listing to the cache file. The file is replaced atomically.
+        """
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        atomic_write(self.cache_path, json.dumps({'version': INDEX_VERSION, 'dirs': self._dirs}, separators=(',', ':')))
+
+    def update(self, save=True, n_jobs=1):
+        """
+        Update the index. Only directories with a changed modification time are listed again.
+
+        Args:
+            save (bool, optional): Save the cache file if anything changed. Defaults to True.
+            n_jobs (int, optional): Number of threads scanning subject directories in parallel, see
+                parallel.resolve_n_jobs. Defaults to 1.
+
+        Returns:
+            bool: True if the index changed.
+        """
+        if save:
+            # Create the cache directory before scanning, creating it later would change the root modification time
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+
+        dirs = {}
+        scanned = []
+        root, listed = self._scan_dir('')
+        if root is not None:
+            dirs[''] = root
+            if listed:
+                scanned.append('')
+            subjects = [name for name in root[2] if name.startswith('sub-')]
+            for tree_dirs, tree_scanned in parallel_map(self._scan_tree, subjects, n_jobs=n_jobs, executor='thread'):
+                dirs.update(tree_dirs)
+                scanned.extend(tree_scanned)
+
+        self.scanned = scanned
+        changed = dirs != self._dirs
+        self._dirs = dirs
+        if changed:
+            self._records = None
+            if save:
+                self.save()
+        return changed
+
+    def _scan_tree(self, rel):
+        """
+        Get listings of a directory and all its subdirectories.
+
+        Args:
+            rel (str): Path of the directory relative to the root.
+
+        Returns:
+            tuple: Listings by relative path (see _scan_dir) and the list of directories which were listed again.
+        """
+        dirs = {}
+        scanned = []
+        stack = [rel]
+        while stack.__len__():
+            rel = stack.pop()
+            entry, listed = self._scan_dir(rel)
+            if entry is None:
+                continue
+            dirs[rel] = entry
+            if listed:
+                scanned.append(rel)
+            for name in reversed(entry[2]):
+                stack.append(os.path.join(rel, name))
+        return dirs, scanned
+
+    def _scan_dir(self, rel):
+        """
+        Get the listing of a single directory, reusing the cached listing if the directory did not change.
+
+        Args:
+            rel (str): Path of the directory relative to the root.
+
+        Returns:
+            tuple: [modification time in ns or None, file names, directory names] or None if the directory does not
+            exist, and True if the directory was listed again.
+        """
+        path = os.path.join(self.root, rel)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None, False
+
+        cached = self._dirs.get(rel)
+        if cached is not None and cached[0] == mtime:
+            return cached, False
+
+        t0 = instrumentation.start()
+        files = []
+        dirs = []
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir():
+                    dirs.append(entry.name)
+                else:
+                    files.append(entry.name)
+
+        instrumentation.record(t0, 'dir', 'list', files=1, items=files.__len__() + dirs.__len__())
+
+        if time.time_ns() - mtime < RACY_INTERVAL_NS:
+            mtime = None
+        return [mtime, sorted(files), sorted(dirs)], True
+
+    @property
+    def records(self):
+        """
+        Get entities of all indexed files.
+
+        Returns:
+            list: One dict per file with the parsed entities, 'datatype' for files in a datatype directory (e.g.
+            ieeg) and 'path' with the absolute path of the file.
+        """
+        if self._records is None:
+            records = []
+            for rel, (_, files, _) in self._dirs.items():
+                datatype = os.path.basename(rel)
+                if datatype == '' or datatype.startswith('sub-') or datatype.startswith('ses-'):
+                    datatype = None
+                for name in files:
+                    record = parse_entities(name)
+                    record['datatype'] = datatype
+                    record['path'] = os.path.join(self.root, rel, name)
+                    records.append(record)
+            self._records = records
+        return self._records
+
+    def query(self, **entities):
+        """
+        Find indexed files matching the given entities.
+
+        Example:
+            >>> index.query(sub='01', suffix='ieeg', extension=['.eeg', '.bin'])
+
+        Args:
+            **entities: Entity values without the key prefix (sub='01'). A list, tuple or set matches any of its
+                values and None matches files without the entity.
+
+        Returns:
+            list: Records (see records) of the matching files.
+        """
+        filters = []
+        for key, value in entities.items():
+            if isinstance(value, (list, tuple, set)):
+                filters.append((key, set(value)))
+            else:
+                filters.append((key, {value}))
+
+        return [r for r in self.records if all(r.get(key) in values for key, values in filters)]
+
+    def subjects(self):
+        """
+        Get labels of all subjects.
+
+        Returns:
+            list: Sorted subject labels without the 'sub-' prefix.
+        """
+        root = self._dirs.get('', [None, [], []])
+        return [name[4:] for name in root[2] if name.startswith('sub-')]
+
+    def sessions(self, subject):
+        """
+        Get labels of all sessions of a subject.
+
+        Args:
+            subject (str): Subject label without the 'sub-' prefix.
+
+        Returns:
+            list: Sorted session labels without the 'ses-' prefix.
+        """
+        entry = self._dirs.get('sub-' + subject, [None, [], []])
+        return [name[4:] for name in entry[2] if name.startswith('ses-')]
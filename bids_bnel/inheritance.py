@@ -0,0 +1,225 @@
+# Copyright 2020-present, Mayo Clinic Department of Neurology - Bioelectronics Neurophysiology and Engineering Laboratory
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+Resolution of sidecar metadata following the BIDS inheritance principle.
+
+The metadata of a data file is the merge of all JSON sidecars with the same suffix whose entities are a subset of the
+entities of the data file, found in the directories from the dataset root down to the directory of the data file.
+Values of deeper (and, within a directory, more specific) sidecars override the values of the shallower ones.
+
+Directory listings, parsed sidecars and merged results are memoized. A directory is listed again when its modification
+time changes, a sidecar is parsed again when its modification time or size changes, and a merged result is reused as
+long as the same sidecars apply and none of them changed. Resolving many files of the same session therefore stats
+the shared directories and sidecars once per call and merges them only once.
+"""
+import os
+import json
+import time
+import itertools
+
+from .index import parse_entities, RACY_INTERVAL_NS
+
+
+_generations = itertools.count()
+
+
+class _Call:
+    """
+    State shared by the lookups of one resolve or resolve_many call: every path is stat'ed only once, and entries
+    recorded during the call are valid for the whole call.
+    """
+
+    def __init__(self):
+        self.generation = next(_generations)
+        self.stats = {}
+
+    def stat(self, path):
+        if path not in self.stats:
+            try:
+                st = os.stat(path)
+                self.stats[path] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                self.stats[path] = None
+        return self.stats[path]
+
+    def is_valid(self, entry, stamps):
+        # Entries recorded right after a modification are not trusted in later calls, coarse modification times could
+        # hide changes
+        if entry is None or entry['stamps'] != stamps:
+            return False
+        if entry['generation'] == self.generation:
+            return True
+        return all(entry['recorded_ns'] - stamp[0] >= RACY_INTERVAL_NS for stamp in stamps if stamp is not None)
+
+    def entry(self, stamps, value):
+        return {'stamps': stamps, 'generation': self.generation, 'recorded_ns': time.time_ns(), 'value': value}
+
+
+class SidecarResolver:
+    """
+    Memoizing resolver of inherited sidecar metadata.
+
+    Args:
+        root (str): Path to the BIDS dataset directory.
+        loader (callable, optional): Called with the path of a sidecar, returns its content as a dict (e.g.
+            BIDS_json). Defaults to json.load.
+
+    Example:
+        >>> resolver = SidecarResolver('/data/bids', loader=BIDS_json)
+        >>> resolver.resolve('/data/bids/sub-01/ses-01/ieeg/sub-01_ses-01_task-rest_ieeg.eeg')['SamplingFrequency']
+        2000
+    """
+
+    def __init__(self, root, loader=None):
+        self.root = os.path.abspath(root)
+        self._loader = loader if loader is not None else self._load_json
+        self._dirs = {}
+        self._jsons = {}
+        self._merged = {}
+        self._chains = {}
+
+    @staticmethod
+    def _load_json(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def clear(self):
+        """
+        Drop all memoized listings, sidecars and merged results.
+        """
+        self._dirs = {}
+        self._jsons = {}
+        self._merged = {}
+        self._chains = {}
+
+    def _sidecars(self, directory, call):
+        """
+        Get the sidecars of a directory as (entities, path) tuples, listing the directory if it changed.
+        """
+        stamps = (call.stat(directory),)
+        if stamps[0] is None:
+            return []
+        entry = self._dirs.get(directory)
+        if call.is_valid(entry, stamps):
+            return entry['value']
+
+        sidecars = []
+        with os.scandir(directory) as it:
+            for dir_entry in it:
+                if dir_entry.name.startswith('.') or not dir_entry.name.endswith('.json'):
+                    continue
+                entities = parse_entities(dir_entry.name)
+                if entities['extension'] != '.json' or entities['suffix'] is None:
+                    continue
+                del entities['extension']
+                sidecars.append((entities, dir_entry.path))
+        # Less specific sidecars first, so the more specific ones override them
+        sidecars.sort(key=lambda item: (item[0].__len__(), item[1]))
+        self._dirs[directory] = call.entry(stamps, sidecars)
+        return sidecars
+
+    def _json(self, path, call):
+        """
+        Get the parsed content of a sidecar, parsing it again if it changed.
+        """
+        stamps = (call.stat(path),)
+        entry = self._jsons.get(path)
+        if not call.is_valid(entry, stamps):
+            entry = call.entry(stamps, self._loader(path))
+            self._jsons[path] = entry
+        return entry['value']
+
+    def _directories(self, path):
+        """
+        List the directories from the dataset root down to the directory of the file.
+        """
+        directory = os.path.dirname(path)
+        if directory not in self._chains:
+            self._chains[directory] = self._list_directories(path, directory)
+        return self._chains[directory]
+
+    def _list_directories(self, path, directory):
+        relative = os.path.relpath(directory, self.root)
+        if relative == os.pardir or relative.startswith(os.pardir + os.sep) or os.path.isabs(relative):
+            raise ValueError('{} is not in the dataset {}'.format(path, self.root))
+        directories = [self.root]
+        if relative != os.curdir:
+            for part in relative.split(os.sep):
+                directories.append(os.path.join(directories[-1], part))
+        return directories
+
+    def applicable(self, path, _call=None):
+        """
+        Find the sidecars applying to a file, in the order in which they are merged.
+
+        Args:
+            path (str): Path to the data file.
+
+        Returns:
+            list: Paths of the sidecars, least specific first.
+
+        Raises:
+            ValueError: If the file is not in the dataset directory.
+        """
+        call = _call if _call is not None else _Call()
+        path = os.path.abspath(path)
+        entities = parse_entities(os.path.basename(path))
+        suffix = entities.pop('suffix')
+        entities.pop('extension')
+
+        paths = []
+        for directory in self._directories(path):
+            for sidecar_entities, sidecar_path in self._sidecars(directory, call):
+                if sidecar_path == path or sidecar_entities['suffix'] != suffix:
+                    continue
+                if all(entities.get(key) == value for key, value in sidecar_entities.items() if key != 'suffix'):
+                    paths.append(sidecar_path)
+        return paths
+
+    def resolve(self, path, _call=None):
+        """
+        Get the merged sidecar metadata of a file.
+
+        Args:
+            path (str): Path to the data file, e.g. *_ieeg.eeg, *_channels.tsv or *_events.tsv.
+
+        Returns:
+            dict: Merged metadata. The dict is a shallow copy, nested values are shared with the memoized sidecars
+            and must not be modified.
+
+        Raises:
+            ValueError: If the file is not in the dataset directory.
+        """
+        call = _call if _call is not None else _Call()
+        paths = tuple(self.applicable(path, call))
+
+        # Every prefix of the chain (the merge down to a parent directory) is memoized, so files of other sessions
+        # reuse the merge of the shared root and subject sidecars
+        merged = {}
+        for n in range(1, paths.__len__() + 1):
+            key = paths[:n]
+            stamps = tuple(call.stat(p) for p in key)
+            entry = self._merged.get(key)
+            if not call.is_valid(entry, stamps):
+                value = dict(merged)
+                value.update(self._json(key[-1], call))
+                entry = call.entry(stamps, value)
+                self._merged[key] = entry
+            merged = entry['value']
+        return dict(merged)
+
+    def resolve_many(self, paths):
+        """
+        Get the merged sidecar metadata of many files. Shared directories and sidecars are checked only once.
+
+        Args:
+            paths (iterable): Paths to the data files.
+
+        Returns:
+            dict: Merged metadata of each path.
+        """
+        call = _Call()
+        return {path: self.resolve(path, call) for path in paths}
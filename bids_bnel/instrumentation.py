@@ -0,0 +1,209 @@
+# Copyright 2020-present, Mayo Clinic Department of Neurology - Bioelectronics Neurophysiology and Engineering Laboratory
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+Opt-in I/O and timing instrumentation.
+
+When enabled, the package counts calls, opened files, bytes read and written, processed items (e.g. rows) and the time
+spent per file type (json, tsv, vhdr, eeg, ...) and operation (read, parse, serialize, write, insert, ...). The counters
+are global to the process and shared by all threads. Work done in process pool workers is not counted.
+
+Instrumented code calls start before and record after an operation. When instrumentation is disabled, start returns
+None and record returns immediately, so the overhead is a function call and a dict lookup per operation.
+
+Example:
+    >>> with profile() as p:
+    ...     dataset = BIDSDataset(path).load_subjects()
+    >>> p.stats['tsv']['parse']['time']
+"""
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+FIELDS = ('calls', 'files', 'bytes_read', 'bytes_written', 'items', 'time')
+
+_config = {'enabled': False, 'depth': 0, 'enabled_outside': False}
+_lock = threading.Lock()
+_counters = {}
+
+
+def enable_stats():
+    """
+    Enable the instrumentation. The counters are kept, see reset_stats.
+    """
+    _config['enabled'] = True
+
+
+def disable_stats():
+    """
+    Disable the instrumentation. The counters are kept.
+    """
+    _config['enabled'] = False
+
+
+def stats_enabled():
+    """
+    Check whether the instrumentation is enabled.
+
+    Returns:
+        bool: True if enabled.
+    """
+    return _config['enabled']
+
+
+def reset_stats():
+    """
+    Reset all counters to zero.
+    """
+    with _lock:
+        _counters.clear()
+
+
+def start():
+    """
+    Get the start time of an instrumented operation.
+
+    Returns:
+        float: Start time, None if the instrumentation is disabled.
+    """
+    if _config['enabled']:
+        return perf_counter()
+    return None
+
+
+def record(t0, file_type, operation, files=0, bytes_read=0, bytes_written=0, items=0):
+    """
+    Record an instrumented operation started with start.
+
+    Args:
+        t0 (float): Result of start. Nothing is recorded if None.
+        file_type (str): Type of the file, e.g. 'json' or 'tsv'.
+        operation (str): Name of the operation, e.g. 'read', 'parse', 'serialize' or 'write'.
+        files (int, optional): Number of opened files. Defaults to 0.
+        bytes_read (int, optional): Number of bytes read. Defaults to 0.
+        bytes_written (int, optional): Number of bytes written. Defaults to 0.
+        items (int, optional): Number of processed items, e.g. rows. Defaults to 0.
+    """
+    if t0 is None:
+        return
+    elapsed = perf_counter() - t0
+    with _lock:
+        counter = _counters.get((file_type, operation))
+        if counter is None:
+            counter = _counters[(file_type, operation)] = [0, 0, 0, 0, 0, 0.0]
+        counter[0] += 1
+        counter[1] += files
+        counter[2] += bytes_read
+        counter[3] += bytes_written
+        counter[4] += items
+        counter[5] += elapsed
+
+
+def file_type(path):
+    """
+    Get the file type used as key of the counters from a path, i.e. the extension without the dot.
+
+    Args:
+        path (str): Path to the file.
+
+    Returns:
+        str: Extension, e.g. 'tsv' for 'sub-01_events.tsv'.
+    """
+    name = str(path).rsplit('/', 1)[-1].rsplit('\\', 1)[-1]
+    return name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+
+
+def stats():
+    """
+    Get a snapshot of the counters.
+
+    Returns:
+        dict: Counters by file type and operation, e.g. stats()['tsv']['parse']['time']. Every counter is a dict with
+        the FIELDS 'calls', 'files' (opened files), 'bytes_read', 'bytes_written', 'items' and 'time' (seconds).
+    """
+    with _lock:
+        counters = {key: list(values) for key, values in _counters.items()}
+    snapshot = {}
+    for (ftype, operation), values in sorted(counters.items()):
+        snapshot.setdefault(ftype, {})[operation] = dict(zip(FIELDS, values))
+    return snapshot
+
+
+def _difference(after, before):
+    difference = {}
+    for ftype, operations in after.items():
+        for operation, counter in operations.items():
+            previous = before.get(ftype, {}).get(operation)
+            if previous is not None:
+                counter = {field: counter[field] - previous[field] for field in FIELDS}
+            if counter['calls']:
+                difference.setdefault(ftype, {})[operation] = counter
+    return difference
+
+
+class Profile:
+    """
+    Result of a profile context.
+
+    Attributes:
+        stats (dict): Counters of the operations done inside the context, in the format of stats(). Filled when the
+            context is left.
+        elapsed (float): Wall time of the context in seconds.
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self.elapsed = 0.0
+
+    def totals(self):
+        """
+        Sum the counters over all file types and operations.
+
+        Returns:
+            dict: Sum of every field.
+        """
+        totals = dict.fromkeys(FIELDS, 0)
+        for operations in self.stats.values():
+            for counter in operations.values():
+                for field in FIELDS:
+                    totals[field] += counter[field]
+        return totals
+
+    def __repr__(self):
+        totals = self.totals()
+        return 'Profile({:.3f} s, {} files, {} bytes read, {} bytes written)'.format(
+            self.elapsed, totals['files'], totals['bytes_read'], totals['bytes_written'])
+
+
+@contextmanager
+def profile():
+    """
+    Enable the instrumentation inside the context and collect the counters of the operations done inside it.
+
+    Operations of other threads running at the same time are counted as well. The instrumentation is disabled again
+    when the outermost context is left, unless it was enabled with enable_stats before.
+
+    Example:
+        >>> with profile() as p:
+        ...     tsv = BIDS_TSV(path)
+        >>> p.stats['tsv']['read']['bytes_read']
+    """
+    with _lock:
+        if _config['depth'] == 0:
+            _config['enabled_outside'] = _config['enabled']
+        _config['depth'] += 1
+        _config['enabled'] = True
+    result = Profile()
+    before = stats()
+    t0 = perf_counter()
+    try:
+        yield result
+    finally:
+        result.elapsed = perf_counter() - t0
+        result.stats = _difference(stats(), before)
+        with _lock:
+            _config['depth'] -= 1
+            if _config['depth'] == 0:
+                _config['enabled'] = _config['enabled_outside']
@@ -0,0 +1,274 @@
+# Copyright 2020-present, Mayo Clinic Department of Neurology - Bioelectronics Neurophysiology and Engineering Laboratory
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+Content-hash manifest of a dataset and incremental diff and sync between copies of a dataset.
+
+The manifest maps the path of every file of the dataset (relative to the root, hidden files and directories are
+skipped) to its size, modification time and content hash, and is stored in a compact JSON file in the hidden cache
+directory of the dataset root. When the manifest is updated, every file is checked with a single stat call and only
+files with a changed size or modification time are hashed again. Files are hashed in chunks of CHUNK_SIZE bytes by a
+thread pool, so large recordings are hashed by several threads at once. The hash of a file is the hash of the
+concatenated hashes of its chunks.
+
+Copies of a dataset are compared by their manifests, and sync copies only the files which differ.
+"""
+import os
+import json
+import time
+import hashlib
+
+from .index import CACHE_DIRNAME, RACY_INTERVAL_NS
+from .parallel import parallel_map
+from .fileio import atomic_write, atomic_copy
+from . import instrumentation
+
+MANIFEST_FILENAME = 'manifest.json'
+MANIFEST_VERSION = 1
+HASH_ALGORITHM = 'sha1'
+
+# Bytes hashed by one task of the pool
+CHUNK_SIZE = 64 * 2 ** 20
+
+# Bytes read at once while hashing a chunk
+READ_SIZE = 2 ** 20
+
+
+def _hash_chunk(args):
+    """
+    Hash a byte range of a file in a worker.
+
+    Args:
+        args (tuple): Path to the file, offset and length of the chunk.
+
+    Returns:
+        bytes: Digest of the chunk.
+    """
+    path, offset, length = args
+    t0 = instrumentation.start()
+    h = hashlib.new(HASH_ALGORITHM)
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        remaining = length
+        while remaining > 0:
+            data = f.read(min(READ_SIZE, remaining))
+            if not data:
+                break
+            h.update(data)
+            remaining -= data.__len__()
+    instrumentation.record(t0, instrumentation.file_type(path), 'hash', files=1, bytes_read=length - remaining)
+    return h.digest()
+
+
+def hash_files(paths, sizes, n_jobs=1):
+    """
+    Hash files in chunks with a thread pool.
+
+    Args:
+        paths (list): Paths to the files.
+        sizes (list): Sizes of the files in bytes.
+        n_jobs (int, optional): Number of threads, see parallel.resolve_n_jobs. Defaults to 1.
+
+    Returns:
+        list: Hex digests of the files.
+    """
+    tasks = []
+    counts = []
+    for path, size in zip(paths, sizes):
+        offsets = range(0, max(size, 1), CHUNK_SIZE)
+        tasks.extend((path, offset, min(CHUNK_SIZE, size - offset)) for offset in offsets)
+        counts.append(offsets.__len__())
+    digests = parallel_map(_hash_chunk, tasks, n_jobs=n_jobs, executor='thread')
+
+    hashes = []
+    position = 0
+    for count in counts:
+        hashes.append(hashlib.new(HASH_ALGORITHM, b''.join(digests[position:position + count])).hexdigest())
+        position += count
+    return hashes
+
+
+def _stat_tree(args):
+    """
+    Get the size and modification time of every file of a directory tree in a worker.
+
+    Args:
+        args (tuple): Path to the dataset root and path of the directory relative to the root ('' for the files of
+            the root only).
+
+    Returns:
+        dict: [size, modification time in ns] by path relative to the root.
+    """
+    root, rel = args
+    # The files of the root are listed by one task, its directories by one task each
+    recursive = rel != ''
+    files = {}
+    stack = [rel]
+    while stack.__len__():
+        rel = stack.pop()
+        with os.scandir(os.path.join(root, rel)) as it:
+            for entry in it:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir():
+                    if recursive:
+                        stack.append(os.path.join(rel, entry.name))
+                    continue
+                st = entry.stat()
+                files[os.path.join(rel, entry.name)] = [st.st_size, st.st_mtime_ns]
+    return files
+
+
+def _copy(args):
+    return atomic_copy(*args)
+
+
+class DatasetManifest:
+    """
+    Content-hash manifest of a dataset persisted in the dataset root.
+
+    Args:
+        root (str): Path to the dataset directory.
+        cache_path (str, optional): Path to the manifest file. Defaults to MANIFEST_FILENAME in the CACHE_DIRNAME
+            directory of the dataset root.
+
+    Attributes:
+        root (str): Path to the dataset directory.
+        cache_path (str): Path to the manifest file.
+        files (dict): [size, modification time in ns or None, hex digest] by path relative to the root, using '/' as
+            separator.
+        hashed (list): Relative paths of the files hashed during the last update.
+
+    Example:
+        >>> manifest = DatasetManifest('/data/bids')
+        >>> manifest.update(n_jobs=8)
+        >>> manifest.diff(DatasetManifest('/mirror/bids'))['changed']
+    """
+
+    def __init__(self, root, cache_path=None):
+        self.root = root
+        self.cache_path = cache_path if isinstance(cache_path, str) else os.path.join(root, CACHE_DIRNAME,
+                                                                                      MANIFEST_FILENAME)
+        self.files = {}
+        self.hashed = []
+        self._load()
+
+    def _load(self):
+        """
+        Load the manifest file. A missing, unreadable or outdated manifest is ignored.
+        """
+        try:
+            with open(self.cache_path, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        if manifest.get('version') == MANIFEST_VERSION and manifest.get('algorithm') == HASH_ALGORITHM:
+            self.files = manifest['files']
+
+    def save(self):
+        """
+        Save the manifest file. The file is replaced atomically.
+        """
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        atomic_write(self.cache_path, json.dumps({'version': MANIFEST_VERSION, 'algorithm': HASH_ALGORITHM,
+                                                  'files': self.files}, separators=(',', ':')))
+
+    def update(self, save=True, n_jobs=1):
+        """
+        Update the manifest. Only new files and files with a changed size or modification time are hashed.
+
+        Args:
+            save (bool, optional): Save the manifest file if anything changed. Defaults to True.
+            n_jobs (int, optional): Number of threads listing directories and hashing files. Defaults to 1.
+
+        Returns:
+            bool: True if the manifest changed.
+        """
+        t0 = instrumentation.start()
+        with os.scandir(self.root) as it:
+            tops = sorted(e.name for e in it if not e.name.startswith('.') and e.is_dir())
+        stats = {}
+        for files in parallel_map(_stat_tree, [(self.root, '')] + [(self.root, name) for name in tops],
+                                  n_jobs=n_jobs, executor='thread'):
+            stats.update(files)
+        instrumentation.record(t0, 'dir', 'stat', items=stats.__len__())
+
+        files = {}
+        stale = []
+        for rel, (size, mtime) in stats.items():
+            key = rel.replace(os.sep, '/')
+            cached = self.files.get(key)
+            if cached is not None and cached[0] == size and cached[1] == mtime:
+                files[key] = cached
+            else:
+                stale.append((key, rel, size, mtime))
+
+        now = time.time_ns()
+        hashes = hash_files([os.path.join(self.root, rel) for _, rel, _, _ in stale], [s[2] for s in stale], n_jobs)
+        for (key, _, size, mtime), digest in zip(stale, hashes):
+            # Files modified right before the scan are hashed again on the next update, see index.RACY_INTERVAL_NS
+            files[key] = [size, mtime if now - mtime >= RACY_INTERVAL_NS else None, digest]
+
+        self.hashed = sorted(key for key, _, _, _ in stale)
+        changed = files != self.files
+        self.files = files
+        if changed and save:
+            self.save()
+        return changed
+
+    def diff(self, other):
+        """
+        Compare the manifest with the manifest of another copy of the dataset. Both manifests should be updated.
+
+        Args:
+            other (DatasetManifest): Manifest of the other copy.
+
+        Returns:
+            dict: Sorted relative paths of the files which are only in this copy ('added'), only in the other copy
+            ('removed') and in both copies with different content ('changed').
+        """
+        return {
+            'added': sorted(key for key in self.files if key not in other.files),
+            'removed': sorted(key for key in other.files if key not in self.files),
+            'changed': sorted(key for key, entry in self.files.items()
+                              if key in other.files and other.files[key][2] != entry[2]),
+        }
+
+    def sync(self, target, delete=False, n_jobs=1):
+        """
+        Make another copy of the dataset equal to this one by copying only the added and changed files.
+
+        Both manifests are updated first, so unchanged copies are compared with one stat call per file. Files are
+        copied with their modification time to a temporary file and renamed, and the manifest of the target is
+        updated with the hashes of the copied files without reading them again.
+
+        Args:
+            target (DatasetManifest): Manifest of the target copy.
+            delete (bool, optional): Delete files of the target which are not in this copy. Defaults to False.
+            n_jobs (int, optional): Number of threads. Defaults to 1.
+
+        Returns:
+            dict: Relative paths of the files 'copied' to and 'deleted' from the target.
+        """
+        self.update(n_jobs=n_jobs)
+        target.update(n_jobs=n_jobs)
+        changes = self.diff(target)
+
+        copied = changes['added'] + changes['changed']
+        parallel_map(_copy, [(os.path.join(self.root, key), os.path.join(target.root, key)) for key in copied],
+                     n_jobs=n_jobs, executor='thread')
+        for key in copied:
+            st = os.stat(os.path.join(target.root, key))
+            entry = self.files[key]
+            target.files[key] = [st.st_size, st.st_mtime_ns if entry[1] is not None else None, entry[2]]
+
+        deleted = changes['removed'] if delete else []
+        for key in deleted:
+            os.remove(os.path.join(target.root, key))
+            del target.files[key]
+
+        if copied.__len__() or deleted.__len__():
+            target.save()
+        return {'copied': copied, 'deleted': deleted}
@@ -0,0 +1,79 @@
+# Copyright 2020-present, Mayo Clinic Department of Neurology - Bioelectronics Neurophysiology and Engineering Laboratory
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+Helpers for running dataset operations in a thread or process pool.
+"""
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+
+
+def resolve_n_jobs(n_jobs):
+    """
+    Get the number of workers.
+
+    Args:
+        n_jobs (int): Number of workers. None means 1, negative values count from the number of CPUs (-1 uses all
+            CPUs, -2 all but one).
+
+    Returns:
+        int: Number of workers, at least 1.
+    """
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return max(1, n_jobs)
+
+
+def is_process_executor(executor):
+    """
+    Check whether the executor runs tasks in other processes, i.e. whether arguments and results are pickled.
+
+    Args:
+        executor (str or Executor): 'thread', 'process' or an Executor instance.
+
+    Returns:
+        bool: True for process pools.
+    """
+    if isinstance(executor, str):
+        return executor == 'process'
+    return isinstance(executor, ProcessPoolExecutor)
+
+
+def parallel_map(func, items, n_jobs=1, executor='thread'):
+    """
+    Apply a function to all items, optionally in a thread or process pool.
+
+    Results are returned in the order of the items, independently of the order in which the tasks finish.
+
+    Args:
+        func (callable): Function applied to each item. Must be picklable for process pools.
+        items (iterable): Items to process.
+        n_jobs (int, optional): Number of workers, see resolve_n_jobs. Defaults to 1, which runs the tasks in the
+            calling thread unless an Executor instance is given.
+        executor (str or Executor, optional): 'thread' for I/O bound tasks, 'process' for CPU bound tasks or an
+            Executor instance which is used as is and not shut down. Defaults to 'thread'.
+
+    Returns:
+        list: Results in the order of the items.
+    """
+    items = list(items)
+    if isinstance(executor, Executor):
+        return list(executor.map(func, items))
+
+    n_jobs = min(resolve_n_jobs(n_jobs), items.__len__())
+    if n_jobs <= 1:
+        return [func(item) for item in items]
+
+    if executor == 'thread':
+        pool = ThreadPoolExecutor(max_workers=n_jobs)
+    elif executor == 'process':
+        pool = ProcessPoolExecutor(max_workers=n_jobs)
+    else:
+        raise ValueError("executor must be 'thread', 'process' or an Executor instance, got {}".format(executor))
+
+    with pool:
+        return list(pool.map(func, items, chunksize=max(1, items.__len__() // (4 * n_jobs))))
@@ -0,0 +1,255 @@
+# Copyright 2020-present, Mayo Clinic Department of Neurology - Bioelectronics Neurophysiology and Engineering Laboratory
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+JSON sidecar files.
+
+This module depends only on the standard library, so pure JSON work (reading, editing and writing sidecars) does not
+import pandas or numpy. BIDS_json and LazyDict are also available from bids_bnel.dataset.
+"""
+import os
+import json
+import hashlib
+from collections.abc import MutableMapping
+
+from .fileio import atomic_write
+from .aio import run_blocking, gather_limited, DEFAULT_LIMIT
+from . import instrumentation
+
+
+def _hash_text(text):
+    """
+    Hash a serialized file content.
+
+    Args:
+        text (str or bytes): File content.
+
+    Returns:
+        str: Hex digest of the content.
+    """
+    if isinstance(text, str):
+        text = text.encode('utf-8')
+    return hashlib.sha1(text).hexdigest()
+
+
+class BIDS_json(dict):
+    """
+    Class for creating BIDS compatible json files
+
+    This class extends the built-in `dict` class to provide functionality
+    for creating and saving BIDS compatible json files.
+
+    The hash of the content is stored when the file is loaded or saved, and dump writes the file only if the content
+    changed since then.
+
+    Attributes:
+        _path (str): Path to the json file.
+        _data (dict): Dictionary to store the json data.
+        _saved_hash (str): Hash of the content at the last load or save, None if the file was not loaded or saved.
+
+    Args:
+        path (str): Path to the json file.
+    """
+
+    def __init__(self, path):
+        """
+        Initialize Bids_json object with a path to a json file.
+
+        Args:
+            path (str): Path to the json file.
+        """
+        super().__init__()
+        self._path = path
+        self._saved_hash = None
+
+        # Load existing json file if it exists
+        if os.path.exists(self._path):
+            t0 = instrumentation.start()
+            with open(self._path, 'r') as f:
+                text = f.read()
+            instrumentation.record(t0, 'json', 'read', files=1, bytes_read=text.__len__())
+            t0 = instrumentation.start()
+            self._data = json.loads(text)
+            for key, value in self._data.items():
+                self[key] = value
+            instrumentation.record(t0, 'json', 'parse', items=self._data.__len__())
+            self._saved_hash = _hash_text(self._serialize())
+
+    @classmethod
+    async def aload(cls, path, executor=None):
+        """
+        Load a json file without blocking the event loop. Reading and parsing run in an executor.
+
+        Args:
+            path (str): Path to the json file.
+            executor (Executor, optional): Executor running the load. Defaults to the default executor of the loop.
+
+        Returns:
+            BIDS_json: The loaded file.
+
+        Example:
+            >>> sidecar = await BIDS_json.aload(path)
+        """
+        return await run_blocking(cls, path, executor=executor)
+
+    @classmethod
+    async def aload_many(cls, paths, limit=DEFAULT_LIMIT, executor=None):
+        """
+        Load many json files concurrently without blocking the event loop.
+
+        Args:
+            paths (iterable): Paths to the json files.
+            limit (int, optional): Maximum number of concurrent loads. Defaults to aio.DEFAULT_LIMIT.
+            executor (Executor, optional): Executor running the loads. Defaults to the default executor of the loop.
+
+        Returns:
+            list: Loaded files in the order of the paths.
+        """
+        return await gather_limited(cls, paths, limit=limit, executor=executor)
+
+    def _serialize(self):
+        """
+        Serialize the content to the text stored in the json file.
+
+        Returns:
+            str: JSON text with an indentation of 4 spaces.
+        """
+        return json.dumps(self, indent=4)
+
+    def is_dirty(self):
+        """
+        Check whether the content differs from the json file.
+
+        Returns:
+            bool: True if the content changed since the last load or save, or if the file does not exist.
+        """
+        return not os.path.exists(self._path) or _hash_text(self._serialize()) != self._saved_hash
+
+    def dump(self, force=False):
+        """
+        Save the Bids_json object to the json file.
+
+        This method saves the current Bids_json object to the json file
+        specified during object initialization, with an indentation of 4 spaces.
+        The file is written only if the content changed since the last load or save.
+
+        Args:
+            force (bool, optional): Write the file even if the content did not change. Defaults to False.
+
+        Returns:
+            list: Paths of the written files, empty if nothing was written.
+        """
+        t0 = instrumentation.start()
+        text = self._serialize()
+        instrumentation.record(t0, 'json', 'serialize', items=self.__len__())
+        text_hash = _hash_text(text)
+        if not force and text_hash == self._saved_hash and os.path.exists(self._path):
+            return []
+
+        atomic_write(self._path, text, on_commit=lambda: setattr(self, '_saved_hash', text_hash))
+        return [self._path]
+
+    def save(self, force=False):
+        """
+        Save the Bids_json object to the json file. Alias of dump.
+        """
+        return self.dump(force=force)
+
+
+class LazyDict(MutableMapping):
+    """
+    Dictionary with values loaded on first access.
+
+    Keys are registered together with a path. The value is created by calling the loader with the path on first
+    access and cached afterwards. Values can also be set directly, in which case no loading takes place.
+
+    Args:
+        loader (callable): Function creating the value from a path, e.g. BIDS_json.
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._paths = {}
+        self._cache = {}
+
+    def register(self, key, path):
+        """
+        Register a key with a path to be loaded on first access. Drops a cached value of the key.
+
+        Args:
+            key (str): Key of the value.
+            path (str): Path passed to the loader.
+        """
+        self._paths[key] = path
+        self._cache.pop(key, None)
+
+    def path(self, key):
+        """
+        Get the path registered for a key.
+
+        Args:
+            key (str): Key of the value.
+
+        Returns:
+            str: Registered path or None if the value was set directly.
+        """
+        return self._paths[key]
+
+    def is_loaded(self, key):
+        """
+        Check whether the value of a key is already loaded.
+
+        Args:
+            key (str): Key of the value.
+
+        Returns:
+            bool: True if the value is loaded.
+        """
+        return key in self._cache
+
+    def loaded(self):
+        """
+        Get the values loaded so far without loading the remaining ones.
+
+        Returns:
+            dict: Loaded values.
+        """
+        return dict(self._cache)
+
+    def preload(self):
+        """
+        Load all registered values.
+        """
+        for key in self._paths.keys():
+            self[key]
+
+    def __getitem__(self, key):
+        if key in self._cache:
+            return self._cache[key]
+        path = self._paths[key]
+        value = self._loader(path)
+        self._cache[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in self._paths:
+            self._paths[key] = None
+        self._cache[key] = value
+
+    def __delitem__(self, key):
+        del self._paths[key]
+        self._cache.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._paths
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self):
+        return self._paths.__len__()
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__, list(self._paths.keys()))
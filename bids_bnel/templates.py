@@ -1,5 +1,3 @@
-import pandas as pd
-
 template_participants = {
     "participant_id": "anonymised participant IDs of dataset",
     "species": "species of the participant",
@@ -151,3 +149,51 @@ templates = {
     "channels": template_channels,
     "events": template_events
 }
+
+# Column dtypes of the TSV files, used by BIDS_TSV(..., dtypes=True) and BIDSDataset(..., dtypes=True). Enumerated
+# columns with few distinct values are stored as categorical, times, coordinates and frequencies as float and sample
+# indices as nullable integers. Columns without a dtype are stored with object dtype.
+dtypes_participants = {
+    "species": "category",
+    "sex": "category",
+}
+
+dtypes_electrodes = {
+    "x": "float64",
+    "y": "float64",
+    "z": "float64",
+    "material": "category",
+    "manufacturer": "category",
+    "group": "category",
+    "hemisphere": "category",
+}
+
+dtypes_channels = {
+    "type": "category",
+    "units": "category",
+    "low_cutoff": "float64",
+    "high_cutoff": "float64",
+    "reference": "category",
+}
+
+dtypes_events = {
+    "onset": "float64",
+    "duration": "float64",
+    "offset": "float64",
+    "trial_type": "category",
+    "sub_type": "category",
+    "sample_start": "Int64",
+    "sample_end": "Int64",
+    "electrical_stimulation_type": "category",
+    "electrical_stimulation_site": "category",
+    "electrical_stimulation_current": "float64",
+    "electrical_stimulation_frequency": "float64",
+    "electrical_stimulation_pulsewidth": "float64",
+}
+
+column_dtypes = {
+    "participants": dtypes_participants,
+    "electrodes": dtypes_electrodes,
+    "channels": dtypes_channels,
+    "events": dtypes_events
+}
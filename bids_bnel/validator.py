@@ -0,0 +1,288 @@
+# Copyright 2020-present, Mayo Clinic Department of Neurology - Bioelectronics Neurophysiology and Engineering Laboratory
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+Whole-dataset validation against the templates.
+
+The templates are compiled once into schemas holding the expected columns of every TSV suffix, the allowed levels of
+categorical columns (e.g. sex of participants.tsv) and the expected keys of every JSON suffix. Files are checked in
+batches by workers of a thread or process pool, every column is checked with a single vectorized operation, and the
+issues of all files are collected in a ValidationReport.
+"""
+import os
+import json
+
+import pandas as pd
+
+from .templates import templates as default_templates
+from .index import BIDSIndex
+from .parallel import parallel_map, resolve_n_jobs
+
+ERROR = 'error'
+WARNING = 'warning'
+
+# Files of one task of the pool. Large enough to amortize the pickling of the schemas, small enough to balance the
+# load of the workers.
+BATCH_SIZE = 64
+
+# Keys required in dataset_description.json
+REQUIRED_DESCRIPTION_KEYS = ('Name', 'BIDSVersion')
+
+# Suffixes of JSON files which are not sidecars of TSV files and are checked for the keys of their template
+JSON_SUFFIXES = ('ieeg', 'coordsystem')
+
+
+def _levels(description):
+    if isinstance(description, dict) and isinstance(description.get('Levels'), dict):
+        return tuple(str(level) for level in description['Levels'].keys())
+    return None
+
+
+def compile_templates(templates=None):
+    """
+    Compile templates into the schemas used by the validator.
+
+    Args:
+        templates (dict, optional): Templates by suffix. Defaults to templates.templates.
+
+    Returns:
+        dict: Schema of each suffix, a dict with 'columns' (expected columns or keys) and 'levels' (allowed levels of
+        categorical columns).
+    """
+    if templates is None:
+        templates = default_templates
+    schemas = {}
+    for suffix, template in templates.items():
+        levels = {key: _levels(description) for key, description in template.items()}
+        schemas[suffix] = {
+            'columns': tuple(template.keys()),
+            'levels': {key: value for key, value in levels.items() if value is not None},
+        }
+    return schemas
+
+
+def _issue(path, severity, code, message, column=None, rows=None):
+    return {'path': path, 'severity': severity, 'code': code, 'message': message, 'column': column, 'rows': rows}
+
+
+def _validate_tsv(path, schema, sidecar):
+    """
+    Check the columns and levels of a TSV file.
+    """
+    issues = []
+    try:
+        df = pd.read_csv(path, sep='\t', dtype=str, na_values=['n/a', ''], keep_default_na=False)
+    except (OSError, ValueError) as e:
+        return [_issue(path, ERROR, 'unreadable', 'Cannot read TSV file: {}'.format(e))]
+
+    columns = set(df.columns)
+    for key in schema['columns']:
+        if key not in columns:
+            issues.append(_issue(path, WARNING, 'missing_column', "Column '{}' of the template is missing".format(key),
+                                 column=key))
+
+    described = set(schema['columns']) | set(sidecar.keys())
+    for key in df.columns:
+        if key not in described:
+            issues.append(_issue(path, WARNING, 'undescribed_column',
+                                 "Column '{}' is not described by the template or sidecar".format(key), column=key))
+
+    levels = dict(schema['levels'])
+    levels.update({key: value for key, value in ((k, _levels(v)) for k, v in sidecar.items()) if value is not None})
+    for key, allowed in levels.items():
+        if key not in columns:
+            continue
+        values = df[key]
+        invalid = values.notna().to_numpy() & ~values.isin(allowed).to_numpy()
+        if invalid.any():
+            rows = invalid.nonzero()[0]
+            found = sorted(set(values.to_numpy()[rows]))
+            issues.append(_issue(path, ERROR, 'invalid_level',
+                                 "Column '{}' has values {} not in the levels {}".format(key, found[:10], list(allowed)),
+                                 column=key, rows=rows.tolist()))
+    return issues
+
+
+def _validate_json(path, schema):
+    """
+    Check that a JSON file is readable and, for suffixes with a schema, contains its keys.
+    """
+    try:
+        with open(path, 'r') as f:
+            content = json.load(f)
+    except (OSError, ValueError) as e:
+        return [_issue(path, ERROR, 'unreadable', 'Cannot read JSON file: {}'.format(e))]
+    if not isinstance(content, dict):
+        return [_issue(path, ERROR, 'not_an_object', 'JSON file does not contain an object')]
+
+    issues = []
+    if os.path.basename(path) == 'dataset_description.json':
+        for key in REQUIRED_DESCRIPTION_KEYS:
+            if key not in content:
+                issues.append(_issue(path, ERROR, 'missing_key', "Required key '{}' is missing".format(key),
+                                     column=key))
+    elif schema is not None:
+        for key in schema['columns']:
+            if key not in content:
+                issues.append(_issue(path, WARNING, 'missing_key', "Key '{}' of the template is missing".format(key),
+                                     column=key))
+    return issues
+
+
+def _validate_batch(args):
+    """
+    Validate a batch of files in a worker.
+
+    Args:
+        args (tuple): List of (path, suffix, extension, sidecar) tuples and the schemas.
+
+    Returns:
+        list: Issues of the files.
+    """
+    files, schemas = args
+    issues = []
+    for path, suffix, extension, sidecar in files:
+        if extension == '.tsv':
+            issues += _validate_tsv(path, schemas[suffix], sidecar)
+        else:
+            issues += _validate_json(path, schemas.get(suffix) if suffix in JSON_SUFFIXES else None)
+    return issues
+
+
+class ValidationReport:
+    """
+    Issues found by validate_dataset.
+
+    Every issue is a dict with 'path', 'severity' ('error' or 'warning'), 'code' (e.g. 'missing_column',
+    'invalid_level'), 'message', 'column' (None if not related to a column) and 'rows' (positions of the offending
+    rows or None).
+
+    Attributes:
+        issues (list): All issues.
+        n_files (int): Number of validated files.
+    """
+
+    def __init__(self, issues, n_files):
+        self.issues = issues
+        self.n_files = n_files
+
+    @property
+    def errors(self):
+        return [issue for issue in self.issues if issue['severity'] == ERROR]
+
+    @property
+    def warnings(self):
+        return [issue for issue in self.issues if issue['severity'] == WARNING]
+
+    @property
+    def is_valid(self):
+        """
+        True if no errors were found. Warnings do not make a dataset invalid.
+        """
+        return self.errors.__len__() == 0
+
+    def to_dict(self):
+        """
+        Get the report as JSON serializable dict.
+
+        Returns:
+            dict: 'n_files', 'n_errors', 'n_warnings' and 'issues'.
+        """
+        return {'n_files': self.n_files, 'n_errors': self.errors.__len__(), 'n_warnings': self.warnings.__len__(),
+                'issues': self.issues}
+
+    def to_frame(self):
+        """
+        Get the issues as a DataFrame with one row per issue.
+
+        Returns:
+            pandas.DataFrame: Issues with the columns path, severity, code, message, column and rows.
+        """
+        return pd.DataFrame(self.issues, columns=['path', 'severity', 'code', 'message', 'column', 'rows'])
+
+    def __repr__(self):
+        return 'ValidationReport({} files, {} errors, {} warnings)'.format(
+            self.n_files, self.errors.__len__(), self.warnings.__len__())
+
+
+def validate_dataset(path, index=None, resolver=None, templates=None, n_jobs=1, executor='process'):
+    """
+    Validate all TSV and JSON files of a dataset against the templates.
+
+    TSV files with a template are checked for missing and undescribed columns and for values outside the levels of
+    categorical columns. The levels are taken from the template and from the sidecars of the file. JSON files are
+    checked for syntax, dataset_description.json for its required keys and ieeg and coordsystem files for the keys of
+    their template. Subject directories not listed in participants.tsv are reported as well.
+
+    Args:
+        path (str): Path to the BIDS dataset directory.
+        index (BIDSIndex, optional): File index of the dataset. Defaults to an index scanned without writing the cache.
+        resolver (SidecarResolver, optional): Resolver of the sidecars of the TSV files. Defaults to the sidecar next
+            to each file only.
+        templates (dict, optional): Templates by suffix. Defaults to templates.templates.
+        n_jobs (int, optional): Number of workers, see parallel.resolve_n_jobs. Defaults to 1.
+        executor (str or Executor, optional): 'thread', 'process' or an Executor instance. Defaults to 'process',
+            parsing and checking TSV files is CPU bound.
+
+    Returns:
+        ValidationReport: Issues found in the dataset.
+
+    Example:
+        >>> report = validate_dataset('/data/bids', n_jobs=-1)
+        >>> report.to_frame().groupby('code').size()
+    """
+    schemas = compile_templates(templates)
+    if index is None:
+        index = BIDSIndex(path)
+        index.update(save=False, n_jobs=n_jobs)
+
+    records = sorted((r for r in index.records if r['extension'] in ('.tsv', '.json')), key=lambda r: r['path'])
+    tsv_paths = [r['path'] for r in records if r['extension'] == '.tsv' and r['suffix'] in schemas]
+    if resolver is not None:
+        sidecars = resolver.resolve_many(tsv_paths)
+    else:
+        sidecars = {p: _read_sidecar(p) for p in tsv_paths}
+
+    files = []
+    for r in records:
+        if r['extension'] == '.tsv':
+            if r['suffix'] in schemas:
+                files.append((r['path'], r['suffix'], '.tsv', sidecars[r['path']]))
+        else:
+            files.append((r['path'], r['suffix'], '.json', None))
+
+    size = max(1, min(BATCH_SIZE, -(-files.__len__() // (4 * resolve_n_jobs(n_jobs)))))
+    batches = [(files[i:i + size], schemas) for i in range(0, files.__len__(), size)]
+    issues = [issue for batch in parallel_map(_validate_batch, batches, n_jobs=n_jobs, executor=executor)
+              for issue in batch]
+    issues += _validate_participants(path, index)
+    return ValidationReport(issues, files.__len__())
+
+
+def _read_sidecar(path_tsv):
+    path_json = path_tsv[:-4] + '.json'
+    try:
+        with open(path_json, 'r') as f:
+            content = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return content if isinstance(content, dict) else {}
+
+
+def _validate_participants(path, index):
+    """
+    Check that every subject directory is listed in participants.tsv.
+    """
+    path_participants = os.path.join(path, 'participants.tsv')
+    try:
+        participants = pd.read_csv(path_participants, sep='\t', dtype=str, keep_default_na=False)
+    except (OSError, ValueError):
+        return [_issue(path_participants, ERROR, 'missing_file', 'participants.tsv is missing or unreadable')]
+    if 'participant_id' not in participants.columns:
+        return []
+    listed = set(participants['participant_id'])
+    return [_issue(path_participants, WARNING, 'missing_participant',
+                   "Subject 'sub-{}' is not listed in participants.tsv".format(label), column='participant_id')
+            for label in index.subjects() if 'sub-' + label not in listed]
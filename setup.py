@@ -6,16 +6,12 @@
 
 
 import setuptools
-from glob import glob
 
-from setuptools import Command, Extension
-import shlex
-import subprocess
 import os
 import re
 
 ## get version from file
-VERSIONFILE="./best/__init__.py"
+VERSIONFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bids_bnel", "__init__.py")
 verstrline = open(VERSIONFILE, "rt").read()
 VSRE = r"^__version__ = ['\"]([^'\"]*)['\"]"
 mo = re.search(VSRE, verstrline, re.M)
@@ -23,34 +19,23 @@ if mo:
     verstr = mo.group(1)
 else:
     raise RuntimeError("Unable to find version string in %s." % (VERSIONFILE,))
-    raise RuntimeError("Unable to find version string in %s." % (VERSIONFILE,))
 
 
 
 setuptools.setup(
-    name="best_toolbox",
+    name="bids_bnel",
     version=verstr,
     license='',
-    url="https://github.com/mselair/best_toolbox",
 
     author="Filip Mivalt",
     author_email="mivalt.filip@mayo.edu",
 
 
-    description="Python package designed for iEEG analysis and sleep classification.",
-    long_description="Python package for EEG sleep classification and analysis. Developed by the laboratory of Bioelectronics Neurophysiology and Engineering - Mayo Clinic",
+    description="Python package for reading, writing, indexing and validating iEEG datasets in BIDS format.",
+    long_description="Python package for iEEG datasets in the Brain Imaging Data Structure (BIDS). Developed by the laboratory of Bioelectronics Neurophysiology and Engineering - Mayo Clinic",
     long_description_content_type="",
 
-    packages=setuptools.find_packages(),
-    include_package_data=True,
-    package_data={
-        'best_toolbox': ["best/dbs/artifact_removal/_configs/*.yaml", "best/dbs/artifact_removal/_models/*.pt", "dbs/artifact_bank/*.mat"]
-    },
-    data_files=[
-        ('dbs_artifact_removal_cfg', glob('best/dbs/artifact_removal/_configs/*.yaml')),
-        ('dbs_artifact_removal_mdl', glob('best/dbs/artifact_removal/_models/*.pt')),
-        ('dbs_artifact_bank_artifact', glob('best/dbs/artifact_bank/*.mat')),
-    ],
+    packages=setuptools.find_packages(include=['bids_bnel', 'bids_bnel.*']),
 
 
     classifiers=[
@@ -58,38 +43,20 @@ setuptools.setup(
         'Intended Audience :: Healthcare Industry',
         'Intended Audience :: Science/Research',
         "License :: OSI Approved :: Apache Software License",
-        "Programming Language :: Python :: 3.6",
+        "Programming Language :: Python :: 3.8",
         "Operating System :: POSIX :: Linux",
         'Topic :: Scientific/Engineering :: Medical Science Apps.'
     ],
-    python_requires='>=3.6',
-    install_requires =[
+    entry_points={
+        'console_scripts': ['bids-bnel=bids_bnel.cli:main'],
+    },
+    python_requires='>=3.8',
+    install_requires=[
         'numpy',
-        'pandas',
-        'scipy',
-        'tqdm',
-        'matplotlib',
-        'seaborn',
-        'scikit-learn',
-        'umap-learn',
-        'pymef',
-        'mef_tools',
-        'pyedflib',
-        'h5py',
-        'sqlalchemy',
-        'PyMySQL',
-        'pytz',
-        'python-dateutil',
-        'pyzmq',
-        'sshtunnel',
-        'torch',
-        'pyyaml',
-        'mne'
-    ]
+        'pandas>=1.5,<3',
+    ],
+    extras_require={
+        # bids-bnel export --format parquet
+        'parquet': ['pyarrow'],
+    },
 )
-
-
-
-
-
-
@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from bids_bnel.cache import enable_tsv_cache, disable_tsv_cache, cache_path
+from bids_bnel.dataset import BIDS_TSV
+
+
+class TestTSVCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.temp_dir, 'cache')
+        self.path = os.path.join(self.temp_dir, 'sub-01_task-rest_events.tsv')
+        self.write_events(10)
+
+    def tearDown(self):
+        disable_tsv_cache()
+        shutil.rmtree(self.temp_dir)
+
+    def write_events(self, n_rows):
+        tsv = BIDS_TSV(self.path)
+        tsv.drop(tsv.index, inplace=True)
+        tsv.add_rows({'onset': 0.5 * idx, 'duration': 0.1, 'trial_type': 'sleep'} for idx in range(n_rows))
+        tsv.dump()
+        # Move the modification time to the past, recently modified files are not cached
+        t = os.stat(self.path).st_mtime - 60 + n_rows
+        os.utime(self.path, (t, t))
+        return tsv
+
+    def test_shared_cache(self):
+        enable_tsv_cache(self.cache_dir)
+        tsv = BIDS_TSV(self.path)
+        self.assertTrue(os.path.exists(cache_path(self.path)))
+        self.assertTrue(cache_path(self.path).startswith(self.cache_dir))
+
+        with mock.patch('bids_bnel.dataset.pd.read_csv', side_effect=AssertionError('TSV parsed')):
+            tsv2 = BIDS_TSV(self.path)
+        assert_frame_equal(pd.DataFrame(tsv), pd.DataFrame(tsv2))
+        self.assertFalse(tsv2.is_dirty())
+
+        # Changed TSV files are parsed again
+        self.write_events(20)
+        tsv3 = BIDS_TSV(self.path)
+        self.assertEqual(len(tsv3), 20)
+
+    def test_cache_next_to_tsv(self):
+        enable_tsv_cache()
+        BIDS_TSV(self.path)
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, '.sub-01_task-rest_events.tsv.cache.pkl')))
+
+        disable_tsv_cache()
+        with mock.patch('bids_bnel.dataset.pd.read_csv', side_effect=AssertionError('TSV parsed')):
+            with self.assertRaises(AssertionError):
+                BIDS_TSV(self.path)
+
+    def test_cached_frame_aligned(self):
+        # The cached frame has the values, types and dtypes of a parsed one, for object and typed columns
+        with open(self.path, 'w') as f:
+            f.write('onset\tduration\ttrial_type\tsample_start\tnotes\n')
+            f.write(''.join('{}\t0.1\t{}\t{}\t{}\n'.format(0.5 * idx, 'sleep' if idx % 3 else 'seizure', 100 * idx,
+                                                             'n/a' if idx % 2 else 'note {}'.format(idx))
+                            for idx in range(50)))
+        t = os.stat(self.path).st_mtime - 60
+        os.utime(self.path, (t, t))
+
+        enable_tsv_cache(self.cache_dir)
+        for dtypes in (None, True):
+            parsed = BIDS_TSV(self.path, dtypes=dtypes)
+            with mock.patch('bids_bnel.dataset.pd.read_csv', side_effect=AssertionError('TSV parsed')):
+                cached = BIDS_TSV(self.path, dtypes=dtypes)
+            assert_frame_equal(pd.DataFrame(parsed), pd.DataFrame(cached))
+            self.assertListEqual([type(v) for v in cached.iloc[1]], [type(v) for v in parsed.iloc[1]])
+            self.assertFalse(cached.is_dirty())
+
+        # Entries are not used when the columns of the sidecar changed
+        cached.metadata['custom'] = {}
+        cached.metadata.dump()
+        self.assertIn('custom', BIDS_TSV(self.path).columns)
+
+
+if __name__ == '__main__':
+    unittest.main()
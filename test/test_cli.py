@@ -0,0 +1,117 @@
+import io
+import os
+import json
+import shutil
+import sys
+import tempfile
+import unittest
+import subprocess
+from contextlib import redirect_stdout, redirect_stderr
+
+import pandas as pd
+
+from bids_bnel.cli import main
+from bids_bnel.dataset import BIDSDataset, BID_subject, BIDS_TSV, BIDS_iEEG_writer
+from bids_bnel.index import CACHE_DIRNAME
+
+
+class TestCLI(unittest.TestCase):
+    def setUp(self):
+        # Create a dataset with two subjects, each with one recording and events
+        self.temp_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.temp_dir, 'ds')
+        BIDSDataset(self.root, create_dataset=True)
+        for sub in ['01', '02']:
+            session = BID_subject(os.path.join(self.root, 'sub-' + sub)).create_session('01')
+            os.mkdir(os.path.join(session.path, 'ieeg'))
+            prefix = os.path.join(session.path, 'ieeg', 'sub-{}_ses-01_task-rest_'.format(sub))
+            with BIDS_iEEG_writer(prefix + 'ieeg.eeg', 100, ['e1', 'e2'], channel_types='SEEG') as writer:
+                writer.write(pd.DataFrame([[0.0] * 250] * 2).to_numpy())
+            events = BIDS_TSV(prefix + 'events.tsv')
+            events.add_rows({'onset': idx, 'duration': 1, 'trial_type': 'sleep' if idx % 2 else 'artefact'}
+                            for idx in range(4))
+            events.dump()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def run_cli(self, *argv):
+        stdout = io.StringIO()
+        with redirect_stdout(stdout), redirect_stderr(io.StringIO()):
+            status = main(list(argv))
+        return status, stdout.getvalue()
+
+    def test_scan(self):
+        status, output = self.run_cli('scan', self.root, '--json', '--jobs', '2')
+        self.assertEqual(status, 0)
+        result = json.loads(output)
+        self.assertEqual(result['n_subjects'], 2)
+        self.assertEqual(result['n_sessions'], 2)
+        self.assertEqual(result['suffixes']['events.tsv'], 2)
+        self.assertTrue(os.path.exists(os.path.join(self.root, CACHE_DIRNAME)))
+
+        # The cached index is reused, unchanged directories are not listed again
+        for dirpath, _, _ in os.walk(self.root):
+            t = os.stat(dirpath).st_mtime - 60
+            os.utime(dirpath, (t, t))
+        self.run_cli('scan', self.root)
+        status, output = self.run_cli('scan', self.root, '--json')
+        self.assertEqual(json.loads(output)['n_scanned_dirs'], 0)
+
+    def test_stats(self):
+        status, output = self.run_cli('stats', self.root, '--json', '--no-cache')
+        result = json.loads(output)
+        self.assertEqual(result['n_recordings'], 2)
+        self.assertAlmostEqual(result['duration'], 5.0)
+        self.assertEqual(result['sampling_frequencies'], {'100': 2})
+        self.assertEqual(result['subjects']['01']['n_recordings'], 1)
+        self.assertFalse(os.path.exists(os.path.join(self.root, CACHE_DIRNAME)))
+
+    def test_closed_stdout(self):
+        # Output to a pipe closed by the reader, e.g. bids-bnel stats --json | head -c 0, ends without a traceback
+        proc = subprocess.Popen([sys.executable, '-m', 'bids_bnel', 'stats', self.root, '--json'],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        proc.stdout.close()
+        _, stderr = proc.communicate(timeout=60)
+        self.assertEqual(proc.returncode, 141)
+        self.assertEqual(stderr, b'')
+
+    def test_validate(self):
+        status, output = self.run_cli('validate', self.root, '--json', '--executor', 'thread')
+        self.assertEqual(status, 0)
+        self.assertTrue(json.loads(output)['valid'])
+
+        pd.DataFrame({'participant_id': ['sub-01'], 'sex': ['X']}).to_csv(
+            os.path.join(self.root, 'participants.tsv'), sep='\t', index=False)
+        status, output = self.run_cli('validate', self.root, '--executor', 'thread')
+        self.assertEqual(status, 1)
+        self.assertIn("error: {}: Column 'sex'".format(os.path.join(self.root, 'participants.tsv')), output)
+
+    def test_export(self):
+        path = os.path.join(self.temp_dir, 'events.csv')
+        status, output = self.run_cli('export', self.root, 'events', '--columns', 'onset', '--trial-type', 'sleep',
+                                      '--output', path, '--json')
+        self.assertEqual(json.loads(output)['n_rows'], 4)
+        table = pd.read_csv(path, dtype={'sub': str})
+        self.assertListEqual(list(table.columns), ['sub', 'ses', 'task', 'run', 'onset'])
+        self.assertListEqual(table['onset'].tolist(), [1, 3, 1, 3])
+
+        status, output = self.run_cli('export', self.root, 'events', '--subjects', '02')
+        self.assertEqual(output.splitlines()[0], '\t'.join(['sub', 'ses', 'task', 'run', 'onset', 'duration',
+                                                             'trial_type', 'sub_type', 'electrodes_involved_onset',
+                                                             'electrodes_involved_offset', 'offset', 'sample_start',
+                                                             'sample_end', 'electrical_stimulation_type',
+                                                             'electrical_stimulation_site',
+                                                             'electrical_stimulation_current',
+                                                             'electrical_stimulation_frequency',
+                                                             'electrical_stimulation_pulsewidth', 'notes']))
+        self.assertEqual(len(output.splitlines()), 5)
+
+    def test_missing_dataset(self):
+        status, _ = self.run_cli('scan', os.path.join(self.temp_dir, 'missing'))
+        self.assertEqual(status, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
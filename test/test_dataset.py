@@ -4,8 +4,14 @@ import pandas as pd
 import os
 import tempfile
 import json
+import asyncio
+import pickle
+import warnings
+from unittest import mock
 from pandas.testing import assert_frame_equal, assert_series_equal
-from bids_bnel.dataset import BIDS_json, BIDSDataset, BIDS_TSV
+import numpy as np
+from bids_bnel.dataset import BIDS_json, BIDSDataset, BIDS_TSV, BID_subject, BIDS_iEEG, BIDS_iEEG_writer
+from bids_bnel.fileio import batch_write
 from time import sleep
 
 
@@ -54,7 +60,110 @@ class TestBIDSTSV(unittest.TestCase):
         tsv4 = BIDS_TSV(self.path_tsv, path_json=self.path_json)
         self.assert_data_frames_equal(tsv3, tsv4)
 
+    def test_load_many_rows(self):
+        # Test if bulk loading gives the same result as adding the rows one by one
+        tsv = BIDS_TSV(self.path_tsv, path_json=self.path_json)
+        for idx in range(50):
+            tsv.add_row({'participant_id': 'sub-{:03d}'.format(idx), 'species': 'human', 'sex': 'MF'[idx % 2]})
+        tsv['extra'] = 1
+        tsv.dump()
+
+        tsv2 = BIDS_TSV(self.path_tsv, path_json=self.path_json)
+        self.assertListEqual(list(tsv2.keys()), ['participant_id', 'species', 'sex', 'extra'])
+        self.assertTrue((tsv2.dtypes == object).all())
+        self.assertEqual(len(tsv2), 50)
+        self.assert_data_frames_equal(tsv, tsv2)
+
+    def test_add_rows(self):
+        # Test if add_rows gives the same result as add_row in a loop
+        rows = [{'participant_id': 'sub-{:03d}'.format(idx), 'species': 'human', 'sex': 'MF'[idx % 2]} for idx in range(20)]
+
+        tsv = BIDS_TSV(self.path_tsv, path_json=self.path_json)
+        for row in rows:
+            tsv.add_row(row)
+
+        tsv2 = BIDS_TSV(self.path_tsv, path_json=self.path_json)
+        tsv2.add_rows(row for row in rows[:10])
+        tsv2.add_rows(pd.DataFrame(rows[10:]))
+        assert_frame_equal(pd.DataFrame(tsv), pd.DataFrame(tsv2))
+        tsv2.dump()
+
+        # A single row is rejected instead of adding one empty row per key
+        with self.assertRaises(TypeError):
+            tsv2.add_rows(rows[0])
+        self.assertEqual(len(tsv2), 20)
+
+    def test_append_buffer(self):
+        # Test if buffered rows are merged at once when leaving the context and on dump
+        rows = [{'participant_id': 'sub-{:03d}'.format(idx), 'species': 'human', 'sex': 'M'} for idx in range(10)]
+
+        tsv = BIDS_TSV(self.path_tsv, path_json=self.path_json)
+        with tsv.append_buffer():
+            for row in rows[:5]:
+                tsv.add_row(row)
+            tsv.add_rows(rows[5:])
+            self.assertEqual(len(tsv), 0)
+        self.assertEqual(len(tsv), 10)
+        self.assertListEqual(list(tsv['participant_id']), [row['participant_id'] for row in rows])
+
+        with tsv.append_buffer():
+            tsv.add_row(rows[0])
+            tsv.dump()
+            self.assertEqual(len(tsv), 11)
+
+        tsv2 = BIDS_TSV(self.path_tsv, path_json=self.path_json)
+        self.assertEqual(len(tsv2), 11)
+
+    def test_dump_only_dirty(self):
+        # Test if dump writes only files which changed since load or save
+        tsv = BIDS_TSV(self.path_tsv, path_json=self.path_json)
+        tsv.add_row(self.row)
+        self.assertTrue(tsv.is_dirty())
+        self.assertListEqual(tsv.dump(), [self.path_tsv, self.path_json])
+        self.assertFalse(tsv.is_dirty())
+        self.assertListEqual(tsv.dump(), [])
+
+        tsv2 = BIDS_TSV(self.path_tsv, path_json=self.path_json)
+        self.assertFalse(tsv2.is_dirty())
+        self.assertListEqual(tsv2.dump(), [])
+
+        tsv2.loc[0, 'species'] = 'mouse'
+        self.assertListEqual(tsv2.dump(), [self.path_tsv])
+
+        tsv2.metadata['species'] = 'species of the participant (human/mouse)'
+        self.assertListEqual(tsv2.dump(), [self.path_json])
+        self.assertListEqual(tsv2.dump(force=True), [self.path_tsv, self.path_json])
+
+        tsv3 = BIDS_TSV(self.path_tsv, path_json=self.path_json)
+        self.assertEqual(tsv3.loc[0, 'species'], 'mouse')
+
+    def test_dump_unedited_not_rewritten(self):
+        # Test that a file which pandas does not write back byte for byte is not rewritten before it is edited
+        BIDS_TSV(self.path_tsv, path_json=self.path_json).dump()
+        text = 'participant_id\tspecies\tsex\tage\nAAA\tn/a\tM\t1.50\n'
+        with open(self.path_tsv, 'w') as f:
+            f.write(text)
+        with open(self.path_json) as f:
+            sidecar = json.load(f)
+        sidecar['age'] = {}
+        with open(self.path_json, 'w') as f:
+            json.dump(sidecar, f)
+
+        # Loading does not serialize the content, only dump and is_dirty do
+        with mock.patch.object(BIDS_TSV, '_serialize', side_effect=AssertionError('serialized on load')):
+            tsv = BIDS_TSV(self.path_tsv, path_json=self.path_json)
+        self.assertFalse(tsv.is_dirty())
+        self.assertListEqual(tsv.dump(), [])
+        with open(self.path_tsv) as f:
+            self.assertEqual(f.read(), text)
 
+        # A file modified after the load is dirty
+        tsv = pickle.loads(pickle.dumps(BIDS_TSV(self.path_tsv, path_json=self.path_json)))
+        with open(self.path_tsv, 'w') as f:
+            f.write(text.replace('AAA', 'BBB'))
+        self.assertTrue(tsv.is_dirty())
+        self.assertListEqual(tsv.dump(), [self.path_tsv])
+        self.assertFalse(tsv.is_dirty())
 
 
 
@@ -63,6 +172,216 @@ class TestBIDSTSV(unittest.TestCase):
 
 
 
+
+
+class TestBIDSTSVDtypes(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'sub-01_task-rest_events.tsv')
+        events = BIDS_TSV(self.path)
+        events.add_rows([{'onset': 0.5, 'duration': 1, 'trial_type': 'sleep', 'sub_type': 'nrem'},
+                         {'onset': 2, 'duration': 0.5, 'trial_type': 'artefact', 'sample_start': 4000},
+                         {'onset': 3, 'duration': 0.5, 'trial_type': 'sleep', 'notes': 'awake?'}])
+        events.dump()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_load_add_dump(self):
+        events = BIDS_TSV(self.path, dtypes=True)
+        self.assertEqual(events['trial_type'].dtype, 'category')
+        self.assertEqual(events['onset'].dtype, np.float64)
+        self.assertEqual(events['sample_start'].dtype, 'Int64')
+        self.assertEqual(events['notes'].dtype, object)
+        assert_frame_equal(pd.DataFrame(events).astype(object).fillna(np.nan),
+                           pd.DataFrame(BIDS_TSV(self.path)).fillna(np.nan), check_dtype=False)
+
+        # New categories and missing values keep the dtypes
+        events.add_row({'onset': 4, 'trial_type': 'electrical stimulation', 'sample_start': 8000})
+        with events.append_buffer():
+            events.add_row({'onset': 5, 'trial_type': 'sleep'})
+        self.assertEqual(events['trial_type'].dtype, 'category')
+        self.assertEqual(events['sample_start'].dtype, 'Int64')
+        self.assertListEqual(events['trial_type'].tolist(),
+                             ['sleep', 'artefact', 'sleep', 'electrical stimulation', 'sleep'])
+        self.assertListEqual(events['sample_start'].tolist()[3:], [8000, pd.NA])
+
+        events.dump()
+        loaded = BIDS_TSV(self.path, dtypes={'trial_type': 'category'})
+        self.assertListEqual(loaded['trial_type'].tolist(), events['trial_type'].tolist())
+        self.assertEqual(loaded['onset'].dtype, object)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            restored = pickle.loads(pickle.dumps(BIDS_TSV(self.path, dtypes=True)))
+        self.assertEqual(restored.dtypes_schema, events.dtypes_schema)
+
+    def test_load_table(self):
+        files = {}
+        for name in os.listdir(self.temp_dir):
+            with open(os.path.join(self.temp_dir, name)) as f:
+                files[name] = f.read()
+        BIDSDataset(self.temp_dir, create_dataset=True)
+        for sub in ['02', '03']:
+            os.makedirs(os.path.join(self.temp_dir, 'sub-' + sub))
+            for name, content in files.items():
+                with open(os.path.join(self.temp_dir, 'sub-' + sub, name.replace('sub-01', 'sub-' + sub)), 'w') as f:
+                    f.write(content)
+        events = BIDS_TSV(os.path.join(self.temp_dir, 'sub-03', 'sub-03_task-rest_events.tsv'))
+        events.add_row({'onset': 9, 'trial_type': 'motor task'})
+        events.dump()
+
+        table = BIDSDataset(self.temp_dir, dtypes=True).load_table('events')
+        self.assertEqual(len(table), 7)
+        self.assertEqual(table['trial_type'].dtype, 'category')
+        self.assertSetEqual(set(table['trial_type'].cat.categories), {'sleep', 'artefact', 'motor task'})
+        self.assertEqual(table['sample_start'].dtype, 'Int64')
+        self.assertEqual(BIDSDataset(self.temp_dir).load_table('events')['trial_type'].dtype, object)
+
+        dataset = BIDSDataset(self.temp_dir, dtypes=True, n_jobs=2, executor='process').load_subjects()
+        self.assertEqual(dataset['02'].find_sessions().__len__(), 0)
+
+        # Column dtypes by suffix, other columns are not converted
+        table = BIDSDataset(self.temp_dir, dtypes={'events': {'trial_type': 'category'}}).load_table('events')
+        self.assertEqual(table['trial_type'].dtype, 'category')
+        self.assertNotEqual(table['sample_start'].dtype, 'Int64')
+        with self.assertRaises(TypeError):
+            BIDSDataset(self.temp_dir, dtypes={'trial_type': 'category'})
+
+
+class TestBIDSiEEG(unittest.TestCase):
+    def setUp(self):
+        # Create a BrainVision recording with 3 channels and 1000 samples
+        self.temp_dir = tempfile.mkdtemp()
+        self.base = os.path.join(self.temp_dir, 'sub-01_ses-01_task-rest_run-1')
+        self.x = np.arange(3000, dtype=np.int16).reshape(1000, 3)
+        self.x.tofile(self.base + '_ieeg.eeg')
+        with open(self.base + '_ieeg.vhdr', 'w') as f:
+            f.write('Brain Vision Data Exchange Header File Version 1.0\n\n[Common Infos]\n'
+                    'DataFile=sub-01_ses-01_task-rest_run-1_ieeg.eeg\nDataFormat=BINARY\n'
+                    'DataOrientation=MULTIPLEXED\nNumberOfChannels=3\nSamplingInterval=2000\n\n'
+                    '[Binary Infos]\nBinaryFormat=INT_16\n\n[Channel Infos]\n'
+                    'Ch1=A1,,0.5,uV\nCh2=A2,,0.5,uV\nCh3=A3,,1,uV\n')
+        with open(self.base + '_ieeg.json', 'w') as f:
+            json.dump({'SamplingFrequency': 500, 'SEEGChannelCount': 3, 'ECOGChannelCount': ''}, f)
+        pd.DataFrame({'name': ['e1', 'e2', 'e3'], 'type': 'SEEG'}).to_csv(self.base + '_channels.tsv', sep='\t', index=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_brainvision(self):
+        ieeg = BIDS_iEEG(self.base + '_ieeg.eeg')
+        self.assertEqual(ieeg.fs, 500)
+        self.assertEqual(ieeg.n_samples, 1000)
+        self.assertEqual(ieeg.duration, 2)
+        self.assertListEqual(ieeg.channel_names, ['e1', 'e2', 'e3'])
+        self.assertIsInstance(ieeg.data.base, np.memmap)
+
+        np.testing.assert_array_equal(ieeg.read(), self.x.T)
+        np.testing.assert_array_equal(ieeg.read(10, 20, channels='e2'), self.x[10:20, 1])
+        np.testing.assert_array_equal(ieeg.read_time(1, 1.1, channels=['e3', 'e1']), self.x[500:550, [2, 0]].T)
+        np.testing.assert_array_equal(ieeg.read(0, 5, channels=[0, 1], scale=True), 0.5 * self.x[:5, :2].T)
+        self.assertTrue(np.shares_memory(ieeg.read(100, 200, channels=slice(0, 2)), ieeg.data))
+
+        chunks = list(ieeg.iter_chunks(300, channels=['e1']))
+        self.assertListEqual([start for start, _ in chunks], [0, 300, 600, 900])
+        np.testing.assert_array_equal(np.concatenate([chunk for _, chunk in chunks], axis=1), self.x[:, [0]].T)
+
+    def test_raw_binary(self):
+        x = np.random.randn(4, 200).astype(np.float32)
+        x.tofile(self.base + '_ieeg.bin')
+        os.remove(self.base + '_channels.tsv')
+        with open(self.base + '_ieeg.json', 'w') as f:
+            json.dump({'SamplingFrequency': 100, 'SEEGChannelCount': 3, 'ECGChannelCount': 1}, f)
+
+        with self.assertRaises(ValueError):
+            BIDS_iEEG(self.base + '_ieeg.bin')
+
+        ieeg = BIDS_iEEG(self.base + '_ieeg.bin', dtype='float32', orientation='vectorized')
+        self.assertEqual(ieeg.n_channels, 4)
+        np.testing.assert_array_equal(ieeg.read_time(0.5, 1, channels=[3, 1]), x[[3, 1], 50:100])
+
+    def test_epochs(self):
+        ieeg = BIDS_iEEG(self.base + '_ieeg.eeg')
+        events = pd.DataFrame({'onset': [1.0, 0.1, 0.5], 'trial_type': 'electrical stimulation'})
+        x = ieeg.epochs(events, -0.02, 0.04, channels=['e3', 'e1'])
+        self.assertEqual(x.shape, (3, 2, 30))
+        self.assertEqual(x.dtype, np.int16)
+        for idx, start in enumerate([490, 40, 240]):
+            np.testing.assert_array_equal(x[idx], self.x[start:start + 30, [2, 0]].T)
+
+        # Samples outside of the recording are filled
+        x = ieeg.epochs([0.01, 1.99], -0.02, 0.04, scale=True)
+        self.assertTrue(np.isnan(x[0, :, :5]).all())
+        np.testing.assert_array_equal(x[0, :, 5:], self.x[:25].T * ieeg.resolution[:, None])
+        self.assertTrue(np.isnan(x[1, :, 15:]).all())
+        self.assertEqual(ieeg.epochs([0.01], -0.02, 0.04, fill_value=-1)[0, 0, 0], -1)
+
+        batches = list(ieeg.iter_epochs(events, 0, 0.1, channels='e2', batch_size=2))
+        self.assertListEqual([positions.tolist() for positions, _ in batches], [[1, 2], [0]])
+        np.testing.assert_array_equal(batches[1][1][0, 0], self.x[500:550, 1])
+        with self.assertRaises(ValueError):
+            ieeg.epochs([0.1], 0.1, 0.1)
+
+    def test_writer(self):
+        path = os.path.join(self.temp_dir, 'sub-02_ses-01_task-rest_run-1_ieeg.eeg')
+        x = np.random.randn(3, 1050).astype(np.float32)
+        channels = pd.DataFrame({'name': ['e1', 'e2', 'ecg'], 'type': ['SEEG', 'SEEG', 'ECG'], 'status': 'good'})
+
+        ieeg = BIDS_iEEG.write(path, (x[:, idx:idx + 100] for idx in range(0, 1050, 100)), 250, channels,
+                               metadata={'TaskName': 'rest'})
+        self.assertEqual(ieeg.n_samples, 1050)
+        self.assertListEqual(ieeg.channel_names, ['e1', 'e2', 'ecg'])
+        np.testing.assert_array_equal(ieeg.read(), x)
+
+        sidecar = BIDS_json(path.replace('_ieeg.eeg', '_ieeg.json'))
+        self.assertEqual(sidecar['SamplingFrequency'], 250)
+        self.assertEqual(sidecar['RecordingDuration'], 4.2)
+        self.assertEqual(sidecar['SEEGChannelCount'], 2)
+        self.assertEqual(sidecar['ECGChannelCount'], 1)
+        self.assertEqual(sidecar['ECOGChannelCount'], 0)
+        self.assertEqual(sidecar['TaskName'], 'rest')
+        self.assertEqual(sidecar['InstitutionName'], 'Bioelectronics Neurophysiology and Engineering Lab')
+
+        channels_tsv = BIDS_TSV(path.replace('_ieeg.eeg', '_channels.tsv'))
+        self.assertListEqual(list(channels_tsv['status']), ['good'] * 3)
+        self.assertTrue(os.path.exists(path.replace('.eeg', '.vmrk')))
+
+        # The returned reader is the same as the one reading the files
+        loaded = BIDS_iEEG(path)
+        self.assertEqual(ieeg.fs, loaded.fs)
+        self.assertEqual(ieeg.dtype, loaded.dtype)
+        np.testing.assert_array_equal(ieeg.resolution, loaded.resolution)
+        assert_frame_equal(ieeg.channels, loaded.channels)
+
+        # Interrupted recordings leave no data file behind
+        with self.assertRaises(RuntimeError):
+            with BIDS_iEEG_writer(path.replace('run-1', 'run-2'), 250, ['e1']) as writer:
+                writer.write(np.zeros((1, 10)))
+                raise RuntimeError()
+        self.assertFalse(any('run-2' in name for name in os.listdir(self.temp_dir)))
+
+        # Inside batch_write, the data file is replaced at commit together with the header and sidecars
+        path_batch = path.replace('run-1', 'run-4')
+        with batch_write():
+            ieeg = BIDS_iEEG.write(path_batch, [x[:2]], 250, ['e1', 'e2'])
+            self.assertListEqual(ieeg.channel_names, ['e1', 'e2'])
+            self.assertFalse(any('run-4' in name and not name.startswith('.') for name in os.listdir(self.temp_dir)))
+        ieeg = BIDS_iEEG(path_batch)
+        np.testing.assert_array_equal(ieeg.read(), x[:2])
+
+        with self.assertRaises(RuntimeError):
+            with batch_write():
+                ieeg = BIDS_iEEG.write(path.replace('run-1', 'run-5'), [x[:2]], 250, ['e1', 'e2'])
+                self.assertEqual(ieeg.fs, 250)
+                raise RuntimeError()
+        self.assertFalse(any('run-5' in name for name in os.listdir(self.temp_dir)))
+
+        # Data types which BrainVision does not support are rejected before anything is written
+        with self.assertRaises(ValueError):
+            BIDS_iEEG_writer(path.replace('run-1', 'run-3'), 250, ['e1'], dtype='float64')
+        self.assertFalse(any('run-3' in name for name in os.listdir(self.temp_dir)))
+
+
 class TestBids_json(unittest.TestCase):
     def setUp(self):
         # Create a temporary json file
@@ -97,6 +416,29 @@ class TestBids_json(unittest.TestCase):
         expected_data = {**self.test_data, **new_data}
         self.assertEqual(loaded_data, expected_data, 'Saved JSON data does not match original data')
 
+    def test_dump_only_dirty(self):
+        bids_json = BIDS_json(self.test_file)
+        self.assertFalse(bids_json.is_dirty())
+        self.assertListEqual(bids_json.dump(), [])
+
+        bids_json['key1'] = {'nested': [1, 2]}
+        self.assertTrue(bids_json.is_dirty())
+        self.assertListEqual(bids_json.dump(), [self.test_file])
+
+        bids_json['key1']['nested'].append(3)
+        self.assertListEqual(bids_json.dump(), [self.test_file])
+        self.assertFalse(BIDS_json(self.test_file).is_dirty())
+
+    def test_aload(self):
+        async def load():
+            single = await BIDS_json.aload(self.test_file)
+            many = await BIDS_json.aload_many([self.test_file] * 5, limit=2)
+            return single, many
+
+        single, many = asyncio.run(load())
+        self.assertEqual(dict(single), self.test_data)
+        self.assertEqual(len(many), 5)
+        self.assertTrue(all(dict(item) == self.test_data for item in many))
 
 
 class TestBIDSDataset(unittest.TestCase):
@@ -155,9 +497,228 @@ class TestBIDSDataset(unittest.TestCase):
         self.assertEqual(dataset._jsons['participants'], dataset2._jsons['participants'], 'participants data is not the same')
         assert_frame_equal(dataset._participants_meta, dataset2._participants_meta, 'participants.tsv data is not the same')
 
+    def test_lazy_loading(self):
+        # Check that metadata files are found on open but parsed only on first access
+        BIDSDataset(self.temp_dir, create_dataset=True)
+        dataset = BIDSDataset(self.temp_dir)
+
+        self.assertIn('events', dataset._jsons)
+        self.assertFalse(dataset._jsons.is_loaded('events'))
+        self.assertIsNone(dataset._participants)
+
+        self.assertIn('onset', dataset._jsons['events'])
+        self.assertTrue(dataset._jsons.is_loaded('events'))
+        self.assertFalse(dataset._jsons.is_loaded('channels'))
+        self.assertIs(dataset._jsons['events'], dataset._jsons['events'])
+
+        dataset.preload()
+        self.assertTrue(all(dataset._jsons.is_loaded(key) for key in dataset._jsons))
+        self.assertIsNotNone(dataset._participants)
+
+    def test_dump_only_dirty(self):
+        # Check that the dataset writes only modified metadata files
+        BIDSDataset(self.temp_dir, create_dataset=True)
+        dataset = BIDSDataset(self.temp_dir)
+        dataset.preload()
+        self.assertListEqual(dataset.dump(), [])
+
+        dataset._jsons['channels']['notes'] = 'Notes of the channel'
+        self.assertListEqual(dataset.dump(), [os.path.join(self.temp_dir, 'channels.json')])
+        self.assertListEqual(dataset.dump(), [])
+
+    def create_subjects(self, n_subjects=3, n_sessions=2):
+        # Create subjects with sessions.tsv and channels/events TSV files in every session
+        for sub in range(n_subjects):
+            subject = BID_subject(os.path.join(self.temp_dir, 'sub-{:02d}'.format(sub)))
+            sessions = BIDS_TSV(os.path.join(subject.path, 'sub-{:02d}_sessions.tsv'.format(sub)))
+            for ses in range(n_sessions):
+                session = subject.create_session('{:02d}'.format(ses))
+                os.mkdir(os.path.join(session.path, 'ieeg'))
+                prefix = os.path.join(session.path, 'ieeg', 'sub-{:02d}_ses-{:02d}_task-rest_'.format(sub, ses))
+                channels = BIDS_TSV(prefix + 'channels.tsv')
+                channels.add_rows({'name': 'e{}'.format(idx), 'type': 'SEEG', 'units': 'uV'} for idx in range(4))
+                channels.dump()
+                events = BIDS_TSV(prefix + 'events.tsv')
+                events.add_rows({'onset': 0.5 * idx, 'duration': 0.1, 'trial_type': 'sleep'} for idx in range(5))
+                events.dump()
+                sessions.add_row({'session-id': 'ses-{:02d}'.format(ses)})
+            sessions.dump()
+
+    def test_load_subjects_parallel(self):
+        # Check that sequential, thread and process loading give the same result
+        BIDSDataset(self.temp_dir, create_dataset=True)
+        self.create_subjects()
+
+        results = []
+        for n_jobs, executor in [(1, 'thread'), (4, 'thread'), (2, 'process')]:
+            dataset = BIDSDataset(self.temp_dir, n_jobs=n_jobs, executor=executor).load_subjects()
+            results.append(dataset)
+            self.assertListEqual(list(dataset.keys()), ['00', '01', '02'])
+            self.assertEqual(len(dataset['01'].sessions_tsv), 2)
+            session = dataset['01'].sessions['01']
+            self.assertIs(session._index, dataset.index)
+            self.assertListEqual(sorted(session.tsvs.keys()), ['sub-01_ses-01_task-rest_channels.tsv',
+                                                               'sub-01_ses-01_task-rest_events.tsv'])
+
+        for dataset in results[1:]:
+            for label, subject in dataset.items():
+                for ses, session in subject.sessions.items():
+                    for name, tsv in session.tsvs.items():
+                        expected = results[0][label].sessions[ses].tsvs[name]
+                        assert_frame_equal(pd.DataFrame(tsv), pd.DataFrame(expected))
+                        self.assertEqual(tsv.metadata, expected.metadata)
+                        self.assertEqual(tsv._path_tsv, expected._path_tsv)
+
+    def test_load_table(self):
+        # Check that the events of selected subjects are concatenated with the entity columns
+        BIDSDataset(self.temp_dir, create_dataset=True)
+        self.create_subjects()
+        events = BIDS_TSV(os.path.join(self.temp_dir, 'sub-01', 'ses-00', 'ieeg', 'sub-01_ses-00_task-rest_events.tsv'))
+        events.add_row({'onset': 10, 'duration': 1, 'trial_type': 'electrical stimulation'})
+        events.dump()
+
+        for use_index, n_jobs in [(True, 1), (False, 2)]:
+            dataset = BIDSDataset(self.temp_dir, use_index=use_index, n_jobs=n_jobs)
+            table = dataset.load_table('events', subjects=['01', '02'], columns=['onset', 'trial_type'])
+            self.assertListEqual(list(table.columns), ['sub', 'ses', 'task', 'run', 'onset', 'trial_type'])
+            self.assertEqual(len(table), 21)
+            self.assertListEqual(list(table['sub'].cat.categories), ['01', '02'])
+            self.assertListEqual(table['ses'].value_counts().sort_index().tolist(), [11, 10])
+            self.assertTrue(table['run'].isna().all())
+
+            stims = dataset.load_table('events', sessions='00', columns=['onset'], trial_type='electrical stimulation')
+            self.assertListEqual(list(stims.columns), ['sub', 'ses', 'task', 'run', 'onset'])
+            self.assertListEqual(stims['sub'].tolist(), ['01'])
+            self.assertListEqual(stims['onset'].tolist(), [10])
+
+        empty = dataset.load_table('events', subjects='99', columns=['onset'])
+        self.assertListEqual(list(empty.columns), ['sub', 'ses', 'task', 'run', 'onset'])
+        self.assertEqual(len(empty), 0)
+
+
+    def test_fill_time_samples(self):
+        # Check that the sampling frequency of every recording is resolved from the inherited sidecars
+        BIDSDataset(self.temp_dir, create_dataset=True)
+        self.create_subjects(n_subjects=2, n_sessions=2)
+        with open(os.path.join(self.temp_dir, 'task-rest_ieeg.json'), 'w') as f:
+            json.dump({'SamplingFrequency': 1000}, f)
+        for ses in ['00', '01']:
+            prefix = os.path.join(self.temp_dir, 'sub-01', 'ses-' + ses, 'ieeg', 'sub-01_ses-{}_task-rest_'.format(ses))
+            open(prefix + 'ieeg.edf', 'wb').close()
+        with open(prefix + 'ieeg.json', 'w') as f:
+            json.dump({'SamplingFrequency': 200}, f)
+
+        dataset = BIDSDataset(self.temp_dir, use_index=False)
+        table = dataset.fill_time_samples(dataset.load_table('events', columns=['onset', 'duration']))
+        rows = table[table['sub'] == '01']
+        self.assertListEqual(rows['sample_start'].tolist(), [0, 500, 1000, 1500, 2000, 0, 100, 200, 300, 400])
+        self.assertListEqual(rows['sample_end'].tolist(), [100, 600, 1100, 1600, 2100, 20, 120, 220, 320, 420])
+        # Subject 00 has no recordings
+        self.assertTrue(table.loc[table['sub'] == '00', 'sample_start'].isna().all())
+
+        # A single events file uses the SamplingFrequency inherited from the dataset root
+        path = os.path.join(self.temp_dir, 'sub-00', 'ses-00', 'ieeg', 'sub-00_ses-00_task-rest_events.tsv')
+        events = BIDS_TSV(path).fill_time_samples()
+        self.assertListEqual(events['sample_start'].tolist(), [0, 500, 1000, 1500, 2000])
+        events = BIDS_TSV(prefix + 'events.tsv').fill_time_samples(resolver=dataset, overwrite=True)
+        self.assertListEqual(events['sample_start'].tolist(), [0, 100, 200, 300, 400])
+
+    def test_bulk_create(self):
+        # Check the created tree and that an interrupted import is resumed
+        dataset = BIDSDataset(self.temp_dir, create_dataset=True)
+        electrodes = pd.DataFrame({'name': ['LA1', 'LA2'], 'x': [1.5, 2.5]})
+        manifest = pd.DataFrame([
+            {'sub': '01', 'ses': '01', 'task': 'rest', 'run': 1, 'sex': 'F', 'channels': ['LA1', 'LA2'],
+             'electrodes': electrodes, 'ieeg': {'SamplingFrequency': 2048}},
+            {'sub': '01', 'ses': '01', 'task': 'spes', 'run': 1, 'sex': 'F', 'channels': ['LA1', 'LA2']},
+            {'sub': 'sub-02', 'ses': 'ses-01', 'sex': 'M'},
+            {'sub': '03', 'sex': 'M', 'handedness': 'R'},
+        ])
+        written = dataset.bulk_create(manifest, n_jobs=2)
+        self.assertEqual(len(written), 14)
+        self.assertTrue(os.path.isdir(os.path.join(self.temp_dir, 'sub-02', 'ses-01')))
+        self.assertTrue(os.path.isdir(os.path.join(self.temp_dir, 'sub-03')))
+
+        participants = dataset.participants
+        self.assertListEqual(participants['participant_id'].tolist(), ['sub-01', 'sub-02', 'sub-03'])
+        self.assertListEqual(participants['sex'].tolist(), ['F', 'M', 'M'])
+        self.assertEqual(participants['handedness'].tolist()[2], 'R')
+        self.assertIn('handedness', dataset._jsons['participants'])
+        self.assertIn('sex', dataset._jsons['participants'])
+
+        dataset = BIDSDataset(self.temp_dir).load_subjects()
+        session = dataset['01'].sessions['01']
+        channels = session.tsvs['sub-01_ses-01_task-spes_run-1_channels.tsv']
+        self.assertListEqual(channels['name'].tolist(), ['LA1', 'LA2'])
+        self.assertListEqual(session.tsvs['sub-01_ses-01_electrodes.tsv']['x'].tolist(), [1.5, 2.5])
+        self.assertListEqual(dataset['01'].sessions_tsv['session-id'].tolist(), ['ses-01'])
+        self.assertEqual(dataset.resolve_metadata(os.path.join(
+            session.path, 'ieeg', 'sub-01_ses-01_task-rest_run-1_ieeg.eeg'))['SamplingFrequency'], 2048)
+
+        # Files written before an interruption are kept, the missing ones are written
+        os.remove(os.path.join(session.path, 'ieeg', 'sub-01_ses-01_task-rest_run-1_channels.tsv'))
+        written = BIDSDataset(self.temp_dir).bulk_create(manifest)
+        self.assertListEqual([os.path.basename(p) for p in written], ['sub-01_ses-01_task-rest_run-1_channels.tsv'])
+
+        # A later import adds sessions of existing subjects to their sessions.tsv, the listed ones are kept
+        with open(os.path.join(self.temp_dir, 'sub-01', 'sub-01_sessions.tsv'), 'a') as f:
+            f.write('ses-00\tbaseline\n')
+        written = BIDSDataset(self.temp_dir).bulk_create([{'sub': '01', 'ses': '02', 'task': 'rest', 'age': 30}])
+        self.assertIn(os.path.join(self.temp_dir, 'sub-01', 'sub-01_sessions.tsv'), written)
+        sessions = BIDSDataset(self.temp_dir).load_subjects()['01'].sessions_tsv
+        self.assertListEqual(sessions['session-id'].tolist(), ['ses-01', 'ses-00', 'ses-02'])
+        self.assertEqual(sessions['comments'].tolist()[1], 'baseline')
+        with open(os.path.join(self.temp_dir, 'participants.json')) as f:
+            self.assertNotIn('age', json.load(f))
+
+    def test_derive(self):
+        # Check that only the selected subjects and sessions are in the new dataset and that data files are linked
+        BIDSDataset(self.temp_dir, create_dataset=True)
+        self.create_subjects()
+        with open(os.path.join(self.temp_dir, 'participants.tsv'), 'w') as f:
+            f.write('participant_id\tsex\nsub-00\tF\nsub-01\tM\nsub-02\tn/a\n')
+        target = os.path.join(tempfile.mkdtemp(), 'derived')
+        self.addCleanup(shutil.rmtree, os.path.dirname(target))
+
+        derived = BIDSDataset(self.temp_dir).derive(target, subjects=['sub-01', '02'], sessions=['01'], mode='hardlink')
+        self.assertListEqual(derived.participants['participant_id'].tolist(), ['sub-01', 'sub-02'])
+        with open(os.path.join(target, 'participants.tsv')) as f:
+            self.assertEqual(f.read(), 'participant_id\tsex\nsub-01\tM\nsub-02\tn/a\n')
+        derived.load_subjects()
+        self.assertListEqual(list(derived.keys()), ['01', '02'])
+        self.assertListEqual(list(derived['01'].sessions.keys()), ['01'])
+        self.assertListEqual(derived['01'].sessions_tsv['session-id'].tolist(), ['ses-01'])
+
+        name = os.path.join('sub-01', 'ses-01', 'ieeg', 'sub-01_ses-01_task-rest_events.tsv')
+        self.assertTrue(os.path.samefile(os.path.join(self.temp_dir, name), os.path.join(target, name)))
+        self.assertTrue(os.path.exists(os.path.join(target, 'dataset_description.json')))
+        self.assertFalse(os.path.exists(os.path.join(target, 'sub-00')))
+
+        # Rewriting a linked file in the new dataset does not change the source
+        events = derived['01'].sessions['01'].tsvs['sub-01_ses-01_task-rest_events.tsv']
+        events.add_row({'onset': 9.0, 'duration': 0.1, 'trial_type': 'wake'})
+        events.dump()
+        self.assertEqual(len(BIDS_TSV(os.path.join(self.temp_dir, name))), 5)
+        with self.assertRaises(ValueError):
+            BIDSDataset(self.temp_dir).derive(target)
+
+    def test_aload_subjects(self):
+        # Check that async loading gives the same result as load_subjects
+        BIDSDataset(self.temp_dir, create_dataset=True)
+        self.create_subjects()
+        expected = BIDSDataset(self.temp_dir).load_subjects()
+
+        dataset = asyncio.run(BIDSDataset(self.temp_dir).aload_subjects(limit=2))
+        self.assertListEqual(list(dataset.keys()), ['00', '01', '02'])
+        for label, subject in dataset.items():
+            self.assertIs(subject._index, dataset.index)
+            for ses, session in subject.sessions.items():
+                for name, tsv in session.tsvs.items():
+                    assert_frame_equal(pd.DataFrame(tsv), pd.DataFrame(expected[label].sessions[ses].tsvs[name]))
+
+        dataset = asyncio.run(BIDSDataset(self.temp_dir).aload_subjects(subjects=['01']))
+        self.assertEqual(len(dataset['01'].sessions), 2)
+        self.assertIsNone(dataset['00'].sessions_tsv)
 
 if __name__ == '__main__':
     unittest.main()
-
-
-
@@ -0,0 +1,162 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from bids_bnel.events import EventIndex, fill_time_samples
+from bids_bnel.dataset import BIDS_TSV
+
+
+def random_events(n, seed=0):
+    rng = np.random.default_rng(seed)
+    onset = rng.uniform(0, 1000, n)
+    duration = rng.exponential(5, n)
+    events = pd.DataFrame({
+        'onset': onset,
+        'duration': duration,
+        'offset': np.nan,
+        'trial_type': rng.choice(['seizure', 'electrical stimulation', 'sleep'], n),
+        'sub_type': rng.choice(['SPES', 'ESM', 'clinical'], n),
+    })
+    # Some events define the offset instead of the duration, some have no onset
+    events.loc[::7, 'offset'] = events.loc[::7, 'onset'] + 1
+    events.loc[::7, 'duration'] = np.nan
+    events.loc[::50, 'onset'] = np.nan
+    return events.astype(object)
+
+
+def brute_force(events, t_start, t_stop, contained=False, trial_type=None):
+    onset = events['onset'].astype(float).to_numpy()
+    stop = np.where(events['offset'].isna(), onset + events['duration'].astype(float).fillna(0).to_numpy(),
+                    events['offset'].astype(float).to_numpy())
+    if contained:
+        mask = (onset >= t_start) & (stop <= t_stop)
+    else:
+        mask = (onset <= t_stop) & (stop >= t_start)
+    if trial_type is not None:
+        mask &= (events['trial_type'] == trial_type).to_numpy()
+    return np.flatnonzero(mask)
+
+
+class TestEventIndex(unittest.TestCase):
+    def setUp(self):
+        self.events = random_events(2000)
+        self.index = EventIndex(self.events)
+
+    def test_queries(self):
+        for t_start, t_stop in [(0, 10), (100, 100), (500.5, 620), (-5, 2000), (990, 1200)]:
+            np.testing.assert_array_equal(self.index.overlapping(t_start, t_stop),
+                                          brute_force(self.events, t_start, t_stop))
+            np.testing.assert_array_equal(self.index.contained(t_start, t_stop),
+                                          brute_force(self.events, t_start, t_stop, contained=True))
+            np.testing.assert_array_equal(self.index.overlapping(t_start, t_stop, trial_type='seizure'),
+                                          brute_force(self.events, t_start, t_stop, trial_type='seizure'))
+
+    def test_batch_queries(self):
+        t_start = np.linspace(0, 990, 100)
+        t_stop = t_start + 10
+        query, position = self.index.overlapping_batch(t_start, t_stop)
+        counts = self.index.count_overlapping(t_start, t_stop)
+        for idx in range(t_start.__len__()):
+            expected = brute_force(self.events, t_start[idx], t_stop[idx])
+            np.testing.assert_array_equal(np.sort(position[query == idx]), expected)
+            self.assertEqual(counts[idx], expected.__len__())
+
+        query, position = self.index.around([100, 200], 5, 5, trial_type=['seizure', 'sleep'])
+        for idx, t in enumerate([100, 200]):
+            expected = np.union1d(brute_force(self.events, t - 5, t + 5, trial_type='seizure'),
+                                  brute_force(self.events, t - 5, t + 5, trial_type='sleep'))
+            np.testing.assert_array_equal(np.sort(position[query == idx]), expected)
+
+        # Array selections are memoized like lists of the same values
+        np.testing.assert_array_equal(self.index.overlapping(100, 200, trial_type=np.array(['sleep', 'seizure'])),
+                                      self.index.overlapping(100, 200, trial_type=['seizure', 'sleep']))
+        self.assertEqual(len(self.index._subindexes), 1)
+
+    def test_incremental(self):
+        index = EventIndex(self.events.iloc[:1000])
+        index.overlapping(0, 10, trial_type='sleep')
+        index.extend(self.events.iloc[1000:])
+        np.testing.assert_array_equal(index.overlapping(300, 400), self.index.overlapping(300, 400))
+        np.testing.assert_array_equal(index.overlapping(300, 400, trial_type='sleep'),
+                                      self.index.overlapping(300, 400, trial_type='sleep'))
+
+
+class TestFillTimeSamples(unittest.TestCase):
+    def test_samples_from_times(self):
+        events = random_events(1000, seed=3)
+        fill_time_samples(events, 512)
+        onset = events['onset'].astype(float)
+        stop = np.where(events['offset'].isna(), onset + events['duration'].astype(float),
+                        events['offset'].astype(float))
+        valid = onset.notna().to_numpy()
+        np.testing.assert_array_equal(events['sample_start'][valid].astype(int), np.round(onset[valid] * 512))
+        np.testing.assert_array_equal(events['sample_end'][valid].astype(int), np.round(stop[valid] * 512))
+        self.assertTrue(events['sample_start'][~valid].isna().all())
+
+    def test_times_from_samples(self):
+        events = pd.DataFrame({'sample_start': [100, 2000, 50], 'sample_end': [300, 2500, 50],
+                               'onset': [np.nan, 1.5, np.nan]})
+        fill_time_samples(events, [100, 1000, 50])
+        self.assertListEqual(events['onset'].tolist(), [1.0, 1.5, 1.0])
+        self.assertListEqual(events['offset'].tolist(), [3.0, 2.5, 1.0])
+
+        # Existing samples are kept unless overwrite is set
+        events['onset'] = [2.0, 1.5, 1.0]
+        fill_time_samples(events, 100)
+        self.assertListEqual(events['sample_start'].tolist(), [100, 2000, 50])
+        fill_time_samples(events, 100, overwrite=True)
+        self.assertListEqual(events['sample_start'].tolist(), [200, 150, 100])
+
+    def test_tsv(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, 'sub-01_task-rest_events.tsv')
+            tsv = BIDS_TSV(path)
+            tsv.add_rows([{'onset': 1.5, 'duration': 0.5, 'trial_type': 'sleep'}, {'sample_start': 400}])
+            with self.assertRaises(ValueError):
+                tsv.fill_time_samples()
+
+            with open(os.path.join(temp_dir, 'sub-01_task-rest_ieeg.json'), 'w') as f:
+                json.dump({'SamplingFrequency': 200}, f)
+            tsv.fill_time_samples()
+            self.assertListEqual(tsv['sample_start'].tolist(), [300, 400])
+            self.assertEqual(tsv['sample_end'].iloc[0], 400)
+            self.assertTrue(pd.isna(tsv['sample_end'].iloc[1]))
+            self.assertEqual(tsv['onset'].tolist()[1], 2.0)
+            np.testing.assert_array_equal(tsv.event_index().overlapping(1.9, 2.1), [0, 1])
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+class TestBIDSTSVEventIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'sub-01_task-rest_events.tsv')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_tsv_event_index(self):
+        events = random_events(300, seed=1)
+        tsv = BIDS_TSV(self.path)
+        tsv.add_rows(events.iloc[:100])
+        index = tsv.event_index()
+
+        tsv.add_rows(events.iloc[100:200])
+        for _, row in events.iloc[200:].iterrows():
+            tsv.add_row(row)
+        self.assertIs(tsv.event_index(), index)
+
+        full = EventIndex(events)
+        np.testing.assert_array_equal(index.overlapping(0, 500), full.overlapping(0, 500))
+        rows = tsv.iloc[index.overlapping(0, 500, trial_type='seizure')]
+        self.assertTrue((rows['trial_type'] == 'seizure').all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import unittest
+
+from bids_bnel.fileio import atomic_write, batch_write
+from bids_bnel.dataset import BIDS_json
+
+
+class TestAtomicWrite(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'test.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_atomic_write(self):
+        atomic_write(self.path, 'first')
+        self.assertEqual(self.read(self.path), b'first')
+
+        os.chmod(self.path, 0o640)
+        atomic_write(self.path, b'second', fsync=True)
+        self.assertEqual(self.read(self.path), b'second')
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o640)
+        self.assertListEqual(os.listdir(self.temp_dir), ['test.json'])
+
+    def test_batch_commit(self):
+        atomic_write(self.path, 'old')
+        paths = [os.path.join(self.temp_dir, 'file{}.tsv'.format(idx)) for idx in range(5)]
+        with batch_write():
+            atomic_write(self.path, 'new')
+            for path in paths:
+                atomic_write(path, path)
+            with batch_write():
+                atomic_write(paths[0], 'nested')
+            # Nothing is replaced before the commit
+            self.assertEqual(self.read(self.path), b'old')
+            self.assertFalse(os.path.exists(paths[1]))
+
+        self.assertEqual(self.read(self.path), b'new')
+        self.assertEqual(self.read(paths[0]), b'nested')
+        self.assertEqual(self.read(paths[1]), paths[1].encode())
+        self.assertEqual(len(os.listdir(self.temp_dir)), 6)
+
+    def test_batch_abort(self):
+        bids_json = BIDS_json(self.path)
+        bids_json['key'] = 'old'
+        bids_json.dump()
+
+        with self.assertRaises(RuntimeError):
+            with batch_write():
+                bids_json['key'] = 'new'
+                self.assertListEqual(bids_json.dump(), [self.path])
+                atomic_write(os.path.join(self.temp_dir, 'other.json'), 'other')
+                raise RuntimeError()
+
+        self.assertListEqual(os.listdir(self.temp_dir), ['test.json'])
+        self.assertEqual(BIDS_json(self.path)['key'], 'old')
+        # The aborted write is not considered saved
+        self.assertTrue(bids_json.is_dirty())
+        self.assertListEqual(bids_json.dump(), [self.path])
+
+    def test_batch_per_thread(self):
+        # A batch collects the writes of its own thread only, other threads join it explicitly
+        other = os.path.join(self.temp_dir, 'other.json')
+        joined = os.path.join(self.temp_dir, 'joined.json')
+        with self.assertRaises(RuntimeError):
+            with batch_write() as batch:
+                atomic_write(self.path, 'aborted')
+                thread = threading.Thread(target=atomic_write, args=(other, 'other'))
+                thread.start()
+                thread.join()
+                # Written by the other thread outside of the batch
+                self.assertEqual(self.read(other), b'other')
+                raise RuntimeError()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(self.read(other), b'other')
+
+        with batch_write() as batch:
+            thread = threading.Thread(target=batch.write, args=(joined, 'joined'))
+            thread.start()
+            thread.join()
+            self.assertFalse(os.path.exists(joined))
+        self.assertEqual(self.read(joined), b'joined')
+        with self.assertRaises(RuntimeError):
+            batch.write(self.path, 'late')
+        self.assertListEqual(sorted(os.listdir(self.temp_dir)), ['joined.json', 'other.json'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import sys
+import tempfile
+import unittest
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Upper bound of the cumulative import time of bids_bnel in microseconds. Importing pandas alone takes several times
+# longer, so the bound catches heavy imports while leaving room for slow machines.
+IMPORT_TIME_BUDGET_US = 150000
+
+
+def import_times(code):
+    """
+    Run code in a new interpreter with -X importtime.
+
+    Returns:
+        dict: Cumulative import time in microseconds by module name.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, capture_output=True,
+                            text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestImportTime(unittest.TestCase):
+    def test_import_package(self):
+        times = import_times('import bids_bnel')
+        for module in ('pandas', 'numpy', 'asyncio', 'bids_bnel.dataset', 'bids_bnel.templates'):
+            self.assertNotIn(module, times)
+        self.assertLess(times['bids_bnel'], IMPORT_TIME_BUDGET_US)
+
+    def test_json_without_pandas(self):
+        # Reading, editing and writing sidecars does not import pandas
+        path = os.path.join(tempfile.mkdtemp(), 'sub-01_ieeg.json')
+        code = ('import bids_bnel\n'
+                'sidecar = bids_bnel.BIDS_json({!r})\n'
+                'sidecar["SamplingFrequency"] = 1000\n'
+                'sidecar.dump()\n'
+                'assert bids_bnel.BIDS_json({!r})["SamplingFrequency"] == 1000\n').format(path, path)
+        times = import_times(code)
+        self.assertIn('bids_bnel.sidecar', times)
+        self.assertNotIn('pandas', times)
+        self.assertNotIn('numpy', times)
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from bids_bnel.index import BIDSIndex, parse_entities, CACHE_DIRNAME, INDEX_FILENAME
+from bids_bnel.dataset import BIDSDataset
+
+
+class TestParseEntities(unittest.TestCase):
+    def test_parse_entities(self):
+        entities = parse_entities('sub-01_ses-02_task-rest_acq-clinical_run-1_ieeg.eeg')
+        self.assertEqual(entities, {'sub': '01', 'ses': '02', 'task': 'rest', 'acq': 'clinical', 'run': '1',
+                                    'suffix': 'ieeg', 'extension': '.eeg'})
+        self.assertEqual(parse_entities('participants.tsv'), {'suffix': 'participants', 'extension': '.tsv'})
+        self.assertEqual(parse_entities('sub-01_T1w.nii.gz')['extension'], '.nii.gz')
+
+
+class TestBIDSIndex(unittest.TestCase):
+    def setUp(self):
+        # Create a small dataset tree
+        self.temp_dir = tempfile.mkdtemp()
+        BIDSDataset(os.path.join(self.temp_dir, 'ds'), create_dataset=True)
+        self.root = os.path.join(self.temp_dir, 'ds')
+        for sub in ['01', '02']:
+            for ses in ['01', '02']:
+                path = os.path.join(self.root, 'sub-' + sub, 'ses-' + ses, 'ieeg')
+                os.makedirs(path)
+                for ext in ['_ieeg.json', '_ieeg.eeg', '_channels.tsv']:
+                    name = 'sub-{}_ses-{}_task-rest_run-1{}'.format(sub, ses, ext)
+                    open(os.path.join(path, name), 'w').close()
+        os.makedirs(os.path.join(self.root, 'derivatives', 'sub-01'))
+        self.set_mtime_old()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def set_mtime_old(self):
+        # Move modification times of all directories to the past so that they are trusted by the index
+        t = os.stat(self.root).st_mtime - 60
+        for path, dirs, files in os.walk(self.root):
+            os.utime(path, (t, t))
+
+    def test_query(self):
+        index = BIDSIndex(self.root)
+        index.update()
+
+        self.assertListEqual(index.subjects(), ['01', '02'])
+        self.assertListEqual(index.sessions('01'), ['01', '02'])
+
+        records = index.query(sub='01', suffix='ieeg', extension='.eeg')
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]['datatype'], 'ieeg')
+        self.assertTrue(all(os.path.exists(r['path']) for r in records))
+
+        self.assertEqual(len(index.query(suffix='channels', extension='.tsv')), 4)
+        self.assertEqual(len(index.query(ses=['01', '02'], extension='.json')), 4)
+        self.assertEqual(len(index.query(sub=None, extension='.json')), 6)
+
+    def test_incremental_update(self):
+        index = BIDSIndex(self.root)
+        index.update()
+        self.assertTrue(os.path.exists(os.path.join(self.root, CACHE_DIRNAME, INDEX_FILENAME)))
+        self.assertGreater(len(index.scanned), 10)
+        self.set_mtime_old()
+        index.update()
+
+        # Unchanged dataset is not listed again
+        index2 = BIDSIndex(self.root)
+        self.assertFalse(index2.update())
+        self.assertListEqual(index2.scanned, [])
+
+        # Only the touched directory is listed again
+        path = os.path.join(self.root, 'sub-02', 'ses-01', 'ieeg')
+        open(os.path.join(path, 'sub-02_ses-01_task-rest_run-1_events.tsv'), 'w').close()
+        index3 = BIDSIndex(self.root)
+        self.assertTrue(index3.update())
+        self.assertListEqual(index3.scanned, [os.path.join('sub-02', 'ses-01', 'ieeg')])
+        self.assertEqual(len(index3.query(suffix='events', extension='.tsv')), 1)
+
+    def test_dataset_subjects(self):
+        dataset = BIDSDataset(self.root)
+        dataset.find_subjects()
+        self.assertListEqual(list(dataset.keys()), ['01', '02'])
+
+        sessions = dataset['01'].find_sessions()
+        self.assertListEqual(list(sessions.keys()), ['01', '02'])
+        self.assertEqual(len(sessions['01'].find_files(suffix='ieeg')), 2)
+
+        dataset_no_index = BIDSDataset(self.root, use_index=False)
+        dataset_no_index.find_subjects()
+        sessions_no_index = dataset_no_index['01'].find_sessions()
+        self.assertListEqual(sessions['02'].find_files(), sessions_no_index['02'].find_files())
+
+
+if __name__ == '__main__':
+    unittest.main()
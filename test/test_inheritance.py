@@ -0,0 +1,87 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from bids_bnel.inheritance import SidecarResolver
+from bids_bnel.dataset import BIDSDataset, BIDS_json
+
+
+class TestSidecarResolver(unittest.TestCase):
+    def setUp(self):
+        # Create a dataset with channels.json at the root, subject and session level
+        self.temp_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.temp_dir, 'ds')
+        self.dataset = BIDSDataset(self.root, create_dataset=True)
+        for name in os.listdir(self.root):
+            t = os.stat(os.path.join(self.root, name)).st_mtime - 60
+            os.utime(os.path.join(self.root, name), (t, t))
+        self.write_json(os.path.join(self.root, 'task-rest_channels.json'), {'units': 'root'})
+        self.write_json(os.path.join(self.root, 'sub-01', 'sub-01_channels.json'), {'units': 'subject', 'a': 1})
+        self.write_json(os.path.join(self.root, 'sub-01', 'sub-01_task-other_channels.json'), {'a': 'other'})
+        self.write_json(os.path.join(self.root, 'sub-01', 'ses-01', 'ieeg', 'sub-01_ses-01_task-rest_channels.json'),
+                        {'b': 2})
+        self.paths = [os.path.join(self.root, 'sub-01', 'ses-{}'.format(ses), 'ieeg',
+                                   'sub-01_ses-{}_task-rest_channels.tsv'.format(ses)) for ses in ['01', '02']]
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_json(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(content, f)
+        # Move the modification time to the past, recently modified files are checked again on every call
+        t = os.stat(path).st_mtime - 60
+        os.utime(path, (t, t))
+        os.utime(os.path.dirname(path), (t, t))
+
+    def test_resolve(self):
+        # Check the override order and that sidecars of other tasks and suffixes are ignored
+        metadata = self.dataset.resolve_metadata('sub-01/ses-01/ieeg/sub-01_ses-01_task-rest_channels.tsv')
+        self.assertEqual(metadata['units'], 'subject')
+        self.assertEqual(metadata['a'], 1)
+        self.assertEqual(metadata['b'], 2)
+        self.assertIn('name', metadata)
+
+        metadata = self.dataset.resolve_metadata(self.paths[1])
+        self.assertNotIn('b', metadata)
+        self.assertEqual(metadata['units'], 'subject')
+
+        events = self.dataset.resolve_metadata('sub-02/ses-01/ieeg/sub-02_ses-01_task-rest_events.tsv')
+        self.assertNotIn('units', events)
+        self.assertIn('trial_type', events)
+
+        with self.assertRaises(ValueError):
+            self.dataset.resolve_metadata(os.path.join(self.temp_dir, 'sub-01_channels.tsv'))
+
+    def test_memoization(self):
+        # Check that shared sidecars are parsed once and parsed again after a change
+        loader = mock.Mock(side_effect=BIDS_json)
+        resolver = SidecarResolver(self.root, loader=loader)
+        resolved = resolver.resolve_many(self.paths)
+        self.assertEqual(resolved[self.paths[0]]['b'], 2)
+        self.assertEqual(loader.call_count, 4)
+
+        resolver.resolve_many(self.paths)
+        self.assertEqual(loader.call_count, 4)
+
+        self.write_json(os.path.join(self.root, 'sub-01', 'sub-01_channels.json'), {'units': 'changed'})
+        resolved = resolver.resolve_many(self.paths)
+        self.assertEqual(resolved[self.paths[1]]['units'], 'changed')
+        self.assertNotIn('a', resolved[self.paths[1]])
+        self.assertEqual(loader.call_count, 5)
+
+        # Returned dicts are copies
+        resolved[self.paths[0]]['units'] = 'modified'
+        self.assertEqual(resolver.resolve(self.paths[0])['units'], 'changed')
+
+        # New sidecars are found once the directory changes
+        self.write_json(os.path.join(self.root, 'sub-01', 'ses-02', 'sub-01_ses-02_channels.json'), {'c': 3})
+        self.assertEqual(resolver.resolve(self.paths[1])['c'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import bids_bnel
+from bids_bnel.dataset import BIDS_TSV, BIDS_json
+from bids_bnel.instrumentation import stats_enabled
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'sub-01_task-rest_events.tsv')
+        bids_bnel.reset_stats()
+
+    def tearDown(self):
+        bids_bnel.disable_stats()
+        bids_bnel.reset_stats()
+        shutil.rmtree(self.temp_dir)
+
+    def test_disabled(self):
+        # Nothing is counted unless enabled
+        tsv = BIDS_TSV(self.path)
+        tsv.add_rows({'onset': idx, 'duration': 1} for idx in range(10))
+        tsv.dump()
+        self.assertEqual(bids_bnel.stats(), {})
+
+    def test_profile(self):
+        with bids_bnel.profile() as p:
+            tsv = BIDS_TSV(self.path)
+            tsv.add_rows({'onset': idx, 'duration': 1} for idx in range(10))
+            tsv.add_row({'onset': 10, 'duration': 1})
+            tsv.dump()
+            BIDS_TSV(self.path)
+        self.assertFalse(stats_enabled())
+
+        self.assertEqual(p.stats['tsv']['insert']['calls'], 2)
+        self.assertEqual(p.stats['tsv']['insert']['items'], 11)
+        self.assertEqual(p.stats['tsv']['write']['bytes_written'], os.path.getsize(self.path))
+        self.assertEqual(p.stats['tsv']['read']['bytes_read'], os.path.getsize(self.path))
+        self.assertEqual(p.stats['tsv']['parse']['items'], 11)
+        self.assertEqual(p.stats['json']['write']['files'], 1)
+        self.assertEqual(p.stats['json']['read']['files'], 1)
+        self.assertGreater(p.stats['tsv']['serialize']['time'], 0)
+        self.assertEqual(p.totals()['files'], 4)
+
+        # The global counters contain the same operations, a second context counts only its own operations
+        self.assertEqual(bids_bnel.stats()['tsv']['insert']['calls'], 2)
+        bids_bnel.enable_stats()
+        with bids_bnel.profile() as p:
+            BIDS_json(self.path.replace('.tsv', '.json'))
+        self.assertEqual(list(p.stats.keys()), ['json'])
+        self.assertTrue(stats_enabled())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from bids_bnel import manifest as manifest_module
+from bids_bnel.manifest import DatasetManifest, hash_files
+from bids_bnel.dataset import BIDSDataset
+
+
+class TestDatasetManifest(unittest.TestCase):
+    def setUp(self):
+        # Create a small dataset with a binary recording
+        self.temp_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.temp_dir, 'ds')
+        BIDSDataset(self.root, create_dataset=True)
+        path = os.path.join(self.root, 'sub-01', 'ses-01', 'ieeg')
+        os.makedirs(path)
+        self.recording = os.path.join(path, 'sub-01_ses-01_task-rest_ieeg.eeg')
+        np.random.default_rng(0).integers(0, 255, 100000, dtype=np.uint8).tofile(self.recording)
+        with open(os.path.join(path, 'sub-01_ses-01_task-rest_channels.tsv'), 'w') as f:
+            f.write('name\ttype\nLA1\tSEEG\n')
+        self.set_mtime_old(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def set_mtime_old(self, root):
+        # Move modification times to the past so that the hashes are trusted by the next update
+        t = time.time() - 60
+        for dirpath, _, names in os.walk(root):
+            for name in names:
+                os.utime(os.path.join(dirpath, name), (t, t))
+
+    def test_update(self):
+        manifest = DatasetManifest(self.root)
+        self.assertTrue(manifest.update())
+        key = 'sub-01/ses-01/ieeg/sub-01_ses-01_task-rest_ieeg.eeg'
+        self.assertIn(key, manifest.hashed)
+        self.assertIn('dataset_description.json', manifest.files)
+        self.assertFalse(any(k.startswith('.') for k in manifest.files))
+        self.assertEqual(manifest.files[key][0], 100000)
+
+        # Unchanged files are not hashed again, the manifest is loaded from the dataset root
+        manifest = DatasetManifest(self.root)
+        self.assertFalse(manifest.update())
+        self.assertListEqual(manifest.hashed, [])
+
+        with open(self.recording, 'r+b') as f:
+            f.write(b'changed')
+        self.assertTrue(manifest.update())
+        self.assertListEqual(manifest.hashed, [key])
+
+    def test_chunked_hash(self):
+        # Files hashed in several chunks give the same hash independently of the number of threads
+        size = os.path.getsize(self.recording)
+        with mock.patch.object(manifest_module, 'CHUNK_SIZE', 4096):
+            chunked = hash_files([self.recording], [size], n_jobs=4)[0]
+            self.assertEqual(hash_files([self.recording], [size])[0], chunked)
+        with open(self.recording, 'rb') as f:
+            data = f.read()
+        digests = b''.join(hashlib.sha1(data[i:i + 4096]).digest() for i in range(0, size, 4096))
+        self.assertEqual(chunked, hashlib.sha1(digests).hexdigest())
+
+    def test_diff_sync(self):
+        dataset = BIDSDataset(self.root)
+        target = os.path.join(self.temp_dir, 'mirror')
+        result = dataset.sync(target, n_jobs=2)
+        self.assertIn('sub-01/ses-01/ieeg/sub-01_ses-01_task-rest_ieeg.eeg', result['copied'])
+        self.assertDictEqual(dataset.diff(target), {'added': [], 'removed': [], 'changed': []})
+        with open(self.recording, 'rb') as f, open(os.path.join(target, os.path.relpath(self.recording, self.root)),
+                                                   'rb') as g:
+            self.assertEqual(f.read(), g.read())
+
+        # Only changed files are copied, files missing in the source are deleted on request
+        self.assertDictEqual(dataset.sync(target), {'copied': [], 'deleted': []})
+        with open(os.path.join(self.root, 'README'), 'w') as f:
+            f.write('readme')
+        with open(os.path.join(target, 'sub-01', 'notes.txt'), 'w') as f:
+            f.write('notes')
+        with open(os.path.join(target, 'participants.tsv'), 'a') as f:
+            f.write('sub-99\n')
+        self.assertDictEqual(dataset.diff(target), {'added': ['README'], 'removed': ['sub-01/notes.txt'],
+                                                    'changed': ['participants.tsv']})
+        result = dataset.sync(BIDSDataset(target), delete=True)
+        self.assertDictEqual(result, {'copied': ['README', 'participants.tsv'], 'deleted': ['sub-01/notes.txt']})
+        self.assertFalse(os.path.exists(os.path.join(target, 'sub-01', 'notes.txt')))
+        self.assertDictEqual(DatasetManifest(target).files, dataset.manifest().files)
+
+
+if __name__ == '__main__':
+    unittest.main()
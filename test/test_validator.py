@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+from bids_bnel.dataset import BIDSDataset, BIDS_TSV, BIDS_json
+from bids_bnel.validator import compile_templates, validate_dataset
+
+
+class TestValidator(unittest.TestCase):
+    def setUp(self):
+        # Create a dataset with participants and channels files of two subjects
+        self.temp_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.temp_dir, 'ds')
+        self.dataset = BIDSDataset(self.root, create_dataset=True)
+        participants = pd.DataFrame({'participant_id': ['sub-01', 'sub-02'], 'species': 'homo sapiens',
+                                     'sex': ['M', 'F']})
+        participants.to_csv(os.path.join(self.root, 'participants.tsv'), sep='\t', index=False)
+        for sub in ['01', '02']:
+            path = os.path.join(self.root, 'sub-' + sub, 'ses-01', 'ieeg')
+            os.makedirs(path)
+            channels = BIDS_TSV(os.path.join(path, 'sub-{}_ses-01_task-rest_channels.tsv'.format(sub)))
+            channels.add_rows({'name': 'e{}'.format(idx), 'type': 'SEEG', 'units': 'uV'} for idx in range(4))
+            channels.dump()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_compile_templates(self):
+        schemas = compile_templates()
+        self.assertEqual(schemas['participants']['levels'], {'sex': ('M', 'F')})
+        self.assertIn('onset', schemas['events']['columns'])
+
+    def test_valid_dataset(self):
+        report = self.dataset.validate()
+        self.assertTrue(report.is_valid)
+        self.assertEqual(report.warnings, [])
+        self.assertEqual(report.n_files, 11)
+
+    def test_issues(self):
+        # Invalid level, undescribed column, unreadable JSON and unlisted subject
+        participants = pd.DataFrame({'participant_id': ['sub-01'], 'species': 'homo sapiens', 'sex': ['X'],
+                                     'age': [30]})
+        participants.to_csv(os.path.join(self.root, 'participants.tsv'), sep='\t', index=False)
+        path_json = os.path.join(self.root, 'sub-02', 'ses-01', 'ieeg', 'sub-02_ses-01_task-rest_ieeg.json')
+        with open(path_json, 'w') as f:
+            f.write('{"SamplingFrequency": ')
+
+        for n_jobs, executor in [(1, 'thread'), (2, 'process')]:
+            report = validate_dataset(self.root, n_jobs=n_jobs, executor=executor)
+            self.assertFalse(report.is_valid)
+            codes = report.to_frame().set_index('code')
+            self.assertEqual(codes.loc['invalid_level', 'rows'], [0])
+            self.assertEqual(codes.loc['undescribed_column', 'column'], 'age')
+            self.assertEqual(codes.loc['unreadable', 'path'], path_json)
+            self.assertEqual(codes.loc['missing_participant', 'severity'], 'warning')
+            self.assertEqual(report.to_dict()['n_errors'], 2)
+
+        # Levels defined in the sidecar
+        sidecar = BIDS_json(os.path.join(self.root, 'participants.json'))
+        sidecar['sex']['Levels']['X'] = 'other'
+        sidecar.dump()
+        report = self.dataset.validate()
+        self.assertNotIn('invalid_level', report.to_frame()['code'].tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()